@@ -14,52 +14,360 @@ import pandas as pd
 import os
 import numpy as np
 import difflib
+import collections
+import argparse
+import concurrent.futures
+import datetime
+import time
+import traceback
+import glob
+import hashlib
+import heapq
+import pickle
+import re
 
+import CCC_instrumentation
+import CCC_registry
 
-def max_similarity(x,Y):
+try:
+    import pyarrow.parquet as pq
+except ImportError:
+    pq = None
+
+
+class CharacterCounts:
+    """Character counts of the candidates, to bound a similarity for all of them in one NumPy step
+    Args:
+    candidates (list): strings to match against
+    """
+
+    def __init__(self, candidates):
+        self.candidates = candidates
+        alphabet = sorted(set(''.join(self.candidates)))
+        self.alphabet = {c: k for k, c in enumerate(alphabet)}
+        self.counts = np.zeros((len(self.candidates), len(alphabet)), dtype=np.int64)
+        for k, candidate in enumerate(self.candidates):
+            for c in candidate:
+                self.counts[k, self.alphabet[c]] += 1
+        self.lengths = np.array([len(c) for c in self.candidates], dtype=np.int64)
+
+    def matches(self, x):
+        """Characters an item has in common with every candidate, regardless of order
+        Args:
+        x (str): item
+        """
+        counts = np.zeros(self.counts.shape[1], dtype=np.int64)
+        for c in x:
+            k = self.alphabet.get(c)
+            if k is not None:
+                counts[k] += 1
+        return np.minimum(self.counts, counts).sum(axis=1)
+
+
+class RatioScorer(CharacterCounts):
+    """difflib ratio, bounded by quick_ratio from the character counts
+    Every candidate gets a SequenceMatcher with the candidate as its cached
+    second sequence.
+    Args:
+    candidates (list): strings to match against
+    """
+
+    def __init__(self, candidates):
+        super().__init__(candidates)
+        self.matchers = [None] * len(self.candidates)
+
+    def upper_bounds(self, x):
+        """quick_ratio of an item against every candidate, an upper bound of its ratio
+        Args:
+        x (str): item
+        """
+        total = self.lengths + len(x)
+        return np.where(total > 0, 2.0 * self.matches(x) / np.maximum(total, 1), 1.0)
+
+    def score(self, x, k):
+        """difflib ratio between an item and candidate k
+        Args:
+        x (str): item
+        k (int): candidate index
+        """
+        matcher = self.matchers[k]
+        if matcher is None:
+            matcher = self.matchers[k] = difflib.SequenceMatcher(None, '', self.candidates[k])
+        matcher.set_seq1(x)
+        return matcher.ratio()
+
+
+def jaro_winkler(x, y, prefix_scale=0.1):
+    """Jaro-Winkler similarity of two strings
+    Args:
+    x (str): first string
+    y (str): second string
+    prefix_scale (float): weight of the common prefix, up to 4 characters
+    """
+    if not x and not y:
+        return 1.0
+    window = max(max(len(x), len(y)) // 2 - 1, 0)
+    x_matched = [False] * len(x)
+    y_matched = [False] * len(y)
+    m = 0
+    for i, c in enumerate(x):
+        for j in range(max(0, i - window), min(len(y), i + window + 1)):
+            if not y_matched[j] and y[j] == c:
+                x_matched[i] = y_matched[j] = True
+                m += 1
+                break
+    if m == 0:
+        return 0.0
+    y_chars = [c for c, matched in zip(y, y_matched) if matched]
+    t = sum(c != d for c, d in zip((c for c, matched in zip(x, x_matched) if matched), y_chars)) // 2
+    jaro = (m / len(x) + m / len(y) + (m - t) / m) / 3
+    prefix = 0
+    for c, d in zip(x[:4], y[:4]):
+        if c != d:
+            break
+        prefix += 1
+    return jaro + prefix * prefix_scale * (1 - jaro)
+
+
+class JaroWinklerScorer(CharacterCounts):
+    """Jaro-Winkler similarity, bounded with the character counts as the matches,
+    no transpositions and the common prefix of up to 4 characters
+    Args:
+    candidates (list): strings to match against
+    """
+
+    def __init__(self, candidates):
+        super().__init__(candidates)
+        #code points of the first 4 characters, -1 past the end
+        self.heads = np.full((len(self.candidates), 4), -1, dtype=np.int64)
+        for k, candidate in enumerate(self.candidates):
+            self.heads[k, :len(candidate[:4])] = [ord(c) for c in candidate[:4]]
+
+    def upper_bounds(self, x):
+        """Upper bound of the Jaro-Winkler similarity of an item against every candidate
+        Args:
+        x (str): item
+        """
+        m = self.matches(x)
+        head = np.full(4, -2, dtype=np.int64)
+        head[:len(x[:4])] = [ord(c) for c in x[:4]]
+        prefix = np.cumprod(self.heads == head, axis=1).sum(axis=1)
+        jaro = (m / max(len(x), 1) + m / np.maximum(self.lengths, 1) + 1.0) / 3
+        bounds = np.where(m > 0, jaro + prefix * 0.1 * (1 - jaro), 0.0)
+        return np.where((self.lengths == 0) & (len(x) == 0), 1.0, bounds)
+
+    def score(self, x, k):
+        """Jaro-Winkler similarity between an item and candidate k
+        Args:
+        x (str): item
+        k (int): candidate index
+        """
+        return jaro_winkler(x, self.candidates[k])
+
+
+def get_words(x):
+    """Set of the upper case words of a value, split at anything but letters and digits"""
+    return set(re.findall(r'[0-9A-Z]+', x.upper()))
+
+
+class TokenSetScorer:
+    """Dice coefficient of the word sets, e.g. 'CONC RND' and 'RND_CONC' score 1.
+    The words of the candidates are indexed, so the bounds are the exact
+    scores of all candidates at once.
+    Args:
+    candidates (list): strings to match against
+    """
+
+    def __init__(self, candidates):
+        self.candidates = candidates
+        self.words = [get_words(candidate) for candidate in self.candidates]
+        self.sizes = np.array([len(words) for words in self.words], dtype=np.int64)
+        self.index = collections.defaultdict(list)
+        for k, words in enumerate(self.words):
+            for word in words:
+                self.index[word].append(k)
+
+    def upper_bounds(self, x):
+        """Token set score of an item against every candidate
+        Args:
+        x (str): item
+        """
+        words = get_words(x)
+        common = np.zeros(len(self.candidates), dtype=np.int64)
+        for word in words:
+            np.add.at(common, self.index.get(word, []), 1)
+        total = self.sizes + len(words)
+        return np.where(total > 0, 2.0 * common / np.maximum(total, 1), 1.0)
+
+    def score(self, x, k):
+        """Token set score between an item and candidate k
+        Args:
+        x (str): item
+        k (int): candidate index
+        """
+        words = get_words(x)
+        total = len(words) + len(self.words[k])
+        return 2.0 * len(words & self.words[k]) / total if total else 1.0
+
+
+def normalize_code(x):
+    """Upper case letters and digits of a value, e.g. 'Cast Iron' and 'CAST_IRON' -> 'CASTIRON'"""
+    return ''.join(re.findall(r'[0-9A-Z]+', x.upper()))
+
+
+class CodeScorer:
+    """1 for candidates equal to an item once both are normalized with normalize_code, 0 otherwise
+    Args:
+    candidates (list): strings to match against
+    """
+
+    def __init__(self, candidates):
+        self.candidates = candidates
+        self.codes = [normalize_code(candidate) for candidate in self.candidates]
+        self.index = collections.defaultdict(list)
+        for k, code in enumerate(self.codes):
+            self.index[code].append(k)
+
+    def upper_bounds(self, x):
+        """Code equality of an item against every candidate
+        Args:
+        x (str): item
+        """
+        bounds = np.zeros(len(self.candidates))
+        bounds[self.index.get(normalize_code(x), [])] = 1.0
+        return bounds
+
+    def score(self, x, k):
+        """Code equality between an item and candidate k
+        Args:
+        x (str): item
+        k (int): candidate index
+        """
+        return 1.0 if normalize_code(x) == self.codes[k] else 0.0
+
+
+#scorers by name, each with upper_bounds(x) for all candidates and score(x, k) for one
+SCORERS = {
+    'ratio': RatioScorer,
+    'token_set': TokenSetScorer,
+    'jaro_winkler': JaroWinklerScorer,
+    'code': CodeScorer,
+}
+
+
+class SimilarityMatcher:
+    """Find the most similar candidates of many items.
+    Built once over the candidates with one of the SCORERS. For an item, the
+    scorer bounds the score of every candidate in one NumPy step; candidates
+    are then scored in decreasing bound order until no remaining one can
+    get into the top k.
+    Args:
+    candidates (list): strings to match against
+    scorer (str): name of the scorer in SCORERS
+    """
+
+    def __init__(self, candidates, scorer='ratio'):
+        self.candidates = list(candidates)
+        self.scorer = SCORERS[scorer](self.candidates)
+
+    def top(self, x, k=1):
+        """Get the k highest scoring candidates; ties go to the earlier candidate
+        Args:
+        x (str): item
+        k (int): number of candidates
+        Returns:
+        list: (score, candidate) pairs, highest score first
+        """
+        if not self.candidates or k < 1:
+            return []
+        bounds = self.scorer.upper_bounds(x)
+        #min-heap of (score, -index), its first item is the worst kept candidate
+        heap = []
+        for index in np.argsort(-bounds, kind='stable'):
+            index = int(index)
+            if len(heap) == k:
+                worst_score, worst_index = heap[0]
+                #later candidates have a lower bound, or the same bound and a later index
+                if bounds[index] < worst_score or (bounds[index] == worst_score and index > -worst_index):
+                    break
+            score = self.scorer.score(x, index) if bounds[index] > 0 else 0.0
+            if len(heap) < k:
+                heapq.heappush(heap, (score, -index))
+            elif (score, -index) > heap[0]:
+                heapq.heapreplace(heap, (score, -index))
+        return [(score, self.candidates[-index]) for score, index in sorted(heap, reverse=True)]
+
+    def best(self, x):
+        """Get the highest scoring candidate; ties go to the earlier candidate
+        Args:
+        x (str): item
+        Returns:
+        tuple: highest score and its candidate, (0, '') if there are no candidates
+        """
+        matches = self.top(x, 1)
+        return matches[0] if matches else (0, '')
+
+
+def max_similarity(x,Y,matcher=None):
     """Get the highest similarity item
     Args:
     x (str) : item 
     Y (list) : list
+    matcher (SimilarityMatcher): matcher built over Y, to reuse it across items
+    Returns:
+    tuple: highest similarity and its item, the first one of Y on ties
     """
-    max_sim = 0
-    max_match = ''
-    for y in Y:
-        similarity = difflib.SequenceMatcher(None, x, y).ratio()
-        if similarity >= max_sim:
-            max_sim = similarity
-            max_match = y
-    return similarity, max_match
+    if matcher is None:
+        matcher = SimilarityMatcher(Y)
+    return matcher.best(x)
 
 
-def auto_mapping(CCC_List,LINZ_List):
+def auto_mapping(CCC_List,LINZ_List,top_k=1,scorer='ratio',threshold=0.1):
     """Map the two lists automatically and create a dataframe
     Args:
     CCC_List (list): list of CCC (attributes, codelist values)
     LINZ_List (list): list of LINZ (attributes, codelist values)
+    top_k (int): number of ranked candidates per CCC item, the best one is its mapping
+    scorer (str): name of the scorer in SCORERS
+    threshold (float): candidates need a higher score than this
+    Returns:
+    pd.DataFrame: CCC, LINZ and Similarity columns, and with top_k above 1 an
+    Alternatives column with the other candidates and their scores
     """
     mapping_dict = {}
     similarity_mapping_dict = {}
+    alternatives_dict = {}
+    matcher = SimilarityMatcher(LINZ_List, scorer)
     for item in CCC_List:
-        similarity, max_match = max_similarity(item.upper(), LINZ_List)
-        if similarity > 0.1:
-            mapping_dict[item] = max_match
-            similarity_mapping_dict[item] = similarity
-    data = pd.DataFrame({'CCC':CCC_List},index = range(len(CCC_List)))
-    data['LINZ'] = data['CCC'].map(mapping_dict)
-    data['Similarity'] = data['CCC'].map(similarity_mapping_dict)
+        matches = [(similarity, match) for similarity, match in matcher.top(item.upper(), top_k) if similarity > threshold]
+        if matches:
+            similarity_mapping_dict[item], mapping_dict[item] = matches[0]
+            alternatives_dict[item] = '; '.join(f'{match} ({similarity:.2f})' for similarity, match in matches[1:])
+    records = [{'CCC':item,'LINZ':mapping_dict.get(item,np.nan),'Similarity':similarity_mapping_dict.get(item,np.nan),
+                'Alternatives':alternatives_dict.get(item,np.nan)} for item in CCC_List]
     values = mapping_dict.values()
-    notinCCC = set(LINZ_List)^set(values)
-    for item in notinCCC:
-        data = data.append([{'LINZ':item}],ignore_index=True)
-    return data  
+    notinCCC = symmetric_difference(LINZ_List,values)
+    records.extend({'LINZ':item} for item in notinCCC)
+    columns = ['CCC','LINZ','Similarity'] + (['Alternatives'] if top_k > 1 else [])
+    return pd.DataFrame(records, columns=columns)
 
    
+def symmetric_difference(A,B):
+    """Get the items that are only in one of the two lists, in list order
+    Args:
+    A (list): first list, its items come first
+    B (list): second list
+    """
+    A = dict.fromkeys(A)
+    B = dict.fromkeys(B)
+    return [item for item in A if item not in B] + [item for item in B if item not in A]
+
+
 def content(CCC,LINZ):
     """add content"""
-    if CCC is np.nan and LINZ is not np.nan:
+    if pd.isna(CCC) and not pd.isna(LINZ):
         return "Not in CCC"
-    elif CCC is not np.nan and LINZ is np.nan:
+    elif not pd.isna(CCC) and pd.isna(LINZ):
         return "Not in LINZ"
     elif CCC == LINZ:
         return "Match"
@@ -73,438 +381,804 @@ def mapping_analyze(CCC_List,LINZ_List,mapping_dict):
     LINZ_List (list): LINZ item list
     mapping_dict (dict): item mapping dictionary
     """
-    data = pd.DataFrame({'CCC':CCC_List},index = range(len(CCC_List)))
-    data['LINZ'] = data['CCC'].map(mapping_dict)
+    records = [{'CCC':item,'LINZ':mapping_dict.get(item,np.nan)} for item in CCC_List]
     values = list(mapping_dict.values())
-    notinCCC = list(set(LINZ_List)^set(values))
-    for item in notinCCC:
-        data = data.append([{'LINZ':item}],ignore_index=True)
+    notinCCC = symmetric_difference(LINZ_List,values)
+    records.extend({'LINZ':item} for item in notinCCC)
+    data = pd.DataFrame(records, columns=['CCC','LINZ'])
     data['Content'] = data.apply(lambda x: content(x.CCC, x.LINZ), axis = 1)
     return data      
-                
 
-if __name__ == '__main__':
+
+def get_layer_files(csv_path):
+    """Get the extracted layer table files by layer, preferring Parquet over CSV
+    Args:
+    csv_path (str): layers folder written by CCC_gdb_to_geometry.py
+    """
+    layer_files = {}
+    for file_name in sorted(os.listdir(csv_path)):
+        name, extension = os.path.splitext(file_name)
+        if extension == '.parquet' or name not in layer_files:
+            layer_files[name] = file_name
+    return layer_files
+
+
+def read_layer_columns(path):
+    """Get the column names of a layer table without reading its rows
+    Args:
+    path (str): (layer).csv or (layer).parquet file
+    """
+    if path.endswith('.parquet'):
+        return list(pq.read_schema(path).names)
+    return list(pd.read_csv(path, nrows=0, encoding='cp1252').columns)
+
+
+LAYER_CHUNK_SIZE = 100000
+
+
+def iter_layer_chunks(path, columns, chunksize=LAYER_CHUNK_SIZE):
+    """Read only the given columns of a layer table, a chunk of rows at a time
+    Args:
+    path (str): (layer).csv or (layer).parquet file
+    columns (list): columns to read
+    chunksize (int): number of rows per chunk
+    """
+    if path.endswith('.parquet'):
+        for batch in pq.ParquetFile(path).iter_batches(batch_size=chunksize, columns=columns):
+            yield batch.to_pandas()
+        return
+    yield from pd.read_csv(path, usecols=columns, chunksize=chunksize, encoding='cp1252')
+
+
+def as_key(value):
+    """Text form of a counted value, integral floats without their '.0'"""
+    if isinstance(value, (float, np.floating)) and float(value).is_integer():
+        return str(int(value))
+    return str(value)
+
+
+def count_layer_values(path, columns, chunksize=LAYER_CHUNK_SIZE):
+    """Count the values of some columns of a layer table, chunk by chunk
+    Args:
+    path (str): (layer).csv or (layer).parquet file
+    columns (list): columns to count
+    chunksize (int): number of rows per chunk
+    Returns:
+    dict: Counter of the values by column
+    """
+    counts = {column: collections.Counter() for column in columns}
+    if not columns:
+        return counts
+    for chunk in iter_layer_chunks(path, columns, chunksize):
+        for column in columns:
+            counts[column].update(chunk[column].value_counts().to_dict())
+    for column, counter in counts.items():
+        #CSV chunks can infer different types for the same column, a column
+        #with any text is text throughout, as when it is read in one go
+        if any(isinstance(value, str) for value in counter):
+            text_counter = collections.Counter()
+            for value, count in counter.items():
+                text_counter[as_key(value)] += count
+            counts[column] = text_counter
+    return counts
+
+
+METADATA_CACHE = '.metadata_cache'
+
+
+def get_file_hash(path):
+    """Get the sha256 hash of a file's contents
+    Args:
+    path (str): file
+    """
+    sha = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            sha.update(block)
+    return sha.hexdigest()
+
+
+def read_excel_cached(path, sheet_name, cache_path):
+    """Read a workbook sheet through an on-disk pickle cache
+    The cache file is keyed by workbook path, sheet name and the hash of the
+    workbook, so an edited workbook is parsed again and replaces its old entry.
+    Args:
+    path (str): workbook
+    sheet_name (str): sheet
+    cache_path (str): cache folder
+    """
+    os.makedirs(cache_path, exist_ok=True)
+    key = hashlib.sha256(os.path.abspath(path).encode('utf-8')).hexdigest()[:8]
+    stem = re.sub(r'[^\w.-]+', '_', f'{os.path.basename(path)}-{sheet_name}') + f'-{key}'
+    cache_file = os.path.join(cache_path, f'{stem}-{get_file_hash(path)[:16]}.pkl')
+    if os.path.exists(cache_file):
+        try:
+            return pd.read_pickle(cache_file)
+        except (OSError, EOFError, pickle.UnpicklingError):
+            pass
+    data = pd.read_excel(path, sheet_name=sheet_name)
+    for old_file in glob.glob(os.path.join(glob.escape(cache_path), glob.escape(stem) + '-*.pkl')):
+        #another job reading the same workbook may have removed it already
+        try:
+            os.remove(old_file)
+        except FileNotFoundError:
+            pass
+    temp_file = f'{cache_file}.{os.getpid()}.tmp'
+    data.to_pickle(temp_file)
+    os.replace(temp_file, cache_file)
+    return data
+
+
+def group_lists(df, key, value):
+    """Group the values of a column by a key column, keeping sheet order
+    Args:
+    df (pd.DataFrame): sheet
+    key (str): key column, rows with an empty key are left out
+    value (str): value column
+    Returns:
+    dict: list of values by key
+    """
+    return {k: list(v) for k, v in df.groupby(key, sort=False)[value]}
+
+
+def group_first(df, key, name, value):
+    """Look up the value of the first row of every (key, name) pair
+    Args:
+    df (pd.DataFrame): sheet
+    key (str): outer key column, e.g. the model or asset class
+    name (str): inner key column, e.g. the attribute name
+    value (str): value column
+    Returns:
+    dict: value by name by key
+    """
+    lookup = {}
+    for k, n, v in df[[key, name, value]].drop_duplicates([key, name]).itertuples(index=False):
+        lookup.setdefault(k, {})[n] = v
+    return lookup
+
+
+class MetadataIndex:
+    """Hash-keyed lookups over the CCC and LINZ metadata standards.
+    Built once per run and shared by every network and asset class, instead
+    of scanning the sheets with a boolean mask for every attribute.
+    Args:
+    CCC_attributes_data (pd.DataFrame): 'Asset Attributes' sheet of GISAssetModels.xlsx
+    CCC_codelist_data (pd.DataFrame): 'Asset Domain Tables (full)' sheet of GISAssetModels.xlsx
+    LINZ_attributes_data (pd.DataFrame): 'Data' sheet of LINZStandards_3Waters.xlsx
+    LINZ_codelist_data (pd.DataFrame): 'Codes' sheet of LINZStandards_3Waters.xlsx
+    """
+
+    def __init__(self, CCC_attributes_data, CCC_codelist_data, LINZ_attributes_data, LINZ_codelist_data):
+        #model -> attributes, model -> attribute -> data type
+        self.CCC_attributes = group_lists(CCC_attributes_data, 'GISModelName', 'GISAttributeName')
+        CCC_attri_type = CCC_attributes_data[['GISModelName','GISAttributeName','GISAttributeDataType']].dropna(axis=0, how='any')
+        self.CCC_types = group_first(CCC_attri_type, 'GISModelName', 'GISAttributeName', 'GISAttributeDataType')
+
+        #model -> attribute -> codelist, model -> codelists, codelist -> values
+        self.CCC_attribute_codelists = group_first(CCC_codelist_data, 'GISModelName', 'GISAttributeName', 'GISDomainTableName')
+        self.CCC_codelists = group_lists(CCC_codelist_data, 'GISModelName', 'GISDomainTableName')
+        self.CCC_codelist_values = group_lists(CCC_codelist_data, 'GISDomainTableName', 'GISDomainValue')
+
+        #asset class -> attributes, asset class -> attribute -> data type
+        self.LINZ_attributes = group_lists(LINZ_attributes_data, 'Asset Class', 'Attribute Name - Abbreviated')
+        LINZ_attri_type = LINZ_attributes_data[['Asset Class','Attribute Name - Abbreviated','Data Type']].dropna(axis=0, how='any')
+        self.LINZ_types = group_first(LINZ_attri_type, 'Asset Class', 'Attribute Name - Abbreviated', 'Data Type')
+
+        #asset class -> attribute -> codelist (empty for attributes without one), asset class -> codelists
+        self.LINZ_attribute_codelists = group_first(LINZ_attributes_data, 'Asset Class', 'Attribute Name - Abbreviated', 'CODELIST Reference')
+        LINZ_df = LINZ_attributes_data[['Asset Class','Attribute Name - Abbreviated','CODELIST Reference']].dropna(axis=0, how='any')
+        self.LINZ_codelists = group_lists(LINZ_df, 'Asset Class', 'CODELIST Reference')
+
+        #asset class -> codelist -> attribute, the last attribute using a codelist wins
+        self.LINZ_codelist_attributes = {}
+        LINZ_first_codelist = group_first(LINZ_df, 'Asset Class', 'Attribute Name - Abbreviated', 'CODELIST Reference')
+        for linz_asset, attributes in group_lists(LINZ_df, 'Asset Class', 'Attribute Name - Abbreviated').items():
+            LINZdict = self.LINZ_codelist_attributes[linz_asset] = {}
+            for attribute in attributes:
+                LINZdict[LINZ_first_codelist[linz_asset][attribute]] = attribute
+
+        #codelist -> codes
+        self.LINZ_codelist_values = group_lists(LINZ_codelist_data, 'Codelist', 'Code')
+
+
+#network prefixes of the CCC model and attribute names, dropped before matching
+ATTRIBUTE_PREFIXES = ('Sw', 'Ww', 'Ws')
+
+#LINZ abbreviations (and a few CCC ones) by their lower case token
+ATTRIBUTE_ABBREVIATIONS = {
+    'ac': 'access chamber',
+    'bel': 'below',
+    'cap': 'capacity',
+    'chamb': 'chamber',
+    'const': 'construction',
+    'desc': 'description',
+    'dia': 'diameter',
+    'dir': 'direction',
+    'drv': 'derived',
+    'elev': 'elevation',
+    'fit': 'fitting',
+    'from': 'upstream',
+    'grnd': 'ground',
+    'il': 'invert level',
+    'instl': 'installation',
+    'int': 'inside',
+    'len': 'length',
+    'loc': 'location',
+    'manu': 'manufacturer',
+    'mat': 'material',
+    'mtd': 'method',
+    'mthd': 'method',
+    'no': 'number',
+    'nom': 'nominal',
+    'num': 'number',
+    'op': 'operation',
+    'pn': 'pressure',
+    'qty': 'quantity',
+    'rl': 'level',
+    'sn': 'stiffness',
+    'to': 'downstream',
+    'yr': 'year',
+}
+
+#data type groups, by words of the CCC or LINZ data type name, checked in order
+ATTRIBUTE_TYPE_GROUPS = [
+    ('date', ('date', 'time')),
+    ('number', ('int', 'double', 'float', 'decimal', 'numeric', 'number', 'real')),
+    ('text', ('str', 'text', 'char', 'guid', 'globalid')),
+    ('boolean', ('bool', 'yes/no')),
+]
+
+
+def split_attribute_name(name):
+    """Split an attribute name into words, at underscores, spaces and CamelCase
+    e.g. SwPipeNominalDiameter -> Sw Pipe Nominal Diameter, Rl_Rn_Mtd -> Rl Rn Mtd, PShape -> P Shape
+    Args:
+    name (str): attribute or model name
+    """
+    return re.findall(r'[A-Z]+(?![a-z])|[A-Z]?[a-z]+|\d+', str(name))
+
+
+def attribute_tokens(name, model=None):
+    """Normalized words of an attribute name, for blocking and scoring
+    The network prefix is dropped, abbreviations are expanded and plurals are
+    made singular. Words of the model name (e.g. pipe in SwPipeNominalDiameter)
+    are dropped as well, unless nothing else is left.
+    Args:
+    name (str): attribute name
+    model (str): CCC model of the attribute, None for LINZ attributes
+    Returns:
+    tuple: lower case words
+    """
+    words = split_attribute_name(name)
+    if len(words) > 1 and words[0] in ATTRIBUTE_PREFIXES:
+        words = words[1:]
+    tokens = []
+    for word in words:
+        word = word.lower()
+        for token in ATTRIBUTE_ABBREVIATIONS.get(word, word).split():
+            if len(token) > 3 and token.endswith('s') and not token.endswith(('ss', 'us', 'is')):
+                token = token[:-1]
+            tokens.append(token)
+    if model is not None:
+        model_tokens = set(attribute_tokens(model))
+        rest = [token for token in tokens if token not in model_tokens]
+        if rest:
+            tokens = rest
+    return tuple(tokens)
+
+
+def get_type_group(data_type):
+    """Group of a CCC or LINZ data type (date, number, text or boolean), None if unknown
+    Args:
+    data_type (str): e.g. Long Integer, Double, String (CCC) or Integer, Decimal, Text (LINZ)
+    """
+    if not isinstance(data_type, str):
+        return None
+    data_type = data_type.lower()
+    for group, words in ATTRIBUTE_TYPE_GROUPS:
+        if any(word in data_type for word in words):
+            return group
+    return None
+
+
+def types_compatible(CCC_group, LINZ_group):
+    """Whether a CCC attribute of one type group can fill a LINZ attribute of another
+    Unknown types are compatible with anything, and numbers can go into text
+    (e.g. integer asset ids into a text Unique_ID).
+    Args:
+    CCC_group (str): type group of the CCC attribute
+    LINZ_group (str): type group of the LINZ attribute
+    """
+    if CCC_group is None or LINZ_group is None or CCC_group == LINZ_group:
+        return True
+    return CCC_group == 'number' and LINZ_group == 'text'
+
+
+class AttributeMatcher:
+    """Suggest LINZ attributes for CCC attributes across the whole LINZ standard.
+    Built once: every LINZ attribute is normalized with attribute_tokens and
+    put in an inverted index by token. A CCC attribute is then only scored
+    (difflib ratio of the normalized names) against the LINZ attributes that
+    share a token with it and have a compatible data type, not against every
+    attribute of every asset class.
+    Args:
+    metadata (MetadataIndex): CCC and LINZ metadata standards
+    """
+
+    def __init__(self, metadata):
+        #(asset class, attribute), its type group and normalized name, by index
+        self.attributes = []
+        self.groups = []
+        self.names = []
+        self.index = collections.defaultdict(list)
+        for linz_asset, attributes in metadata.LINZ_attributes.items():
+            types = metadata.LINZ_types.get(linz_asset, {})
+            for attribute in dict.fromkeys(attributes):
+                tokens = attribute_tokens(attribute)
+                for token in dict.fromkeys(tokens):
+                    self.index[token].append(len(self.attributes))
+                self.attributes.append((linz_asset, attribute))
+                self.groups.append(get_type_group(types.get(attribute)))
+                self.names.append(' '.join(tokens))
+        self.matchers = [None] * len(self.attributes)
+
+    def candidates(self, tokens, data_type=None, linz_assets=None):
+        """LINZ attributes sharing a token with a CCC attribute and of a compatible type
+        Args:
+        tokens (tuple): normalized words of the CCC attribute
+        data_type (str): CCC data type, None if unknown
+        linz_assets (set): LINZ asset classes to look in, None for all of them
+        Returns:
+        list: indices of the LINZ attributes, in standard order
+        """
+        group = get_type_group(data_type)
+        found = set()
+        for token in tokens:
+            found.update(self.index.get(token, ()))
+        return sorted(k for k in found
+                      if (linz_assets is None or self.attributes[k][0] in linz_assets)
+                      and types_compatible(group, self.groups[k]))
+
+    def ratio(self, name, k):
+        """difflib ratio between a normalized CCC name and LINZ attribute k
+        Args:
+        name (str): normalized CCC attribute name
+        k (int): LINZ attribute index
+        """
+        matcher = self.matchers[k]
+        if matcher is None:
+            matcher = self.matchers[k] = difflib.SequenceMatcher(None, '', self.names[k])
+        matcher.set_seq1(name)
+        return matcher.ratio()
+
+    def best(self, attribute, data_type=None, model=None, linz_assets=None):
+        """Get the most similar LINZ attribute of a CCC attribute; ties go to the earlier one
+        Args:
+        attribute (str): CCC attribute name
+        data_type (str): CCC data type, None if unknown
+        model (str): CCC model of the attribute
+        linz_assets (set): LINZ asset classes to look in, None for all of them
+        Returns:
+        tuple: ratio, LINZ asset class and LINZ attribute, (0, None, None) without a candidate
+        """
+        tokens = attribute_tokens(attribute, model)
+        name = ' '.join(tokens)
+        max_sim = 0
+        max_index = None
+        for k in self.candidates(tokens, data_type, linz_assets):
+            similarity = self.ratio(name, k)
+            if max_index is None or similarity > max_sim:
+                max_sim = similarity
+                max_index = k
+        if max_index is None:
+            return 0, None, None
+        return (max_sim,) + self.attributes[max_index]
+
+
+def suggest_attributes(metadata, networks, matcher=None):
+    """Suggest a LINZ attribute for every attribute of every CCC model
+    Models in the asset class mapping of a network are matched against their
+    LINZ asset class only, other models against the whole LINZ standard.
+    Args:
+    metadata (MetadataIndex): CCC and LINZ metadata standards
+    networks (list): registry networks, for their asset class and attributes mappings
+    matcher (AttributeMatcher): matcher built over metadata, to reuse it
+    Returns:
+    pd.DataFrame: one row per CCC attribute, with the mapped LINZ attribute if there is one
+    """
+    if matcher is None:
+        matcher = AttributeMatcher(metadata)
+    #the first network mapping a model wins
+    asset_classes = {}
+    attributes_mappings = {}
+    for network in networks:
+        for item, linz_asset in network['Asset_Class_mapping'].items():
+            asset_classes.setdefault(item, linz_asset)
+            attributes_mappings.setdefault(item, network['attributes_mapping'].get(item, {}))
+    records = []
+    for model, attributes in metadata.CCC_attributes.items():
+        CCCtypedict = metadata.CCC_types.get(model, {})
+        linz_assets = {asset_classes[model]} if model in asset_classes else None
+        mapping = attributes_mappings.get(model, {})
+        for attribute in dict.fromkeys(attributes):
+            data_type = CCCtypedict.get(attribute)
+            similarity, linz_asset, linz_attribute = matcher.best(attribute, data_type, model, linz_assets)
+            records.append({
+                'CCC Model': model,
+                'CCC Attribute': attribute,
+                'CCC Attribute Data Type': data_type,
+                'LINZ Asset Class': linz_asset if linz_asset is not None else asset_classes.get(model),
+                'LINZ Attribute': linz_attribute,
+                'LINZ Attribute Data Type': metadata.LINZ_types.get(linz_asset, {}).get(linz_attribute),
+                'Similarity': similarity if linz_attribute is not None else np.nan,
+                'Mapped LINZ Attribute': mapping.get(attribute),
+            })
+    columns = ['CCC Model','CCC Attribute','CCC Attribute Data Type','LINZ Asset Class','LINZ Attribute',
+               'LINZ Attribute Data Type','Similarity','Mapped LINZ Attribute']
+    data = pd.DataFrame(records, columns=columns)
+    data['Mapping Check'] = ['Not mapped' if pd.isna(mapped) else ('Same as mapping' if mapped == suggested else 'Differs from mapping')
+                             for mapped, suggested in zip(data['Mapped LINZ Attribute'], data['LINZ Attribute'])]
+    return data.fillna({'LINZ Attribute':'No Candidate in LINZ.'})
+
+
+WORKBOOK_CREATED = datetime.datetime(2000, 1, 1)
+
+
+def write_gap_analysis(metadata, network, item, linz_asset, out_path, matching=None, instrumentation=None):
+    """Write the gap analysis workbook of one asset class
+    Args:
+    metadata (MetadataIndex): CCC and LINZ metadata standards
+    network (dict): network with its asset class and attributes mapping
+    item (str): CCC asset class
+    linz_asset (str): LINZ asset class
+    out_path (str): output folder, holding the layers written by CCC_gdb_to_geometry.py
+    matching (dict): auto_mapping keyword arguments (top_k, scorer) for the codelist values
+    instrumentation (CCC_instrumentation.Instrumentation): records the time of every step under the asset class
+    Returns:
+    str: workbook path
+    """
+    if instrumentation is None:
+        instrumentation = CCC_instrumentation.Instrumentation()
+    if matching is None:
+        matching = {}
+    linz_path = os.path.join(out_path, network['council'], 'LINZ', 'LINZ mapping')
     
+    #get the layer file name
+    csv_path = os.path.join(out_path,network['council'],network['network'],'layers')
+    CCC_layer_files = get_layer_files(csv_path)
     
-    in_path = '/Users/wujing/Desktop/Inputs'
-    out_path = "/Users/wujing/Desktop/Outputs" 
+    timer = instrumentation.start(item, 'attributes')
+    #analysis for Asset Class
+    asset = [item]
+    LINZ_asset = [network['Asset_Class_mapping'][item]]
+    asset_mapping_dict = dict([(key, network['Asset_Class_mapping'][key]) for key in asset])
+    data_asset = mapping_analyze(asset,LINZ_asset,asset_mapping_dict)
     
-    networks = [
-        {
-            'council': 'Christchurch City Council',
-            'network': 'Stormwater',
-            'Asset_Class_mapping': {'SwPipe':'Pipe',
-                                    'SwAccess':'Chamber',
-                                    'SwFitting':'Fittings',
-                                    'SwValve':'Valve',
-                                    'SwPump':'Pump'},
-            'attributes_mapping':{'SwPipe':{'SwPipeID':'Unique_ID',
-                                            'SwPipeType':'Purpose',
-                                            'SwPipeServiceStatus':'Status',
-                                            'SwPipeOwnership':'Owner',
-                                            'CommissionDate':'Const_Date',
-                                            'SwPipeManufacturer':'Manu',
-                                            'SwPipeNominalDiameter':'Nom_Dia',
-                                            'InsideDiameter':'Int_Dia',
-                                            'SwPipeConstruction':'Material',
-                                            'SwPipePressureClass':'Class_Pn',
-                                            'SwPipeStiffnessClass':'Class_Sn',
-                                            'SwPipeLoadClass':'Class_Load',
-                                            'SwPipeShape':'PShape',
-                                            'NominalHeight':'P_Height',
-                                            'NominalWidth':'P_Width',
-                                            'SwPipeInstallationMethod':'Instl_Mthd',
-                                            'UpstreamInvert':'From_IL',
-                                            'DownstreamInvert':'To_IL',
-                                            'UpstreamFeatureID':'From_Node',
-                                            'DownstreamFeatureID':'To_Node',
-                                            'SwPipeTreatment':'Rl_Rn_Mtd',
-                                            'SwPipeTreatmentConstruction':'Rl_Rn_Mat',
-                                            'drvLength':'Length_m',
-                                            'Comment':'Comments'},
-                                  'SwAccess':{'SwAccessID':'Unique_ID',
-                                              'SwAccessType':'Type_Chamb', 
-                                              'SwAccessServiceStatus':'Status', 
-                                              'SwAccessOwnership':'Owner',
-                                              'CommissionDate':'Const_Date', 
-                                              'LidLevel':'Lid_RL', 
-                                              'BaseLevel':'RL',
-                                              'PitWidth':'AC_Width', 
-                                              'PitLength':'AC_Length',
-                                              'SwAccessConstruction':'Material',
-                                              'SwAccessLidStyle':'Lid_Type', 
-                                              'SwAccessSecurity':'Seal_Type',
-                                              'Comment':'Comments'},
-                                  'SwFitting':{'SwFittingID':'Unique_ID', 
-                                               'SwFittingType':'Type_Fit', 
-                                               'SwFittingServiceStatus':'Status', 
-                                               'SwFittingOwnership':'Owner',
-                                               'CommissionDate':'Const_Date', 
-                                               'DecommissionDate':'Manu_W',
-                                               'Comment':'Comments'},
-                                  'SwValve':{'SwValveID':'Unique_ID', 
-                                             'SwValveType':'Type_Valve', 
-                                             'SwValveServiceStatus':'Status', 
-                                             'SwValveOwnership':'Owner',
-                                             'SwValveLocationCertainty':'Open_Shut',
-                                             'CommissionDate':'Const_Date', 
-                                             'SwValveInstallationCompany':'Installer', 
-                                             'SwValveManufacturer':'Manu', 
-                                             'ManufacturerWarrantyEndDate':'Manu_W', 
-                                             'LidLevel':'Valve_RL', 
-                                             'SwValveNominalDiameter':'Size', 
-                                             'SwValveConstruction':'Material', 
-                                             'SwValveFunction':'Purpose', 
-                                             'SwValveClosureRotation':'Close_Dir',
-                                             'SwValveControlPoint':'Bel_Grnd',
-                                             'SwValveActuation':'Op_Mode',
-                                             'Comment':'Comments'},
-                                  'SwPump':{'SwPumpID':'Unique_ID', 
-                                            'SwPumpType':'Pump_Type',  
-                                            'SwPumpServiceStatus':'Status',  
-                                            'SwPumpOwnership':'Owner', 
-                                            'CommissionDate':'Const_Date',  
-                                            'SwPumpManufacturer':'P_Manu', 
-                                            'ManufacturerWarrantyEndDate':'Manu_W',  
-                                            'PumpSerialNumber':'P_Serial',  
-                                            'PumpCapacity':'P_Rate', 
-                                            'Comment':'Comments'}}
-        },
-        {
-            'council': 'Christchurch City Council',
-            'network': 'Wastewater',
-            'Asset_Class_mapping': {'WwPipe':'Pipe',
-                                    'WwAccess':'Chamber',
-                                    'WwFitting':'Fittings',
-                                    'WwValve':'Valve',
-                                    'WwPump':'Pump'},
-            'attributes_mapping':{'WwPipe':{'WwPipeID':'Unique_ID',
-                                            'WwPipeType':'Purpose',
-                                            'WwPipeServiceStatus':'Status',
-                                            'WwPipeOwnership':'Owner',
-                                            'CommissionDate':'Const_Date',
-                                            'WwPipeManufacturer':'Manu',
-                                            'WwPipeNominalDiameter':'Nom_Dia',
-                                            'InsideDiameter':'Int_Dia',
-                                            'WwPipeConstruction':'Material',
-                                            'WwPipePressureClass':'Class_Pn',
-                                            'WwPipeStiffnessClass':'Class_Sn',
-                                            'WwPipeLoadClass':'Class_Load',
-                                            'WwPipeShape':'PShape',
-                                            'NominalHeight':'P_Height',
-                                            'NominalWidth':'P_Width',
-                                            'WwPipeInstallationMethod':'Instl_Mthd',
-                                            'UpstreamInvert':'From_IL',
-                                            'DownstreamInvert':'To_IL',
-                                            'UpstreamFeatureID':'From_Node',
-                                            'DownstreamFeatureID':'To_Node',
-                                            'WwPipeTreatment':'Rl_Rn_Mtd',
-                                            'WwPipeTreatmentConstruction':'Rl_Rn_Mat',
-                                            'drvLength':'Length_m',
-                                            'Comment':'Comments'},
-                                  'WwAccess':{'WwAccessID':'Unique_ID',
-                                              'WwAccessType':'Type_Chamb', 
-                                              'WwAccessServiceStatus':'Status', 
-                                              'WwAccessOwnership':'Owner',
-                                              'CommissionDate':'Const_Date', 
-                                              'LidLevel':'Lid_RL', 
-                                              'BaseLevel':'RL',
-                                              'PitWidth':'AC_Width', 
-                                              'PitLength':'AC_Length',
-                                              'WwAccessConstruction':'Material',
-                                              'WwAccessLidStyle':'Lid_Type', 
-                                              'WwAccessSecurity':'Seal_Type',
-                                              'Comment':'Comments'},
-                                  'WwFitting':{'WwFittingID':'Unique_ID', 
-                                               'WwFittingType':'Type_Fit', 
-                                               'WwFittingServiceStatus':'Status', 
-                                               'WwFittingOwnership':'Owner',
-                                               'CommissionDate':'Const_Date', 
-                                               'DecommissionDate':'Manu_W',
-                                               'Comment':'Comments'},
-                                  'WwValve':{'WwValveID':'Unique_ID', 
-                                             'WwValveType':'Type_Valve', 
-                                             'WwValveServiceStatus':'Status', 
-                                             'WwValveOwnership':'Owner',
-                                             'CommissionDate':'Const_Date', 
-                                             'WwValveInstallationCompany':'Installer', 
-                                             'WwValveManufacturer':'Manu', 
-                                             'ManufacturerWarrantyEndDate':'Manu_W', 
-                                             'LidLevel':'Valve_RL', 
-                                             'WwValveNominalDiameter':'Size', 
-                                             'WwValveConstruction':'Material', 
-                                             'WwValveFunction':'Purpose', 
-                                             'WwValveClosureRotation':'Close_Dir',
-                                             'WwValveControlPoint':'Bel_Grnd',
-                                             'WwValveActuation':'Op_Mode',
-                                             'Comment':'Comments'},
-                                  'WwPump':{'WwPumpID':'Unique_ID', 
-                                            'WwPumpType':'Pump_Type',  
-                                            'WwPumpServiceStatus':'Status',  
-                                            'WwPumpOwnership':'Owner', 
-                                            'CommissionDate':'Const_Date',  
-                                            'WwPumpManufacturer':'P_Manu', 
-                                            'ManufacturerWarrantyEndDate':'Manu_W',  
-                                            'PumpSerialNumber':'P_Serial',  
-                                            'PumpCapacity':'P_Rate', 
-                                            'Comment':'Comments'}}                                       
-        },
-        {
-            'council': 'Christchurch City Council',
-            'network': 'Watersupply',
-            'Asset_Class_mapping': {'WsPipe':'Pipe',
-                            'WsFitting':'Fittings',
-                            'WsValve':'Valve',
-                            'WsPump':'Pump'},    
-            'attributes_mapping':{'WsPipe':{'WsPipeID':'Unique_ID',
-                                            'WsPipeType':'Purpose',
-                                            'WsPipeServiceStatus':'Status',
-                                            'WsPipeOwnership':'Owner',
-                                            'CommissionDate':'Const_Date',
-                                            'WsPipeManufacturer':'Manu',
-                                            'WsPipeNominalDiameter':'Nom_Dia',
-                                            'InsideDiameter':'Int_Dia',
-                                            'WsPipeConstruction':'Material',
-                                            'WsPipePressureClass':'Class_Pn',
-                                            'WsPipeStiffnessClass':'Class_Sn',
-                                            'WsPipeLoadClass':'Class_Load',
-                                            'WsPipeInstallationMethod':'Instl_Mthd',
-                                            'WsPipeTreatment':'Rl_Rn_Mtd',
-                                            'WsPipeTreatmentConstruction':'Rl_Rn_Mat',
-                                            'drvLength':'Length_m',
-                                            'Comment':'Comments'},
-                                  'WsFitting':{'WsFittingID':'Unique_ID', 
-                                               'WsFittingType':'Type_Fit', 
-                                               'WsFittingServiceStatus':'Status', 
-                                               'WsFittingOwnership':'Owner',
-                                               'CommissionDate':'Const_Date', 
-                                               'DecommissionDate':'Manu_W',
-                                               'Comment':'Comments'},
-                                  'WsValve':{'WsValveID':'Unique_ID', 
-                                             'WsValveType':'Type_Valve', 
-                                             'WsValveServiceStatus':'Status', 
-                                             'WsValveOwnership':'Owner',
-                                             'CommissionDate':'Const_Date', 
-                                             'WsValveInstallationCompany':'Installer', 
-                                             'WsValveManufacturer':'Manu', 
-                                             'ManufacturerWarrantyEndDate':'Manu_W', 
-                                             'LidLevel':'Valve_RL', 
-                                             'WsValveNominalDiameter':'Size', 
-                                             'WsValveConstruction':'Material', 
-                                             'WsValveFunction':'Purpose', 
-                                             'WsValveClosureRotation':'Close_Dir',
-                                             'WsValveControlPoint':'Bel_Grnd',
-                                             'WsValveActuation':'Op_Mode',
-                                             'Comment':'Comments'},
-                                  'WsPump':{'WsPumpID':'Unique_ID', 
-                                            'WsPumpType':'Pump_Type',  
-                                            'WsPumpServiceStatus':'Status',  
-                                            'WsPumpOwnership':'Owner', 
-                                            'CommissionDate':'Const_Date',  
-                                            'WsPumpManufacturer':'P_Manu', 
-                                            'ManufacturerWarrantyEndDate':'Manu_W',  
-                                            'PumpSerialNumber':'P_Serial',  
-                                            'PumpCapacity':'P_Rate', 
-                                            'Comment':'Comments'}}
-        }        
-                ]
     
-    #load CCC metadata standard and LINZ metadata standard
-    CCC_attributes_data = pd.read_excel(os.path.join(in_path,'GISAssetModels.xlsx'),sheet_name='Asset Attributes')
-    CCC_codelist_data = pd.read_excel(os.path.join(in_path,'GISAssetModels.xlsx'),sheet_name='Asset Domain Tables (full)')
-    LINZ_attributes_data = pd.read_excel(os.path.join(in_path,'LINZStandards_3Waters.xlsx'),sheet_name='Data')
-    LINZ_codelist_data = pd.read_excel(os.path.join(in_path,'LINZStandards_3Waters.xlsx'),sheet_name='Codes')
     
+    #get CCC Attributes and Data type dictionary
+    CCCtypedict = metadata.CCC_types.get(item, {})
+    
+    
+    #get LINZ Attributes and Data type dictionary
+    LINZtypedict = metadata.LINZ_types.get(linz_asset, {})
+    
+          
+    #analysis for attributes
+    attributes = metadata.CCC_attributes.get(item, [])
+    LINZ_attributes = metadata.LINZ_attributes.get(linz_asset, [])
+    attributes_mapping_dict = network['attributes_mapping'][item]
+    data_attributes = mapping_analyze(attributes,LINZ_attributes,attributes_mapping_dict)
+    data_attributes['CCC Attribute Data Type'] = data_attributes['CCC'].map(CCCtypedict)
+    data_attributes['LINZ Attribute Data Type'] = data_attributes['LINZ'].map(LINZtypedict)
+    
+    
+    data_attributes = data_attributes.fillna({'CCC':'Attribute Not in CCC.','LINZ':'Attribute Not in LINZ.'})
+    data_attributes.rename(columns={'CCC':'CCC Attribute', 'LINZ':'LINZ Attribute',}, inplace = True)
+    data_attributes['CCC Asset Class'] = item
+    data_attributes['LINZ Asset Class'] = linz_asset
+    data_attributes.rename(columns={'CCC':'CCC Attribute', 'LINZ':'LINZ Attribute'}, inplace = True)
+    columns = ['CCC Asset Class','CCC Attribute','Content','LINZ Asset Class','LINZ Attribute','CCC Attribute Data Type','LINZ Attribute Data Type']
+    data_attributes = data_attributes[columns]
+    
+    
+    instrumentation.stop(timer, len(data_attributes))
+    timer = instrumentation.start(item, 'codelists')
+    #analysis for codelist
+    data_codelist = data_attributes[['CCC Asset Class','CCC Attribute','LINZ Asset Class','LINZ Attribute']]
+    
+    LINZ_attri_codelist = {}
+    for attri, LINZ_codelist in metadata.LINZ_attribute_codelists.get(linz_asset, {}).items():
+        if pd.notna(LINZ_codelist):
+            LINZ_attri_codelist[attri]=LINZ_codelist
+    
+    CCC_attri_codelist = metadata.CCC_attribute_codelists.get(item, {})
     
+    data_codelist['LINZ Codelist'] = data_codelist['LINZ Attribute'].map(LINZ_attri_codelist)
+    data_codelist['CCC Codelist'] = data_codelist['CCC Attribute'].map(CCC_attri_codelist)
+    data_codelist = data_codelist.dropna(subset=['CCC Codelist', 'LINZ Codelist'],how='all') 
+    data_codelist['Content'] = data_codelist.apply(lambda x: content(x['CCC Codelist'], x['LINZ Codelist']), axis = 1)
+    data_codelist = data_codelist.fillna({'CCC Codelist':'Code List Not in CCC.','LINZ Codelist':'Code List Not in LINZ.','LINZ Attribute':'Attribute not in LINZ'})
+    columns = ['CCC Asset Class','CCC Attribute','CCC Codelist','Content','LINZ Asset Class','LINZ Attribute','LINZ Codelist']
+    data_codelist = data_codelist[columns]
     
+    
+    
+    data = data_codelist[['CCC Codelist','LINZ Codelist']]
+    codelist_mapping_dict = data.set_index('CCC Codelist').to_dict(orient= 'dict')
+    codelist_mapping_dict = list(codelist_mapping_dict.values())[0]
+    codelist_mapping = {}
+    for key,value in codelist_mapping_dict.items():
+        if key != 'Code List Not in CCC.' and value != 'Code List Not in LINZ.':
+            codelist_mapping[key] = value
+
+
+
+    instrumentation.stop(timer, len(data_codelist))
+    timer = instrumentation.start(item, 'codelist values')
+    #analysis for codelist value        
+    codelist_value_records = []
+    for key,value in codelist_mapping.items():
+        codelist_value = metadata.CCC_codelist_values.get(key, [])
+        LINZ_codelist_value = metadata.LINZ_codelist_values.get(value, [])
+        data = auto_mapping(codelist_value,LINZ_codelist_value,**matching)
+        data['CCC codelist'] = key
+        data['LINZ codelist'] = value
+        codelist_value_records.extend(data.to_dict('records'))
+
+    #add LINZ codelist values which are not matched to CCC into dataframe 
+    LINZ_codelist = metadata.LINZ_codelists.get(linz_asset, [])
+    LINZ_codelist_matched = codelist_mapping.values()
+    notmatchCCC = symmetric_difference(LINZ_codelist,LINZ_codelist_matched)
+    for codelist in notmatchCCC:
+        codelist_value_list = metadata.LINZ_codelist_values.get(codelist, [])
+        for codelist_value in codelist_value_list:
+            codelist_value_records.append({'LINZ':codelist_value,'LINZ codelist':codelist})
+    
+    
+    #add CCC codelist values which are not matched to LINZ into dataframe
+    codelists = metadata.CCC_codelists.get(item, [])
+    CCC_codelist_matched = codelist_mapping.keys()
+    notmatchLINZ = symmetric_difference(codelists,CCC_codelist_matched)
+    for cl in notmatchLINZ:
+        
+        cl_va_list = codelist_value = metadata.CCC_codelist_values.get(cl, [])
+        for cl_va in cl_va_list:
+            codelist_value_records.append({'CCC':cl_va,'CCC codelist':cl})
+    
+    alternatives = ['Alternatives'] if matching.get('top_k', 1) > 1 else []
+    data_codelist_value = pd.DataFrame(codelist_value_records, columns=['CCC','CCC codelist','LINZ','LINZ codelist','Similarity'] + alternatives)
+    data_codelist_value['Content'] = data_codelist_value.apply(lambda x: content(x.CCC, x.LINZ), axis = 1)
+    data_codelist_value['CCC Attribute'] = data_codelist_value['CCC codelist'].map(lambda x: str(x).strip('dom')).replace('nan','Attribute not in CCC')
+    #LINZ column and codelist name dictionary  
+    LINZdict = metadata.LINZ_codelist_attributes.get(linz_asset, {})
+        
+    data_codelist_value['LINZ Attribute'] = data_codelist_value['LINZ codelist'].map(LINZdict)
+    data_codelist_value['CCC Asset Class'] = item
+    data_codelist_value['LINZ Asset Class'] = linz_asset
+    data_codelist_value = data_codelist_value.fillna({'CCC':'CodeList Value Not in CCC.','LINZ':'CodeList Value Not in LINZ.','CCC codelist':'CodeList Name Not in CCC','LINZ codelist':'CodeList Name Not in LINZ','LINZ Attribute':'Attribute not in LINZ'})
+    data_codelist_value.rename(columns={'CCC':'CCC Codelist value', 'LINZ':'LINZ Codelist value',}, inplace = True)
+    columns = ['CCC Asset Class','CCC Attribute','CCC codelist','CCC Codelist value','Content','LINZ Asset Class','LINZ Attribute','LINZ codelist','LINZ Codelist value','Similarity'] + alternatives
+    data_codelist_value = data_codelist_value[columns]
+    
+    
+    instrumentation.stop(timer, len(data_codelist_value))
+    timer = instrumentation.start(item, 'column match')
+    #match the codelists to the columns of the layer file
+
+    similarity,max_match = max_similarity(item,list(CCC_layer_files))
+    layer_file = os.path.join(csv_path, CCC_layer_files[max_match])
+    CCC_data_attributes = read_layer_columns(layer_file)
+    CCC_columns = {}
+    attributes_matcher = SimilarityMatcher(CCC_data_attributes)
+    for cl in codelists:
+        similarity,CCC_col = max_similarity(cl,CCC_data_attributes,attributes_matcher)
+        CCC_columns[cl] = CCC_col
+    
+    instrumentation.stop(timer, len(CCC_columns))
+    timer = instrumentation.start(item, 'statistics')
+    #count for affected assets, by column and value
+    column_counts = count_layer_values(layer_file, sorted(set(CCC_columns.values())))
+    statistics = []
+    for cl, value in zip(data_codelist_value['CCC codelist'], data_codelist_value['CCC Codelist value']):
+        if cl in CCC_columns:
+            counter = column_counts[CCC_columns[cl]]
+            statistics.append(counter.get(value, counter.get(as_key(value), np.nan)))
+        else:
+            statistics.append(np.nan)
+    data_codelist_value['Statistics'] = statistics
+
+    
+    
+    instrumentation.stop(timer, sum(sum(counter.values()) for counter in column_counts.values()))
+    timer = instrumentation.start(item, 'workbook')
+    #save dataframe to excel  
+    path = os.path.join(linz_path ,f'{item}(gap analysis).xlsx')
+    writer = pd.ExcelWriter(path)
+    writer.book.set_properties({'created': WORKBOOK_CREATED})
+    data_asset.to_excel(writer, sheet_name = 'Asset',index = False)
+    ws0 = writer.sheets['Asset']
+    fheader = writer.book.add_format({'bold': True,})
+    ws0.set_row(0, None, cell_format=fheader)
+    ws0.set_column(0,3, width=30)      
+    data_attributes.to_excel(writer, sheet_name = 'Attributes',index = False)
+    ws1 = writer.sheets['Attributes']
+    ws1.set_row(0, None, cell_format=fheader)
+    ws1.set_column(0,7, width=25)
+    data_codelist.to_excel(writer, sheet_name = 'Codelist name',index = False)
+    ws2 = writer.sheets['Codelist name']
+    ws2.set_row(0, None, cell_format=fheader)  
+    ws2.set_column(0,6, width=25)
+    data_codelist_value.to_excel(writer, sheet_name = 'Codelist Values',index = False)
+    ws3 = writer.sheets['Codelist Values']
+    ws3.set_row(0, None, cell_format=fheader)
+    ws3.set_column(0,9 + len(alternatives), width=20)
+    writer.close()
+    instrumentation.stop(timer)
+    return path
+
+
+def write_attribute_suggestions(metadata, networks, out_path):
+    """Write the suggested LINZ attribute of every CCC attribute to one workbook
+    Args:
+    metadata (MetadataIndex): CCC and LINZ metadata standards
+    networks (list): registry networks, for their asset class and attributes mappings
+    out_path (str): output folder
+    Returns:
+    str: workbook path
+    """
+    data = suggest_attributes(metadata, networks)
+    os.makedirs(out_path, exist_ok=True)
+    path = os.path.join(out_path, 'LINZ attribute suggestions.xlsx')
+    writer = pd.ExcelWriter(path)
+    writer.book.set_properties({'created': WORKBOOK_CREATED})
+    data.to_excel(writer, sheet_name = 'Attributes',index = False)
+    ws0 = writer.sheets['Attributes']
+    fheader = writer.book.add_format({'bold': True,})
+    ws0.set_row(0, None, cell_format=fheader)
+    ws0.set_column(0,8, width=25)
+    writer.close()
+    return path
+
+
+#metadata index of a worker process, set once by init_worker
+worker_metadata = None
+
+
+def init_worker(metadata):
+    """Keep the metadata index in a worker process for all of its tasks
+    Args:
+    metadata (MetadataIndex): CCC and LINZ metadata standards
+    """
+    global worker_metadata
+    worker_metadata = metadata
+
+
+def gap_analysis_task(network, item, linz_asset, out_path, matching=None, instrumentation=None):
+    """Write one gap analysis workbook and report how it went
+    Args:
+    network (dict): network with its asset class and attributes mapping
+    item (str): CCC asset class
+    linz_asset (str): LINZ asset class
+    out_path (str): output folder
+    matching (dict): auto_mapping keyword arguments for the codelist values
+    instrumentation (CCC_instrumentation.Instrumentation): stage timings, None for a new one
+    Returns:
+    dict: council, network, asset class, workbook path, seconds, stage timings and the error traceback if it failed
+    """
+    if instrumentation is None:
+        instrumentation = CCC_instrumentation.Instrumentation()
+    start = time.perf_counter()
+    summary = {'council': network['council'], 'network': network['network'], 'asset': item, 'path': None, 'error': None}
+    try:
+        summary['path'] = write_gap_analysis(worker_metadata, network, item, linz_asset, out_path, matching, instrumentation)
+    except Exception:
+        summary['error'] = traceback.format_exc()
+    summary['seconds'] = time.perf_counter() - start
+    summary['stages'] = instrumentation.get_records(item)
+    return summary
+
+
+def run_tasks(tasks, metadata, workers, instrumentation=None):
+    """Run gap analysis tasks, in a process pool when there is more than one worker
+    Args:
+    tasks (list): gap_analysis_task arguments
+    metadata (MetadataIndex): CCC and LINZ metadata standards, shared with the workers
+    workers (int): number of worker processes
+    instrumentation (CCC_instrumentation.Instrumentation): collects the stage timings of the tasks
+    Returns:
+    list: task summaries, in task order
+    """
+    if instrumentation is None:
+        instrumentation = CCC_instrumentation.Instrumentation()
+    if workers > 1:
+        pool = concurrent.futures.ProcessPoolExecutor(max_workers=workers, initializer=init_worker, initargs=(metadata,))
+        futures = {pool.submit(gap_analysis_task, *args): k for k, args in enumerate(tasks)}
+        results = concurrent.futures.as_completed(futures)
+    else:
+        init_worker(metadata)
+        pool = None
+        results = (gap_analysis_task(*args, instrumentation=instrumentation) for args in tasks)
+    summaries = []
+    try:
+        for k, result in enumerate(results, 1):
+            summary = result.result() if pool else result
+            summaries.append(summary)
+            if pool:
+                instrumentation.merge(summary['stages'])
+            now = datetime.datetime.now().isoformat()
+            status = 'failed' if summary['error'] else 'written'
+            print(f"Task {k:3d} / {len(tasks):3d}, {summary['network']} {summary['asset']} {status}, "
+                  f"Seconds {summary['seconds']:8.2f}, Timestamp {now}")
+            if summary['error']:
+                print(summary['error'])
+    finally:
+        if pool:
+            pool.shutdown()
+    order = {(summary['council'], summary['network'], summary['asset']): summary for summary in summaries}
+    return [order[(network['council'], network['network'], item)] for network, item, *_ in tasks]
+
+
+def main(argv=None):
+    arg_parser = argparse.ArgumentParser(description=__doc__)
+    arg_parser.add_argument('--in-path', default="/Users/wujing/Desktop/Inputs")
+    arg_parser.add_argument('--out-path', default="/Users/wujing/Desktop/Outputs")
+    arg_parser.add_argument('--workers', type=int, default=1,
+                            help='number of worker processes, 1 to write the workbooks in this process')
+    arg_parser.add_argument('--top-k', type=int, default=1,
+                            help='ranked LINZ candidates per CCC codelist value, the others go to an Alternatives column')
+    arg_parser.add_argument('--scorer', choices=sorted(SCORERS), default='ratio',
+                            help='similarity of the CCC codelist values and the LINZ codes')
+    arg_parser.add_argument('--suggest-attributes', action='store_true',
+                            help="write a suggested LINZ attribute for every attribute of every CCC model to "
+                                 "(out-path)/LINZ attribute suggestions.xlsx instead of the gap analysis workbooks")
+    CCC_registry.add_arguments(arg_parser)
+    CCC_instrumentation.add_arguments(arg_parser)
+    args = arg_parser.parse_args(argv)
+    if args.top_k < 1:
+        arg_parser.error('--top-k must be at least 1')
+
+    in_path = args.in_path
+    out_path = args.out_path
+    instrumentation = CCC_instrumentation.from_arguments(arg_parser, args)
+    
+    networks = CCC_registry.from_arguments(arg_parser, args)
+    
+    #load CCC metadata standard and LINZ metadata standard
+    timer = instrumentation.start('metadata', 'read workbooks')
+    cache_path = os.path.join(out_path, METADATA_CACHE)
+    CCC_attributes_data = read_excel_cached(os.path.join(in_path,'GISAssetModels.xlsx'),'Asset Attributes',cache_path)
+    CCC_codelist_data = read_excel_cached(os.path.join(in_path,'GISAssetModels.xlsx'),'Asset Domain Tables (full)',cache_path)
+    LINZ_attributes_data = read_excel_cached(os.path.join(in_path,'LINZStandards_3Waters.xlsx'),'Data',cache_path)
+    LINZ_codelist_data = read_excel_cached(os.path.join(in_path,'LINZStandards_3Waters.xlsx'),'Codes',cache_path)
+    metadata = MetadataIndex(CCC_attributes_data, CCC_codelist_data, LINZ_attributes_data, LINZ_codelist_data)
+    instrumentation.stop(timer)
+    
+    if args.suggest_attributes:
+        timer = instrumentation.start('metadata', 'attribute suggestions')
+        path = write_attribute_suggestions(metadata, networks, out_path)
+        instrumentation.stop(timer, sum(len(attributes) for attributes in metadata.CCC_attributes.values()))
+        instrumentation.report(args.timings, args.profile_path)
+        print(f"Attribute suggestions saved to {path}")
+        return
+    
+    matching = {'top_k': args.top_k, 'scorer': args.scorer}
+    tasks = []
     for network in networks:
         
         #create path
         linz_path = os.path.join(out_path, network['council'], 'LINZ', 'LINZ mapping')
         os.makedirs(linz_path, exist_ok=True)
+        
+        for item, linz_asset in network['Asset_Class_mapping'].items():
+            tasks.append((network, item, linz_asset, out_path, matching))
     
-        #get the layer file name
-        csv_path = os.path.join(out_path,network['council'],network['network'],'layers')
-        CCC_asset_file_list = os.listdir(csv_path)
-
+    summaries = run_tasks(tasks, metadata, args.workers, instrumentation)
+    instrumentation.report(args.timings, args.profile_path)
+    failures = [f"{summary['network']} {summary['asset']}" for summary in summaries if summary['error']]
+    if failures:
+        raise RuntimeError(f"{len(failures)} gap analysis task(s) failed: " + ", ".join(failures))
 
 
-        for item, linz_asset in network['Asset_Class_mapping'].items():
-        
-            #analysis for Asset Class
-            asset = [item]
-            LINZ_asset = [network['Asset_Class_mapping'][item]]
-            asset_mapping_dict = dict([(key, network['Asset_Class_mapping'][key]) for key in asset])
-            data_asset = pd.DataFrame({'CCC':asset},index = range(len(asset)))
-            data_asset['LINZ'] = data_asset['CCC'].map(asset_mapping_dict)
-            values = list(asset_mapping_dict.values())
-            notinCCC = list(set(LINZ_asset)^set(values))
-            for item in notinCCC:
-                data_asset = data_asset.append([{'LINZ':item}],ignore_index=True)
-            data_asset['Content'] = data_asset.apply(lambda x: content(x.CCC, x.LINZ), axis = 1)
-            
-            
-            
-            #get CCC Attributes and Data type dictionary
-            CCC_attri_type = CCC_attributes_data[['GISModelName','GISAttributeName','GISAttributeDataType']].dropna(axis=0, how='any')
-            CCC_attributes_TYPE = list(CCC_attri_type.loc[CCC_attri_type['GISModelName'] == item]['GISAttributeName'])
-            CCCtypedict = {}
-            for attri in CCC_attributes_TYPE:
-                attri_type = CCC_attri_type.loc[(CCC_attri_type['GISModelName'] == item)& (CCC_attri_type['GISAttributeName'] == attri),'GISAttributeDataType'].values[0]
-                CCCtypedict[attri]=attri_type 
-            
-            
-            #get LINZ Attributes and Data type dictionary
-            LINZ_attri_type = LINZ_attributes_data[['Asset Class','Attribute Name - Abbreviated','Data Type']].dropna(axis=0, how='any')
-            LINZ_attributes_TYPE = list(LINZ_attri_type.loc[LINZ_attri_type['Asset Class'] == linz_asset]['Attribute Name - Abbreviated'])
-            LINZtypedict = {}
-            for attri in LINZ_attributes_TYPE:
-                attri_type = LINZ_attri_type.loc[(LINZ_attri_type['Asset Class'] == linz_asset)& (LINZ_attri_type['Attribute Name - Abbreviated'] == attri),'Data Type'].values[0]
-                LINZtypedict[attri]=attri_type 
-            
-                  
-            #analysis for attributes
-            attributes = list(CCC_attributes_data.loc[CCC_attributes_data['GISModelName'] == item]['GISAttributeName'])
-            LINZ_attributes = list(LINZ_attributes_data.loc[LINZ_attributes_data['Asset Class'] == linz_asset]['Attribute Name - Abbreviated'])
-            attributes_mapping_dict = network['attributes_mapping'][item]
-            data_attributes = mapping_analyze(attributes,LINZ_attributes,attributes_mapping_dict)
-            data_attributes['CCC Attribute Data Type'] = data_attributes['CCC'].map(CCCtypedict)
-            data_attributes['LINZ Attribute Data Type'] = data_attributes['LINZ'].map(LINZtypedict)
-            
-            
-            data_attributes = data_attributes.fillna({'CCC':'Attribute Not in CCC.','LINZ':'Attribute Not in LINZ.'})
-            data_attributes.rename(columns={'CCC':'CCC Attribute', 'LINZ':'LINZ Attribute',}, inplace = True)
-            data_attributes['CCC Asset Class'] = item
-            data_attributes['LINZ Asset Class'] = linz_asset
-            data_attributes.rename(columns={'CCC':'CCC Attribute', 'LINZ':'LINZ Attribute'}, inplace = True)
-            columns = ['CCC Asset Class','CCC Attribute','Content','LINZ Asset Class','LINZ Attribute','CCC Attribute Data Type','LINZ Attribute Data Type']
-            data_attributes = data_attributes[columns]
-            
-            
-            #analysis for codelist
-            data_codelist = data_attributes[['CCC Asset Class','CCC Attribute','LINZ Asset Class','LINZ Attribute']]
-            
-            LINZ_attri_codelist = {}
-            for attri in LINZ_attributes:
-                LINZ_codelist = LINZ_attributes_data.loc[(LINZ_attributes_data['Asset Class'] == linz_asset) & (LINZ_attributes_data['Attribute Name - Abbreviated'] == attri)]['CODELIST Reference'].values[0]
-                if LINZ_codelist is not np.nan:
-                    LINZ_attri_codelist[attri]=LINZ_codelist
-            
-            CCC_attri_codelist = {}
-            attributes_codelist = set(CCC_codelist_data.loc[CCC_codelist_data['GISModelName'] == item]['GISAttributeName'])
-            for attri in attributes_codelist:
-                CCC_codelist = CCC_codelist_data.loc[(CCC_codelist_data['GISModelName'] == item) & (CCC_codelist_data['GISAttributeName'] == attri)]['GISDomainTableName'].values[0]
-                CCC_attri_codelist[attri]=CCC_codelist
-            
-            data_codelist['LINZ Codelist'] = data_codelist['LINZ Attribute'].map(LINZ_attri_codelist)
-            data_codelist['CCC Codelist'] = data_codelist['CCC Attribute'].map(CCC_attri_codelist)
-            data_codelist = data_codelist.dropna(subset=['CCC Codelist', 'LINZ Codelist'],how='all') 
-            data_codelist['Content'] = data_codelist.apply(lambda x: content(x['CCC Codelist'], x['LINZ Codelist']), axis = 1)
-            data_codelist = data_codelist.fillna({'CCC Codelist':'Code List Not in CCC.','LINZ Codelist':'Code List Not in LINZ.','LINZ Attribute':'Attribute not in LINZ'})
-            columns = ['CCC Asset Class','CCC Attribute','CCC Codelist','Content','LINZ Asset Class','LINZ Attribute','LINZ Codelist']
-            data_codelist = data_codelist[columns]
-            
-            
-            
-            data = data_codelist[['CCC Codelist','LINZ Codelist']]
-            codelist_mapping_dict = data.set_index('CCC Codelist').to_dict(orient= 'dict')
-            codelist_mapping_dict = list(codelist_mapping_dict.values())[0]
-            codelist_mapping = {}
-            for key,value in codelist_mapping_dict.items():
-                if key != 'Code List Not in CCC.' and value != 'Code List Not in LINZ.':
-                    codelist_mapping[key] = value
-       
-
-         
-            #analysis for codelist value        
-            data_codelist_value = pd.DataFrame(columns = [])
-            for key,value in codelist_mapping.items():
-                codelist_value = list(CCC_codelist_data.loc[CCC_codelist_data['GISDomainTableName'] == key]['GISDomainValue'])
-                LINZ_codelist_value = list(LINZ_codelist_data.loc[LINZ_codelist_data['Codelist'] == value]['Code'])
-                data = auto_mapping(codelist_value,LINZ_codelist_value)
-                data['CCC codelist'] = key
-                data['LINZ codelist'] = value
-                data_codelist_value = data_codelist_value.append(data,ignore_index=True,sort=True)
-           
-            #add LINZ codelist values which are not matched to CCC into dataframe 
-            LINZ_codelist = LINZ_attributes_data.loc[LINZ_attributes_data['Asset Class'] == linz_asset]['CODELIST Reference'].dropna(axis=0, how='any')
-            LINZ_codelist_matched = codelist_mapping.values()
-            notmatchCCC = set(LINZ_codelist)^set(LINZ_codelist_matched)
-            for codelist in notmatchCCC:
-                codelist_value_list = list(LINZ_codelist_data.loc[LINZ_codelist_data['Codelist'] == codelist]['Code'])
-                for codelist_value in codelist_value_list:
-                    data_codelist_value = data_codelist_value.append([{'LINZ':codelist_value,'LINZ codelist':codelist}],ignore_index=True)
-            
-            
-            #add CCC codelist values which are not matched to LINZ into dataframe
-            codelists = CCC_codelist_data.loc[CCC_codelist_data['GISModelName'] == item]['GISDomainTableName']
-            CCC_codelist_matched = codelist_mapping.keys()
-            notmatchLINZ = set(codelists)^set(CCC_codelist_matched)
-            for cl in notmatchLINZ:
-                
-                cl_va_list = codelist_value = list(CCC_codelist_data.loc[CCC_codelist_data['GISDomainTableName'] == cl]['GISDomainValue'])
-                for cl_va in cl_va_list:
-                    data_codelist_value = data_codelist_value.append([{'CCC':cl_va,'CCC codelist':cl}],ignore_index=True)
-            
-            data_codelist_value['Content'] = data_codelist_value.apply(lambda x: content(x.CCC, x.LINZ), axis = 1)
-            data_codelist_value['CCC Attribute'] = data_codelist_value['CCC codelist'].map(lambda x: str(x).strip('dom')).replace('nan','Attribute not in CCC')
-            #LINZ column and codelist name dictionary  
-            LINZ_df = LINZ_attributes_data[['Asset Class','Attribute Name - Abbreviated','CODELIST Reference']].dropna(axis=0, how='any')
-            LINZ_attributes_asset = list(LINZ_df.loc[LINZ_df['Asset Class'] == linz_asset]['Attribute Name - Abbreviated'])
-            LINZdict = {}
-            for attribute in LINZ_attributes_asset:
-                codelist = LINZ_df.loc[(LINZ_df['Asset Class'] == linz_asset)& (LINZ_df['Attribute Name - Abbreviated'] == attribute),'CODELIST Reference'].values[0]
-                LINZdict[codelist] = attribute
-                
-            data_codelist_value['LINZ Attribute'] = data_codelist_value['LINZ codelist'].map(LINZdict)
-            data_codelist_value['CCC Asset Class'] = item
-            data_codelist_value['LINZ Asset Class'] = linz_asset
-            data_codelist_value = data_codelist_value.fillna({'CCC':'CodeList Value Not in CCC.','LINZ':'CodeList Value Not in LINZ.','CCC codelist':'CodeList Name Not in CCC','LINZ codelist':'CodeList Name Not in LINZ','LINZ Attribute':'Attribute not in LINZ'})
-            data_codelist_value.rename(columns={'CCC':'CCC Codelist value', 'LINZ':'LINZ Codelist value',}, inplace = True)
-            columns = ['CCC Asset Class','CCC Attribute','CCC codelist','CCC Codelist value','Content','LINZ Asset Class','LINZ Attribute','LINZ codelist','LINZ Codelist value','Similarity']
-            data_codelist_value = data_codelist_value[columns]
-            
-            
-            #load the layer csv file to get the assets data
-
-            similarity,max_match = max_similarity(item,CCC_asset_file_list)
-            CCC_data = pd.read_csv(os.path.join(csv_path, max_match),low_memory=False,encoding='cp1252')
-            CCC_data_attributes = list(CCC_data.columns)
-            
-            #count for affected assets
-            statistics_mapping = {}
-
-            for cl in codelists:
-                
-                similarity,CCC_col = max_similarity(cl,CCC_data_attributes)
-                
-                stat_mapping = dict(CCC_data[CCC_col].value_counts())
-             
-                statistics_mapping.update(stat_mapping)
-
-            
-            data_codelist_value['Statistics'] = data_codelist_value['CCC Codelist value'].map(statistics_mapping)
-
-            
-            
-            #save dataframe to excel  
-            path = os.path.join(linz_path ,f'{item}(gap analysis).xlsx')
-            writer = pd.ExcelWriter(path)
-            data_asset.to_excel(writer, sheet_name = 'Asset',index = False)
-            ws0 = writer.sheets['Asset']
-            fheader = writer.book.add_format({'bold': True,})
-            ws0.set_row(0, None, cell_format=fheader)
-            ws0.set_column(0,3, width=30)      
-            data_attributes.to_excel(writer, sheet_name = 'Attributes',index = False)
-            ws1 = writer.sheets['Attributes']
-            ws1.set_row(0, None, cell_format=fheader)
-            ws1.set_column(0,7, width=25)
-            data_codelist.to_excel(writer, sheet_name = 'Codelist name',index = False)
-            ws2 = writer.sheets['Codelist name']
-            ws2.set_row(0, None, cell_format=fheader)  
-            ws2.set_column(0,6, width=25)
-            data_codelist_value.to_excel(writer, sheet_name = 'Codelist Values',index = False)
-            ws3 = writer.sheets['Codelist Values']
-            ws3.set_row(0, None, cell_format=fheader)
-            ws3.set_column(0,9, width=20)
-            writer.save()
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,465 @@
+#!/usr/bin/env python
+
+"""
+Benchmarks for the CCC extraction and mapping scripts.
+Run on synthetic data, so no council data is needed: a GeoPackage with pipe
+and access chamber layers and the CCC and LINZ metadata workbooks.
+"""
+
+from osgeo import ogr, osr
+import argparse
+import datetime
+import difflib
+import json
+import os
+import platform
+import random
+import re
+import shutil
+import string
+import tempfile
+import time
+import timeit
+
+import numpy as np
+import pandas as pd
+
+import CCC_gdb_to_geometry
+import CCC_LINZ_auto_mapping
+
+
+multiline_geometry_regex = re.compile("([0-9.]+).*?([0-9.]+).*?([0-9.]+).*?([0-9.]+)")
+
+
+def regex_coordinates(geometry):
+    """Previous end point extraction: regex over the WKT of Boundary()
+    Args:
+        geometry (osgeo.ogr.Geometry): MULTILINESTRING geometry
+    """
+    XLO, YLO, XHI, YHI = multiline_geometry_regex.findall(str(geometry.Boundary()))[0]
+    return XLO, YLO, XHI, YHI
+
+
+def make_pipe_geometries(n, vertices=4, z=False, seed=0):
+    """Create single-part NZTM MULTILINESTRING pipes
+    Args:
+        n (int): number of geometries
+        vertices (int): vertices per pipe
+        z (bool): add a Z coordinate
+        seed (int): random seed
+    """
+    rng = random.Random(seed)
+    geometries = []
+    for _ in range(n):
+        x = rng.uniform(1560000, 1590000)
+        y = rng.uniform(5170000, 5190000)
+        points = []
+        for _ in range(vertices):
+            point = f"{x:.3f} {y:.3f}"
+            if z:
+                point += f" {rng.uniform(0, 20):.3f}"
+            points.append(point)
+            x += rng.uniform(-20, 20)
+            y += rng.uniform(-20, 20)
+        geometries.append(ogr.CreateGeometryFromWkt(f"MULTILINESTRING (({', '.join(points)}))"))
+    return geometries
+
+
+def benchmark_coordinates(n, repeat):
+    """Time regex over Boundary() WKT against direct end point extraction
+    Args:
+        n (int): number of geometries
+        repeat (int): timing repetitions, the best one is reported
+    Returns:
+        dict: microseconds per geometry for each path
+    """
+    geometries = make_pipe_geometries(n)
+    for geometry in geometries[:100]:
+        expected = tuple(float(v) for v in regex_coordinates(geometry))
+        assert CCC_gdb_to_geometry.get_geometry_coordinates(geometry) == expected
+
+    paths = {
+        'regex boundary': lambda: [regex_coordinates(g) for g in geometries],
+        'end points': lambda: [CCC_gdb_to_geometry.get_geometry_coordinates(g) for g in geometries],
+        'envelope': lambda: [CCC_gdb_to_geometry.get_geometry_coordinates(g, envelope=True) for g in geometries],
+    }
+    return {name: min(timeit.repeat(path, number=1, repeat=repeat)) / n * 1e6 for name, path in paths.items()}
+
+
+def loop_max_similarity(x, Y):
+    """Reference max_similarity: full difflib ratio against every candidate, the first highest one wins
+    Args:
+        x (str): item
+        Y (list): candidates
+    """
+    max_sim = 0
+    max_match = Y[0] if Y else ''
+    for y in Y:
+        similarity = difflib.SequenceMatcher(None, x, y).ratio()
+        if similarity > max_sim:
+            max_sim = similarity
+            max_match = y
+    return max_sim, max_match
+
+
+def make_codes(n, seed=0):
+    """Create codelist values shaped like CCC/LINZ codes, e.g. 'PVC', 'CONC_RND'
+    Args:
+        n (int): number of codes
+        seed (int): random seed
+    """
+    rng = random.Random(seed)
+    codes = []
+    for _ in range(n):
+        words = [''.join(rng.choice(string.ascii_uppercase) for _ in range(rng.randint(2, 6)))
+                 for _ in range(rng.randint(1, 3))]
+        codes.append(rng.choice(['_', ' ', '']).join(words))
+    return codes
+
+
+def benchmark_matcher(ccc_values, linz_values, repeat):
+    """Time the per-candidate difflib loop against SimilarityMatcher for one codelist pair,
+    and the top 5 candidates with every scorer
+    Args:
+        ccc_values (int): number of CCC codelist values
+        linz_values (int): number of LINZ codes
+        repeat (int): timing repetitions, the best one is reported
+    Returns:
+        dict: milliseconds per codelist pair for each path
+    """
+    CCC_List = make_codes(ccc_values, seed=1)
+    LINZ_List = make_codes(linz_values, seed=2)
+    expected = [loop_max_similarity(x, LINZ_List) for x in CCC_List]
+    matcher = CCC_LINZ_auto_mapping.SimilarityMatcher(LINZ_List)
+    assert [CCC_LINZ_auto_mapping.max_similarity(x, LINZ_List, matcher) for x in CCC_List] == expected
+
+    def indexed():
+        matcher = CCC_LINZ_auto_mapping.SimilarityMatcher(LINZ_List)
+        return [CCC_LINZ_auto_mapping.max_similarity(x, LINZ_List, matcher) for x in CCC_List]
+
+    def ranked(scorer):
+        matcher = CCC_LINZ_auto_mapping.SimilarityMatcher(LINZ_List, scorer)
+        return [matcher.top(x, 5) for x in CCC_List]
+
+    paths = {
+        'difflib loop': lambda: [loop_max_similarity(x, LINZ_List) for x in CCC_List],
+        'matcher': indexed,
+    }
+    for scorer in CCC_LINZ_auto_mapping.SCORERS:
+        paths[f'top 5 {scorer}'] = lambda scorer=scorer: ranked(scorer)
+    return {name: min(timeit.repeat(path, number=1, repeat=repeat)) * 1e3 for name, path in paths.items()}
+
+
+PIPE_MATERIALS = ['PVC', 'Concrete', 'Earthenware', 'Cast Iron', 'Polyethylene', 'Asbestos Cement']
+SERVICE_STATUS = ['Active', 'Abandoned', 'Proposed', 'Removed']
+ACCESS_TYPES = ['Manhole', 'Sump', 'Inspection Chamber', 'Lamphole']
+
+#synthetic network, its asset classes and attribute names follow the CCC and LINZ standards
+BENCHMARK_NETWORK = {
+    'council': 'Benchmark',
+    'network': 'Stormwater',
+    'type': 'gpkg',
+    'Asset_Class_mapping': {'SwPipe': 'Pipe', 'SwAccess': 'Access Point'},
+    'attributes_mapping': {'SwPipe': {'SwPipeID': 'Unique_ID',
+                                      'SwPipeMaterial': 'Material',
+                                      'SwPipeServiceStatus': 'Status',
+                                      'SwPipeDiameter': 'Diameter',
+                                      'CommissionDate': 'Const_Date',
+                                      'Comment': 'Comments'},
+                           'SwAccess': {'SwAccessID': 'Unique_ID',
+                                        'SwAccessType': 'Type_AP',
+                                        'SwAccessServiceStatus': 'Status',
+                                        'CommissionDate': 'Const_Date',
+                                        'Comment': 'Comments'}}
+}
+BENCHMARK_ASSETS = set(['vwOpenDataSwPipe', 'vwOpenDataSwAccess'])
+
+
+def random_date(rng):
+    return f"{rng.randint(1950, 2020):04d}/{rng.randint(1, 12):02d}/{rng.randint(1, 28):02d}"
+
+
+def make_geopackage(path, pipes, chambers, seed=0):
+    """Create a GeoPackage with NZTM pipe and access chamber layers
+    Args:
+        path (str): GeoPackage file, replaced if it exists
+        pipes (int): number of pipe features
+        chambers (int): number of access chamber features
+        seed (int): random seed
+    """
+    rng = random.Random(seed)
+    driver = ogr.GetDriverByName('GPKG')
+    if os.path.exists(path):
+        driver.DeleteDataSource(path)
+    data = driver.CreateDataSource(path)
+    srs = osr.SpatialReference()
+    srs.ImportFromEPSG(2193)
+
+    layer = data.CreateLayer('vwOpenDataSwPipe', srs, ogr.wkbMultiLineString)
+    for name, field_type in [('SwPipeID', ogr.OFTInteger), ('SwPipeMaterial', ogr.OFTString),
+                             ('SwPipeServiceStatus', ogr.OFTString), ('SwPipeDiameter', ogr.OFTReal),
+                             ('CommissionDate', ogr.OFTDate), ('Comment', ogr.OFTString)]:
+        layer.CreateField(ogr.FieldDefn(name, field_type))
+    defn = layer.GetLayerDefn()
+    layer.StartTransaction()
+    for k, geometry in enumerate(make_pipe_geometries(pipes, seed=seed)):
+        feature = ogr.Feature(defn)
+        feature.SetField('SwPipeID', k + 1)
+        feature.SetField('SwPipeMaterial', rng.choice(PIPE_MATERIALS))
+        feature.SetField('SwPipeServiceStatus', rng.choice(SERVICE_STATUS))
+        if rng.random() < 0.9:
+            feature.SetField('SwPipeDiameter', rng.choice([100.0, 150.0, 225.0, 300.0, 450.0]))
+        feature.SetField('CommissionDate', random_date(rng))
+        if rng.random() < 0.2:
+            feature.SetField('Comment', 'Synthetic pipe, ' + rng.choice(PIPE_MATERIALS).lower())
+        feature.SetGeometry(geometry)
+        layer.CreateFeature(feature)
+    layer.CommitTransaction()
+
+    layer = data.CreateLayer('vwOpenDataSwAccess', srs, ogr.wkbPoint)
+    for name, field_type in [('SwAccessID', ogr.OFTInteger), ('SwAccessType', ogr.OFTString),
+                             ('SwAccessServiceStatus', ogr.OFTString), ('CommissionDate', ogr.OFTDate),
+                             ('Comment', ogr.OFTString)]:
+        layer.CreateField(ogr.FieldDefn(name, field_type))
+    defn = layer.GetLayerDefn()
+    layer.StartTransaction()
+    for k in range(chambers):
+        feature = ogr.Feature(defn)
+        feature.SetField('SwAccessID', k + 1)
+        feature.SetField('SwAccessType', rng.choice(ACCESS_TYPES))
+        feature.SetField('SwAccessServiceStatus', rng.choice(SERVICE_STATUS))
+        feature.SetField('CommissionDate', random_date(rng))
+        geometry = ogr.Geometry(ogr.wkbPoint)
+        geometry.AddPoint_2D(rng.uniform(1560000, 1590000), rng.uniform(5170000, 5190000))
+        feature.SetGeometry(geometry)
+        layer.CreateFeature(feature)
+    layer.CommitTransaction()
+    data = None
+
+
+def make_workbooks(path, codes=0, seed=0):
+    """Create GISAssetModels.xlsx and LINZStandards_3Waters.xlsx for the benchmark network
+    Args:
+        path (str): folder of the workbooks
+        codes (int): extra random values added to every codelist
+        seed (int): random seed
+    """
+    rng = random.Random(seed)
+    domains = {
+        'domSwPipeMaterial': PIPE_MATERIALS,
+        'domSwPipeServiceStatus': SERVICE_STATUS,
+        'domSwAccessType': ACCESS_TYPES,
+        'domSwAccessServiceStatus': SERVICE_STATUS,
+    }
+    domains = {name: values + make_codes(codes, seed=rng.randint(0, 1 << 30)) for name, values in domains.items()}
+    CCC_attributes = [
+        ('SwPipe', 'SwPipeID', 'Long Integer', None),
+        ('SwPipe', 'SwPipeMaterial', 'String', 'domSwPipeMaterial'),
+        ('SwPipe', 'SwPipeServiceStatus', 'String', 'domSwPipeServiceStatus'),
+        ('SwPipe', 'SwPipeDiameter', 'Double', None),
+        ('SwPipe', 'CommissionDate', 'Date', None),
+        ('SwPipe', 'Comment', 'String', None),
+        ('SwAccess', 'SwAccessID', 'Long Integer', None),
+        ('SwAccess', 'SwAccessType', 'String', 'domSwAccessType'),
+        ('SwAccess', 'SwAccessServiceStatus', 'String', 'domSwAccessServiceStatus'),
+        ('SwAccess', 'CommissionDate', 'Date', None),
+        ('SwAccess', 'Comment', 'String', None),
+    ]
+    attributes = pd.DataFrame([row[:3] for row in CCC_attributes],
+                              columns=['GISModelName', 'GISAttributeName', 'GISAttributeDataType'])
+    domain_rows = [(model, attribute, domain, value)
+                   for model, attribute, _, domain in CCC_attributes if domain
+                   for value in domains[domain]]
+    domain_tables = pd.DataFrame(domain_rows, columns=['GISModelName', 'GISAttributeName', 'GISDomainTableName', 'GISDomainValue'])
+    with pd.ExcelWriter(os.path.join(path, 'GISAssetModels.xlsx')) as writer:
+        attributes.to_excel(writer, sheet_name='Asset Attributes', index=False)
+        domain_tables.to_excel(writer, sheet_name='Asset Domain Tables (full)', index=False)
+
+    codelists = {
+        'CL_Material': [v.upper().replace(' ', '_') for v in PIPE_MATERIALS],
+        'CL_Status': [v.upper() for v in SERVICE_STATUS],
+        'CL_Access_Type': [v.upper().replace(' ', '_') for v in ACCESS_TYPES],
+    }
+    codelists = {name: values + make_codes(codes, seed=rng.randint(0, 1 << 30)) for name, values in codelists.items()}
+    LINZ_attributes = [
+        ('Pipe', 'Unique_ID', 'Integer', None),
+        ('Pipe', 'Material', 'Text', 'CL_Material'),
+        ('Pipe', 'Status', 'Text', 'CL_Status'),
+        ('Pipe', 'Diameter', 'Decimal', None),
+        ('Pipe', 'Const_Date', 'Date', None),
+        ('Pipe', 'Comments', 'Text', None),
+        ('Access Point', 'Unique_ID', 'Integer', None),
+        ('Access Point', 'Type_AP', 'Text', 'CL_Access_Type'),
+        ('Access Point', 'Status', 'Text', 'CL_Status'),
+        ('Access Point', 'Const_Date', 'Date', None),
+        ('Access Point', 'Comments', 'Text', None),
+    ]
+    LINZ_data = pd.DataFrame(LINZ_attributes, columns=['Asset Class', 'Attribute Name - Abbreviated', 'Data Type', 'CODELIST Reference'])
+    LINZ_codes = pd.DataFrame([(name, code) for name, values in codelists.items() for code in values], columns=['Codelist', 'Code'])
+    with pd.ExcelWriter(os.path.join(path, 'LINZStandards_3Waters.xlsx')) as writer:
+        LINZ_data.to_excel(writer, sheet_name='Data', index=False)
+        LINZ_codes.to_excel(writer, sheet_name='Codes', index=False)
+
+
+def best_time(function, repeat):
+    """Best wall time in seconds of a function over some runs"""
+    return min(timeit.repeat(function, number=1, repeat=repeat))
+
+
+def benchmark_extraction(gpkg_path, repeat):
+    """Time the steps of a layer export on the synthetic pipe layer
+    Args:
+        gpkg_path (str): GeoPackage from make_geopackage
+        repeat (int): timing repetitions, the best one is reported
+    Returns:
+        dict: microseconds per feature for each step
+    """
+    data = ogr.Open(gpkg_path)
+    layer = data.GetLayerByName('vwOpenDataSwPipe')
+    n = layer.GetFeatureCount()
+
+    def read_features():
+        layer.ResetReading()
+        return [CCC_gdb_to_geometry.get_feature_dictionary(layer, feature) for feature in layer]
+
+    def read_columns():
+        layer.ResetReading()
+        return next(CCC_gdb_to_geometry.iter_column_batches(layer, None)).to_frame()
+
+    names = CCC_gdb_to_geometry.get_layer_columns(layer)
+    df = pd.DataFrame.from_records(read_features(), columns=names)
+    steps = {
+        'get_feature_dictionary': read_features,
+        'dataframe from dicts': lambda: pd.DataFrame.from_records(read_features(), columns=names),
+        'column buffers': read_columns,
+        'statistics': lambda: CCC_gdb_to_geometry.get_statistics(df, names),
+        'nztm to wgs84': lambda: (CCC_gdb_to_geometry.nztm_to_wgs84(df['GeoXLO'].values, df['GeoYLO'].values),
+                                  CCC_gdb_to_geometry.nztm_to_wgs84(df['GeoXHI'].values, df['GeoYHI'].values)),
+    }
+    if CCC_gdb_to_geometry.can_read_arrow(layer):
+        steps['arrow stream'] = lambda: next(CCC_gdb_to_geometry.iter_arrow_batches(layer, None)).to_frame()
+    return {name: best_time(step, repeat) / n * 1e6 for name, step in steps.items()}
+
+
+def benchmark_auto_mapping(ccc_values, linz_values, repeat):
+    """Time auto_mapping for one codelist pair
+    Args:
+        ccc_values (int): number of CCC codelist values
+        linz_values (int): number of LINZ codes
+        repeat (int): timing repetitions, the best one is reported
+    Returns:
+        float: milliseconds per codelist pair
+    """
+    CCC_List = make_codes(ccc_values, seed=1)
+    LINZ_List = make_codes(linz_values, seed=2)
+    return best_time(lambda: CCC_LINZ_auto_mapping.auto_mapping(CCC_List, LINZ_List), repeat) * 1e3
+
+
+def benchmark_end_to_end(work_path, gpkg_path, batch_size):
+    """Time a full export of the synthetic network and its gap analysis workbooks
+    Args:
+        work_path (str): folder with the workbooks, outputs go to its 'Outputs' folder
+        gpkg_path (str): GeoPackage from make_geopackage
+        batch_size (int): streaming batch size, None to build the layers in memory
+    Returns:
+        dict: seconds of each run and exported features per second
+    """
+    out_path = os.path.join(work_path, 'Outputs')
+    shutil.rmtree(out_path, ignore_errors=True)
+    network = dict(BENCHMARK_NETWORK, path=gpkg_path)
+
+    start = time.perf_counter()
+    summaries = CCC_gdb_to_geometry.export_network_task(network, out_path, BENCHMARK_ASSETS, batch_size)
+    export_seconds = time.perf_counter() - start
+    features = sum(summary['features'] for summary in summaries)
+
+    start = time.perf_counter()
+    sheets = [('GISAssetModels.xlsx', 'Asset Attributes'), ('GISAssetModels.xlsx', 'Asset Domain Tables (full)'),
+              ('LINZStandards_3Waters.xlsx', 'Data'), ('LINZStandards_3Waters.xlsx', 'Codes')]
+    metadata = CCC_LINZ_auto_mapping.MetadataIndex(*[pd.read_excel(os.path.join(work_path, workbook), sheet_name=sheet)
+                                                     for workbook, sheet in sheets])
+    os.makedirs(os.path.join(out_path, network['council'], 'LINZ', 'LINZ mapping'), exist_ok=True)
+    tasks = [(network, item, linz_asset, out_path) for item, linz_asset in network['Asset_Class_mapping'].items()]
+    summaries = CCC_LINZ_auto_mapping.run_tasks(tasks, metadata, 1)
+    mapping_seconds = time.perf_counter() - start
+    failures = [summary['error'] for summary in summaries if summary['error']]
+    if failures:
+        raise RuntimeError("gap analysis failed:\n" + "\n".join(failures))
+
+    return {
+        'export seconds': export_seconds,
+        'export features / second': features / export_seconds,
+        'mapping seconds': mapping_seconds,
+    }
+
+
+def get_environment():
+    """Versions of the interpreter and libraries the benchmark ran with"""
+    from osgeo import gdal
+    return {
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'gdal': gdal.__version__,
+        'numpy': np.__version__,
+        'pandas': pd.__version__,
+    }
+
+
+def main(argv=None):
+    arg_parser = argparse.ArgumentParser(description=__doc__)
+    arg_parser.add_argument('--features', type=int, default=100000, help='number of synthetic pipe features')
+    arg_parser.add_argument('--chambers', type=int, default=50000, help='number of synthetic access chamber features')
+    arg_parser.add_argument('--repeat', type=int, default=5, help='timing repetitions')
+    arg_parser.add_argument('--ccc-values', type=int, default=60, help='CCC values per codelist')
+    arg_parser.add_argument('--linz-values', type=int, default=40, help='LINZ codes per codelist')
+    arg_parser.add_argument('--codes', type=int, default=50, help='extra random values per codelist of the synthetic workbooks')
+    arg_parser.add_argument('--batch-size', type=int, default=None, help='streaming batch size of the end-to-end export')
+    arg_parser.add_argument('--work-path', default=None, help='folder for the synthetic data, default a temporary folder')
+    arg_parser.add_argument('--output', default='benchmark.json', help='JSON file for the results')
+    args = arg_parser.parse_args(argv)
+
+    work_path = args.work_path or tempfile.mkdtemp(prefix='ccc_benchmark_')
+    os.makedirs(work_path, exist_ok=True)
+    gpkg_path = os.path.join(work_path, 'Stormwater.gpkg')
+    print(f"Synthetic data in {work_path}")
+    make_geopackage(gpkg_path, args.features, args.chambers)
+    make_workbooks(work_path, args.codes)
+
+    results = {}
+
+    print(f"Geometry coordinates, {args.features} features")
+    results['coordinates us / feature'] = benchmark_coordinates(args.features, args.repeat)
+    for name, microseconds in results['coordinates us / feature'].items():
+        print(f"{name:>24s}: {microseconds:8.2f} us / feature")
+
+    print(f"Layer export steps, {args.features} features")
+    results['extraction us / feature'] = benchmark_extraction(gpkg_path, args.repeat)
+    for name, microseconds in results['extraction us / feature'].items():
+        print(f"{name:>24s}: {microseconds:8.2f} us / feature")
+
+    print(f"Codelist matching, {args.ccc_values} CCC values x {args.linz_values} LINZ codes")
+    results['matcher ms / codelist'] = benchmark_matcher(args.ccc_values, args.linz_values, args.repeat)
+    results['matcher ms / codelist']['auto_mapping'] = benchmark_auto_mapping(args.ccc_values, args.linz_values, args.repeat)
+    for name, milliseconds in results['matcher ms / codelist'].items():
+        print(f"{name:>24s}: {milliseconds:8.2f} ms / codelist")
+
+    print(f"End to end, {args.features} pipes and {args.chambers} access chambers")
+    results['end to end'] = benchmark_end_to_end(work_path, gpkg_path, args.batch_size)
+    for name, value in results['end to end'].items():
+        print(f"{name:>24s}: {value:10.2f}")
+
+    report = {
+        'timestamp': datetime.datetime.now().isoformat(),
+        'environment': get_environment(),
+        'parameters': vars(args),
+        'results': results,
+    }
+    with open(args.output, 'w') as f:
+        json.dump(report, f, indent=2)
+    print(f"Results saved to {args.output}")
+    if args.work_path is None:
+        shutil.rmtree(work_path, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main()
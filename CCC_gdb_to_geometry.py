@@ -8,33 +8,64 @@ Finally, the coordinate data of the pipe and access chamber is converted to WGS8
 from osgeo import ogr
 import pandas as pd
 import os
+import argparse
+import concurrent.futures
+import time
+import json
 import datetime
 import math
-from dateutil import parser
 import numpy as np
+import collections
+import functools
 import re
+import array
+import struct
 
+import CCC_instrumentation
+import CCC_registry
+import CCC_topology
 
-multiline_geometry_regex = re.compile("([0-9.]+).*?([0-9.]+).*?([0-9.]+).*?([0-9.]+)") 
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = None
+    pq = None
 
 
-def print_progress(x, y, i, j):
-    """Writes progress message every power of 2.
+def get_geometry_coordinates(geometry, envelope=False):
+    """Get the start and end point of a geometry as floats
     Args:
-        x (int): number of layers
-        y (int): number of features
-        i (int): layer counter
-        j (int): feature counter
+        geometry (osgeo.ogr.Geometry): feature geometry, 2D or 3D, single or multi-part
+        envelope (bool): return the corners of the envelope instead of the end points
+    Returns:
+        tuple: XLO, YLO, XHI, YHI, all None if the geometry has no points
     """
-    if (j & (j - 1)) == 0 or j == y:
-        now = datetime.datetime.now().isoformat()
-        print(f"Layer {i:2d} / {x:2d}, Feature {j:8d} / {y:8d}, Timestamp {now}")
+    if geometry is None or geometry.IsEmpty():
+        return None, None, None, None
+    if envelope:
+        min_x, max_x, min_y, max_y = geometry.GetEnvelope()
+        return min_x, min_y, max_x, max_y
+    #multi-part: first point of the first part, last point of the last part
+    count = geometry.GetGeometryCount()
+    first = geometry.GetGeometryRef(0) if count else geometry
+    last = geometry.GetGeometryRef(count - 1) if count else geometry
+    if first.GetPointCount() == 0 or last.GetPointCount() == 0:
+        return None, None, None, None
+    XLO, YLO = first.GetPoint_2D(0)
+    XHI, YHI = last.GetPoint_2D(last.GetPointCount() - 1)
+    return XLO, YLO, XHI, YHI
+
+
+COORDINATE_GEOMETRIES = set(['POINT', 'LINESTRING', 'MULTILINESTRING'])
 
-def get_feature_dictionary(layer, feature):
+
+def get_feature_dictionary(layer, feature, envelope=False):
     """Get feature dictionary
     Args:
         layer (osgeo.ogr.Layer): current layer
         feature (osgeo.ogr.Feature): current feature
+        envelope (bool): store the envelope instead of the end points in the Geo columns
     """
     # Base properties
     d = {
@@ -43,364 +74,1722 @@ def get_feature_dictionary(layer, feature):
     }
     d.update(feature.items())
     # Attempt to extract feature geometry
-    try:
-        geometry = feature.GetGeometryRef()
-        d['geometry_type'] = geometry.GetGeometryType()
-        d['geometry_name'] = geometry.GetGeometryName()       
-    except:
+    geometry = feature.GetGeometryRef()
+    if geometry is None:
         d['geometry_type'] = None
         d['geometry_name'] = None
+        return d
+
+    geometry_name = geometry.GetGeometryName()
+    d['geometry_type'] = geometry.GetGeometryType()
+    d['geometry_name'] = geometry_name
+
+    if geometry_name in COORDINATE_GEOMETRIES:
+        d['GeoXLO'], d['GeoYLO'], d['GeoXHI'], d['GeoYHI'] = get_geometry_coordinates(geometry, envelope)
 
-    if geometry.GetGeometryName() == 'POINT':
-        d['GeoXLO'] = geometry.GetX()
-        d['GeoYLO'] = geometry.GetY()
-        d['GeoXHI'] = geometry.GetX()
-        d['GeoYHI'] = geometry.GetY()
-        
-    elif geometry.GetGeometryName() == 'MULTILINESTRING':
-        
-        try:
-            XLO, YLO, XHI, YHI = multiline_geometry_regex.findall(str(geometry.Boundary()))[0]
-            d['GeoXLO'] = XLO
-            d['GeoYLO'] = YLO
-            d['GeoXHI'] = XHI
-            d['GeoYHI'] = YHI
-
-        except:
-            d['GeoXLO'] = None
-            d['GeoYLO'] = None
-            d['GeoXHI'] = None
-            d['GeoYHI'] = None
-            
     return d
 
 
-if __name__ == '__main__':
-    
-    in_path = "/Users/wujing/Desktop/Inputs"
-    out_path = "/Users/wujing/Desktop/Outputs"
+#Common variables for NZTM2000
+NZTM_A = 6378137
+NZTM_F = 1 / 298.257222101
+NZTM_LAMBDA_ZERO = 173
+NZTM_N_ZERO = 10000000
+NZTM_E_ZERO = 1600000
+NZTM_K_ZERO = 0.9996
+
+
+def nztm_to_wgs84(nztm_e, nztm_n):
+    """Convert whole columns of NZTM coordinates to WGS84
+    Args:
+        nztm_e (array-like): easting (X) values, numbers or numeric strings
+        nztm_n (array-like): northing (Y) values, numbers or numeric strings
+    Returns:
+        tuple: latitude and longitude float arrays, NaN where the input cannot be converted
+    """
+    a = NZTM_A
+    f = NZTM_F
+    kzero = NZTM_K_ZERO
+
+    N = pd.to_numeric(pd.Series(np.atleast_1d(np.asarray(nztm_n, dtype=object))), errors='coerce').to_numpy(dtype=float)
+    E = pd.to_numeric(pd.Series(np.atleast_1d(np.asarray(nztm_e, dtype=object))), errors='coerce').to_numpy(dtype=float)
+
+    #Calculation: From NZTM to lat/Long
+    b = a * (1 - f)
+    esq = 2 * f - f ** 2
+    smn = (a - b) / (a + b)
+    G = a * (1 - smn) * (1 - (smn ** 2)) * (1 + 9 * (smn ** 2) / 4 + 225 * (smn ** 4) / 64) * math.pi / 180.0
+
+    with np.errstate(invalid='ignore', divide='ignore', over='ignore'):
+        Nprime = N - NZTM_N_ZERO
+        mprime = Nprime / kzero
+        sigma = mprime * math.pi / (180 * G)
+        phiprime = sigma + (3 * smn / 2 - 27 * (smn ** 3) / 32) * np.sin(2 * sigma) + (21 * (smn ** 2) / 16 - 55 * (smn ** 4) / 32) * np.sin(4 * sigma) + (151 * (smn ** 3) / 96) * np.sin(6 * sigma) + (1097 * (smn ** 4) / 512) * np.sin(8 * sigma)
+        sin_sq = np.sin(phiprime) ** 2
+        rhoprime = a * (1 - esq) / ((1 - esq * sin_sq) ** 1.5)
+        upsilonprime = a / np.sqrt(1 - esq * sin_sq)
+
+        psiprime = upsilonprime / rhoprime
+        tprime = np.tan(phiprime)
+        secphi = 1 / np.cos(phiprime)
+        Eprime = E - NZTM_E_ZERO
+        chi = Eprime / (kzero * upsilonprime)
+        term_1 = tprime * Eprime * chi / (kzero * rhoprime * 2)
+        term_2 = term_1 * (chi ** 2) / 12 * (-4 * (psiprime ** 2) + 9 * psiprime * (1 - (tprime ** 2)) + 12 * (tprime ** 2))
+        term_3 = tprime * Eprime * (chi ** 5) / (kzero * rhoprime * 720) * (8 * (psiprime ** 4) * (11 - 24 * (tprime ** 2)) - 12 * (psiprime ** 3) * (21 - 71 * (tprime ** 2)) + 15 * (psiprime ** 2) * (15 - 98 * (tprime ** 2) + 15 * (tprime ** 4)) + 180 * psiprime * (5 * (tprime ** 2) - 3 * (tprime ** 4)) + 360 * (tprime ** 4))
+        term_4 = tprime * Eprime * (chi ** 7) / (kzero * rhoprime * 40320) * (1385 + 3633 * (tprime ** 2) + 4095 * (tprime ** 4) + 1575 * (tprime ** 6))
+        term1 = chi * secphi
+        term2 = (chi ** 3) * secphi / 6 * (psiprime + 2 * (tprime ** 2))
+        term3 = (chi ** 5) * secphi / 120 * (-4 * (psiprime ** 3) * (1 - 6 * (tprime ** 2)) + (psiprime ** 2) * (9 - 68 * (tprime ** 2)) + 72 * psiprime * (tprime ** 2) + 24 * (tprime ** 4))
+        term4 = (chi ** 7) * secphi / 5040 * (61 + 662 * (tprime ** 2) + 1320 * (tprime ** 4) + 720 * (tprime ** 6))
+
+        latitude = (phiprime - term_1 + term_2 - term_3 + term_4) * 180 / math.pi
+        longitude = NZTM_LAMBDA_ZERO + 180 / math.pi * (term1 - term2 + term3 - term4)
+
+    invalid = ~(np.isfinite(latitude) & np.isfinite(longitude))
+    latitude[invalid] = np.nan
+    longitude[invalid] = np.nan
+    return latitude, longitude
+
+
+def calculate_lat_lone(nztm_e, nztm_n):
+    """Convert NZTM to WGS84
+    Args:
+        nztm_e(str):longitude of NZTM
+        nztm_n(str):latitude of NZTM
+    Returns:
+        tuple: latitude and longitude, None for both if the input cannot be converted
+    """
+    latitude, longitude = nztm_to_wgs84([nztm_e], [nztm_n])
+    if np.isnan(latitude[0]):
+        return None, None
+    return float(latitude[0]), float(longitude[0])
+
+
+def nztm_to_lat_long(dataframe, geo_x, geo_y):
+    '''Create converted longitude and latitude lists
+    Args:
+        dataframe(pd.DataFrame):DataFrame of layer
+        geo_x: column name of longitude
+        geo_y: column name of latitude
+    Returns:
+        tuple: latitude and longitude lists in row order, None where the row cannot be converted
+    '''
+    latitude, longitude = nztm_to_wgs84(dataframe[geo_x].values, dataframe[geo_y].values)
+    invalid = np.isnan(latitude)
+    lat_list = np.where(invalid, None, latitude).tolist()
+    long_list = np.where(invalid, None, longitude).tolist()
+    return lat_list, long_list
+
+
+
+GEOMETRY_STYLES = ['bruce', 'wkt', 'geojson']
+
+
+def format_coordinates(values, precision=None):
+    """Format a column of coordinates as text in one step
+    Args:
+        values (array-like): coordinates, None or NaN where missing
+        precision (int): number of decimals, None for the shortest text that
+            reads back as the same float (as str() does)
+    Returns:
+        np.ndarray: coordinate strings, 'None' where missing
+    """
+    values = np.asarray(values, dtype=float)
+    missing = np.isnan(values)
+    if precision is None:
+        text = values.astype(str)
+    else:
+        text = np.char.mod(f'%.{precision}f', values)
+    return np.where(missing, 'None', text)
+
+
+def format_geometry(long_min, lat_min, long_max, lat_max, style='bruce', precision=None):
+    """Format the WGS84 end points of features as geometry strings, in row order
+    Args:
+        long_min(array-like): low longitude
+        lat_min(array-like): low latitude
+        long_max(array-like): high longitude
+        lat_max(array-like): high latitude
+        style(str): 'bruce' for "lon,lat,0 lon,lat,0", 'wkt' or 'geojson' for a LineString
+        precision(int): number of decimals, None for the shortest exact text
+    Returns:
+        np.ndarray: one geometry string per feature
+    """
+    x0, y0, x1, y1 = (format_coordinates(v, precision) for v in (long_min, lat_min, long_max, lat_max))
+    if style == 'bruce':
+        return functools.reduce(np.char.add, [x0, ',', y0, ',0 ', x1, ',', y1, ',0'])
+    if style == 'wkt':
+        geometry = functools.reduce(np.char.add, ['LINESTRING (', x0, ' ', y0, ', ', x1, ' ', y1, ')'])
+        empty = 'LINESTRING EMPTY'
+    elif style == 'geojson':
+        geometry = functools.reduce(np.char.add, ['{"type": "LineString", "coordinates": [[', x0, ', ', y0, '], [', x1, ', ', y1, ']]}'])
+        empty = 'null'
+    else:
+        raise ValueError(f"unknown geometry style {style!r}, expected one of {GEOMETRY_STYLES}")
+    missing = (x0 == 'None') | (y0 == 'None') | (x1 == 'None') | (y1 == 'None')
+    return np.where(missing, empty, geometry)
+
+
+def create_geometry(long_min, lat_min, long_max, lat_max, df, style='bruce', precision=None):
+    '''
+    Add column geometry in the format [Lat,Long,Altitude_ Lat,Long,Altitude]
+    Example “172.74424244,-43.54612293,0 172.74397566,-43.54619336,0”
+    Args:
+        long_min(list): low longitude
+        lat_min(list): low latitude
+        long_max(list): high longitude
+        lat_max(list): high latitude
+        df(pd.DataFrame): dataframe to add geometry column, the lists are in its row order
+        style(str): geometry format, see format_geometry
+        precision(int): number of decimals, None for the shortest exact text
+    '''
     
-    #assets needs to get geometry data
-    assets = set(['vwOpenDataSwPipe','vwOpenDataSwAccess','vwOpenDataWwPipe','vwOpenDataWwAccess'])
+    df['geometry'] = format_geometry(long_min, lat_min, long_max, lat_max, style, precision)
     
-      
-    networks = [
-        
-        {
-            'council': 'Christchurch City Council',
-            'network': 'Stormwater',
-            'path': os.path.join(in_path, 'Christchurch City Council', 'Stormwater.gdb'),
-            'type': 'gdb'
-        },
-        {
-            'council': 'Christchurch City Council',
-            'network': 'Wastewater',
-            'path': os.path.join(in_path, 'Christchurch City Council', 'Wastewater.gdb'),
-            'type': 'gdb'
-        },
-        {
-            'council': 'Christchurch City Council',
-            'network': 'Watersupply',
-            'path': os.path.join(in_path, 'Christchurch City Council', 'Watersupply.gdb'),
-            'type': 'gdb'
-        }
+    return df
+
+
+EMPTY_VALUES = ["", " ", "NA", "None"]
+
+
+def check_empty(x):
+    return x.isnull() | x.isin(EMPTY_VALUES)
+
+
+def count_unique(x):
+    return x.value_counts().shape[0]
+
+
+DATE_FORMATS = [
+    '%Y/%m/%d',
+    '%Y/%m/%d %H:%M:%S',
+    '%Y/%m/%d %H:%M:%S.%f',
+    '%Y-%m-%d',
+    '%Y-%m-%d %H:%M:%S',
+    '%Y-%m-%d %H:%M:%S.%f',
+    '%Y-%m-%dT%H:%M:%S',
+    '%Y-%m-%dT%H:%M:%S.%f',
+    '%d/%m/%Y',
+    '%d/%m/%Y %H:%M:%S',
+    '%d-%m-%Y',
+]
+
+DIRECTIVE_SHAPES = {'%Y': '9999', '%m': '99?', '%d': '99?', '%H': '99?', '%M': '99', '%S': '99', '%f': '9+'}
+
+time_zone_regex = re.compile(r"(?<=:\d\d)(\.\d+)?(Z|[+-]\d\d(:?\d\d)?)$")
+directive_regex = re.compile(r"(%[YmdHMSf])")
+digit_regex = re.compile(r"\d")
+letter_regex = re.compile(r"[^\W\d_]")
+
+TYPE_SAMPLE_SIZE = 100
+
+
+def get_value_shape(s):
+    """Reduce a string to its shape: digits become 9 and letters become a
+    Args:
+        s (str): value to reduce
+    """
+    return letter_regex.sub('a', digit_regex.sub('9', s))
+
+
+#value shapes each date format can produce, e.g. '%Y/%m/%d' -> 9999/99?/99?
+DATE_FORMAT_SHAPES = []
+for date_format in DATE_FORMATS:
+    pattern = ''.join(DIRECTIVE_SHAPES.get(part) or re.escape(get_value_shape(part))
+                      for part in directive_regex.split(date_format))
+    DATE_FORMAT_SHAPES.append((re.compile(pattern + '$'), date_format))
+
+
+@functools.lru_cache(maxsize=1024)
+def get_date_format(shape):
+    """Get the date format matching a value shape, memoised per shape
+    Args:
+        shape (str): value shape from get_value_shape
+    Returns:
+        str: strptime format, None if the shape is not a date shape
+    """
+    for shape_regex, date_format in DATE_FORMAT_SHAPES:
+        if shape_regex.match(shape):
+            return date_format
+    return None
+
+
+def isdate(s):
+    """Check if string is a valid date in one of the DATE_FORMATS.
+    Args:
+        s (str): string to be checked
+    Returns:
+        bool: if string can be parsed 
+    """
+    s = time_zone_regex.sub(r'\1', s.strip())
+    date_format = get_date_format(get_value_shape(s))
+    if date_format is None:
+        return False
+    try:
+        datetime.datetime.strptime(s, date_format)
+        return True
+    except ValueError:
+        return False
+
+
+def get_value_type(v):
+    """Get the statistics data type of a single value
+    Args:
+        v: valid value of a column
+    """
+    if np.issubdtype(type(v), int):
+        return 'Integer'
+    if np.issubdtype(type(v), float):
+        return 'Decimal'
+    if isinstance(v, str) and isdate(v):
+        return 'Date'
+    if isinstance(v, str):
+        return 'Alpha / Numeric'
+    return ''
+
+
+def infer_type(sample):
+    """Infer the statistics data type of a column from a sample of its valid values
+    Args:
+        sample (list): first valid values of the column
+    Returns:
+        tuple: most common data type and the share of sampled values having it
+    """
+    if not sample:
+        return 'NaN', None
+    counts = collections.Counter(get_value_type(v) for v in sample)
+    data_type, count = counts.most_common(1)[0]
+    return data_type, count / len(sample)
+
+
+def check_type(x):
+    return infer_type(list(x.dropna().iloc[:TYPE_SAMPLE_SIZE]))[0]
+
+
+STATISTICS_COLUMNS = [
+    'Count',
+    'Not Empty',
+    'Empty',
+    'Unique',
+    'Data Type',
+    'Negative',
+    'Zeros',
+    'Positive',
+    'Min',
+    'Max',
+    'Min Length',
+    'Max Length',
+    'Commas',
+    'Date String',
+    'Type Confidence',
+]
+
+
+class ColumnProfile:
+    """Statistics of one attribute, accumulated chunk by chunk in a single pass.
+    Profiles of consecutive chunks can be merged, the earlier one first.
+    """
+
+    def __init__(self):
+        self.count = 0
+        self.empty = 0
+        self.values = set()
+        #first valid values, for the data type and date string
+        self.sample = []
+        #numeric statistics, only gathered from numeric chunks
+        self.min = None
+        self.max = None
+        self.negative = 0
+        self.zeros = 0
+        self.positive = 0
+        #string statistics, only gathered from text chunks
+        self.min_length = None
+        self.max_length = None
+        self.length_missing = False
+        self.commas = 0
+
+    def update(self, x):
+        """Add a chunk of the column
+        Args:
+            x (pd.Series): column values of the chunk
+        """
+        null = x.isnull()
+        self.count += len(x)
+        self.empty += int((null | x.isin(EMPTY_VALUES)).sum())
+        valid = x[~null]
+        if len(valid) == 0:
+            return
+        self.values.update(valid.unique())
+        if len(self.sample) < TYPE_SAMPLE_SIZE:
+            self.sample.extend(valid.iloc[:TYPE_SAMPLE_SIZE - len(self.sample)].tolist())
+
+        if pd.api.types.is_numeric_dtype(x) and not pd.api.types.is_bool_dtype(x):
+            low, high = valid.min(), valid.max()
+            self.min = low if self.min is None else min(self.min, low)
+            self.max = high if self.max is None else max(self.max, high)
+            self.negative += int((valid < 0).sum())
+            self.zeros += int((valid == 0).sum())
+            self.positive += int((valid > 0).sum())
+            return
+
+        try:
+            lengths = x.str.len()
+            commas = x.str.contains(',')
+        except AttributeError:
+            return
+        if lengths.notnull().any():
+            low, high = lengths.min(), lengths.max()
+            self.min_length = low if self.min_length is None else min(self.min_length, low)
+            self.max_length = high if self.max_length is None else max(self.max_length, high)
+        self.length_missing = self.length_missing or bool(lengths.isnull().any())
+        self.commas += int(commas.sum())
+
+    def merge(self, other):
+        """Merge the profile of the following chunk into this one
+        Args:
+            other (ColumnProfile): profile of a later chunk
+        """
+        self.count += other.count
+        self.empty += other.empty
+        self.values |= other.values
+        self.sample.extend(other.sample[:TYPE_SAMPLE_SIZE - len(self.sample)])
+        for name, pick in (('min', min), ('max', max), ('min_length', min), ('max_length', max)):
+            mine, theirs = getattr(self, name), getattr(other, name)
+            if theirs is not None:
+                setattr(self, name, theirs if mine is None else pick(mine, theirs))
+        self.negative += other.negative
+        self.zeros += other.zeros
+        self.positive += other.positive
+        self.length_missing = self.length_missing or other.length_missing
+        self.commas += other.commas
+        return self
+
+    @property
+    def data_type(self):
+        """Data type and confidence inferred from the sampled values"""
+        return infer_type(self.sample)
+
+
+class LayerProfile:
+    """Single-pass statistics of every attribute of a layer.
+    Feed it the whole layer or consecutive batches with update, or merge
+    the profiles of separate chunks, then build the table with get_statistics.
+    Args:
+        names (list): attribute names, one statistics row each
+    """
+
+    def __init__(self, names):
+        self.names = list(names)
+        self.columns = {name: ColumnProfile() for name in self.names}
+
+    def update(self, df):
+        """Add a batch of features
+        Args:
+            df (pd.DataFrame): batch with a column per attribute
+        """
+        for name in self.names:
+            self.columns[name].update(df[name])
+        return self
+
+    def merge(self, other):
+        """Merge the profile of the following chunk into this one
+        Args:
+            other (LayerProfile): profile of a later chunk with the same names
+        """
+        for name in self.names:
+            self.columns[name].merge(other.columns[name])
+        return self
+
+    def get_statistics(self):
+        """Build the statistics table
+        Returns:
+            pd.DataFrame: one row per attribute with the STATISTICS_COLUMNS
+        """
+        names = self.names
+        columns = self.columns
+        statistics = pd.DataFrame(index=names, columns=STATISTICS_COLUMNS)
+        statistics.index.name = 'Attribute'
+
+        statistics['Count'] = pd.Series({name: columns[name].count for name in names})
+        statistics['Empty'] = pd.Series({name: columns[name].empty for name in names})
+        statistics['Not Empty'] = statistics['Count'] - statistics['Empty']
+        statistics['Unique'] = pd.Series({name: len(columns[name].values) for name in names})
+        data_types = {name: columns[name].data_type for name in names}
+        statistics['Data Type'] = pd.Series({name: data_types[name][0] for name in names})
+        statistics['Type Confidence'] = pd.Series({name: data_types[name][1] for name in names}, dtype=float)
+
+        x = statistics['Data Type'].isin(['Integer', 'Decimal'])
+        numeric = [name for name in x[x].index if columns[name].min is not None]
+        statistics['Min'] = pd.Series({name: columns[name].min for name in numeric}, dtype=object).infer_objects()
+        statistics['Max'] = pd.Series({name: columns[name].max for name in numeric}, dtype=object).infer_objects()
+        statistics['Negative'] = pd.Series({name: columns[name].negative for name in numeric}, dtype=float)
+        statistics['Zeros'] = pd.Series({name: columns[name].zeros for name in numeric}, dtype=float)
+        statistics['Positive'] = pd.Series({name: columns[name].positive for name in numeric}, dtype=float)
+
+        x = statistics['Data Type'] == 'Alpha / Numeric'
+        for name in x[x].index:
+            column = columns[name]
+            if column.min_length is None:
+                continue
+            as_length = float if column.length_missing else int
+            statistics.loc[name, 'Min Length'] = as_length(column.min_length)
+            statistics.loc[name, 'Max Length'] = as_length(column.max_length)
+            statistics.loc[name, 'Commas'] = column.commas
+
+        x = statistics['Data Type'] == 'Date'
+        for name in x[x].index:
+            statistics.loc[name, 'Date String'] = columns[name].sample[0]
+
+        return statistics.reset_index()
+
+
+def get_statistics(df, names):
+    """Profile every attribute of a layer
+    Args:
+        df (pd.DataFrame): layer features
+        names (list): attribute names, one statistics row each
+    Returns:
+        pd.DataFrame: one row per attribute with the STATISTICS_COLUMNS
+    """
+    return LayerProfile(names).update(df).get_statistics()
+
+
+LAYER_COLUMNS = [
+    'layer',
+    'id',
+    'geometry_type',
+    'geometry_name',
+    'GeoXLO',
+    'GeoYLO',
+    'GeoXHI',
+    'GeoYHI'
+]
+
+
+def get_field_names(layer, fields=None):
+    """Get the attribute field names of a layer in schema order
+    Args:
+        layer (osgeo.ogr.Layer): current layer
+        fields (list): only keep these fields, None for all
+    """
+    layer_defn = layer.GetLayerDefn()
+    names = [layer_defn.GetFieldDefn(k).GetName() for k in range(layer_defn.GetFieldCount())]
+    if fields is not None:
+        names = [name for name in names if name in fields]
+    return names
+
+
+def get_layer_columns(layer, fields=None):
+    """Get the output column names of a layer from its schema
+    Args:
+        layer (osgeo.ogr.Layer): current layer
+        fields (list): only keep these attribute fields, None for all
+    """
+    return LAYER_COLUMNS + get_field_names(layer, fields)
+
+
+def apply_layer_filters(layer, filters=None):
+    """Push attribute, spatial and field filters down to the OGR driver, so
+    filtered out features are skipped and ignored fields are never decoded
+    Args:
+        layer (osgeo.ogr.Layer): current layer
+        filters (dict): 'where' SQL attribute filter, 'bbox' [xmin, ymin, xmax, ymax]
+            in the layer's coordinates and 'fields' to keep, each None for no filter
+    """
+    filters = filters or {}
+    where = filters.get('where')
+    try:
+        error = layer.SetAttributeFilter(where)
+    except RuntimeError as e:
+        error = e
+    if error:
+        raise ValueError(f"attribute filter {where!r} does not apply to layer {layer.GetName()}: {error}")
+
+    bbox = filters.get('bbox')
+    if bbox is not None:
+        layer.SetSpatialFilterRect(*bbox)
+    else:
+        layer.SetSpatialFilter(None)
+
+    fields = filters.get('fields')
+    if fields is not None:
+        kept = set(get_field_names(layer, fields))
+        layer.SetIgnoredFields([name for name in get_field_names(layer) if name not in kept])
+    else:
+        layer.SetIgnoredFields([])
+
+
+def get_arrow_schema(layer, fields=None):
+    """Get the typed Arrow schema of the layer table from the OGR field types
+    Args:
+        layer (osgeo.ogr.Layer): current layer
+        fields (list): only keep these attribute fields, None for all
+    """
+    arrow_types = {
+        ogr.OFTInteger: pa.int32(),
+        ogr.OFTInteger64: pa.int64(),
+        ogr.OFTReal: pa.float64(),
+    }
+    arrow_fields = [
+        ('layer', pa.string()),
+        ('id', pa.int64()),
+        ('geometry_type', pa.int32()),
+        ('geometry_name', pa.string()),
+        ('GeoXLO', pa.float64()),
+        ('GeoYLO', pa.float64()),
+        ('GeoXHI', pa.float64()),
+        ('GeoYHI', pa.float64()),
     ]
-     
-    
-    for network in networks:
+    layer_defn = layer.GetLayerDefn()
+    for k in range(layer_defn.GetFieldCount()):
+        field_defn = layer_defn.GetFieldDefn(k)
+        if fields is not None and field_defn.GetName() not in fields:
+            continue
+        #dates, times and lists are kept as the strings OGR returns for them
+        arrow_fields.append((field_defn.GetName(), arrow_types.get(field_defn.GetType(), pa.string())))
+    return pa.schema(arrow_fields)
+
 
-        
-        if network['type'] == 'gdb':
-            driver = ogr.GetDriverByName('OpenFileGDB')
-            data = driver.Open(network['path'], 0)
+def as_text(v):
+    """Convert a value for a string column, keeping missing values as None"""
+    if v is None or isinstance(v, str):
+        return v
+    if isinstance(v, float) and math.isnan(v):
+        return None
+    return str(v)
+
+
+def to_arrow_table(df, schema):
+    """Convert a batch of features to an Arrow table with the given schema
+    Args:
+        df (pd.DataFrame): batch of features
+        schema (pyarrow.Schema): schema from get_arrow_schema
+    """
+    columns = {}
+    for field in schema:
+        if pa.types.is_string(field.type):
+            columns[field.name] = df[field.name].astype(object).map(as_text)
         else:
-            data = ogr.Open(network['path'])
-            
+            columns[field.name] = pd.to_numeric(df[field.name], errors='coerce')
+    return pa.Table.from_pandas(pd.DataFrame(columns), schema=schema, preserve_index=False)
+
+
+def iter_feature_dictionaries(layer, progress=None):
+    """Yield one feature dictionary at a time
+    Args:
+        layer (osgeo.ogr.Layer): current layer
+        progress (callable): called with the feature counter before each feature
+    """
+    for j, feature in enumerate(layer, 1):
+        if progress is not None:
+            progress(j)
+        yield get_feature_dictionary(layer, feature)
+
+
+def iter_batches(records, batch_size):
+    """Group records into lists of at most batch_size items
+    Args:
+        records (iterable): records to group
+        batch_size (int): maximum number of records per batch, None for a single batch
+    """
+    batch = []
+    for record in records:
+        batch.append(record)
+        if len(batch) == batch_size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+#OGR field types read into typed buffers, other types (lists) are kept as objects
+INTEGER_FIELD_TYPES = set([ogr.OFTInteger, ogr.OFTInteger64])
+REAL_FIELD_TYPES = set([ogr.OFTReal])
+TEXT_FIELD_TYPES = set([ogr.OFTString, ogr.OFTDate, ogr.OFTTime, ogr.OFTDateTime])
+
+
+class ColumnBuffer:
+    """Typed buffer of one column: integers and reals in packed arrays, text as
+    dictionary codes into the distinct values seen so far, anything else as objects
+    Args:
+        kind (str): 'integer', 'real', 'text' or 'object'
+    """
+
+    def __init__(self, kind):
+        self.kind = kind
+        #distinct text values and their codes, kept from batch to batch
+        self.categories = {}
+        self.clear()
+
+    def clear(self):
+        if self.kind == 'integer':
+            self.values = array.array('q')
+            self.valid = bytearray()
+        elif self.kind == 'real':
+            self.values = array.array('d')
+        elif self.kind == 'text':
+            self.values = array.array('i')
+        else:
+            self.values = []
+
+    def append(self, v):
+        if self.kind == 'integer':
+            self.values.append(0 if v is None else v)
+            self.valid.append(v is not None)
+        elif self.kind == 'real':
+            self.values.append(math.nan if v is None else v)
+        elif self.kind == 'text':
+            if v is None:
+                self.values.append(-1)
+            else:
+                code = self.categories.get(v)
+                if code is None:
+                    code = self.categories[v] = len(self.categories)
+                self.values.append(code)
+        else:
+            self.values.append(v)
+
+    def to_array(self):
+        """Get the buffered values with the dtype pandas would give them: integers, or
+        floats when some are missing, floats, categoricals and objects"""
+        if self.kind == 'integer':
+            values = np.array(self.values, dtype=np.int64)
+            valid = np.frombuffer(self.valid, dtype=np.bool_)
+            if valid.all():
+                return values
+            return np.where(valid, values, np.nan)
+        if self.kind == 'real':
+            return np.array(self.values, dtype=np.float64)
+        if self.kind == 'text':
+            return pd.Categorical.from_codes(np.array(self.values, dtype=np.int32), categories=list(self.categories))
+        return pd.Series(self.values, dtype=object).infer_objects().to_numpy()
+
+
+class ColumnBuffers:
+    """Columns of a batch of features, typed from the OGR layer schema instead of
+    inferred from per-feature dictionaries
+    Args:
+        layer (osgeo.ogr.Layer): layer being read
+        fields (list): attribute fields to read, None for all
+    """
+
+    def __init__(self, layer, fields=None):
+        self.layer_name = layer.GetName()
+        self.size = 0
+        self.buffers = {
+            'id': ColumnBuffer('integer'),
+            'geometry_type': ColumnBuffer('integer'),
+            'geometry_name': ColumnBuffer('text'),
+        }
+        for name in LAYER_COLUMNS[4:]:
+            self.buffers[name] = ColumnBuffer('real')
+        self.coordinates = [self.buffers[name] for name in LAYER_COLUMNS[4:]]
+        self.fields = []
+        kept = None if fields is None else set(fields)
+        layer_defn = layer.GetLayerDefn()
+        for k in range(layer_defn.GetFieldCount()):
+            field_defn = layer_defn.GetFieldDefn(k)
+            name = field_defn.GetName()
+            if kept is not None and name not in kept:
+                continue
+            field_type = field_defn.GetType()
+            if field_type in INTEGER_FIELD_TYPES:
+                kind = 'integer'
+            elif field_type in REAL_FIELD_TYPES:
+                kind = 'real'
+            elif field_type in TEXT_FIELD_TYPES:
+                kind = 'text'
+            else:
+                kind = 'object'
+            self.buffers[name] = ColumnBuffer(kind)
+            self.fields.append((k, self.buffers[name]))
+
+    def __len__(self):
+        return self.size
+
+    def append(self, feature):
+        """Add the FID, geometry summary and attribute values of a feature"""
+        self.size += 1
+        self.buffers['id'].append(feature.GetFID())
+        geometry = feature.GetGeometryRef()
+        if geometry is None:
+            self.buffers['geometry_type'].append(None)
+            self.buffers['geometry_name'].append(None)
+            coordinates = (None, None, None, None)
+        else:
+            geometry_name = geometry.GetGeometryName()
+            self.buffers['geometry_type'].append(geometry.GetGeometryType())
+            self.buffers['geometry_name'].append(geometry_name)
+            if geometry_name in COORDINATE_GEOMETRIES:
+                coordinates = get_geometry_coordinates(geometry)
+            else:
+                coordinates = (None, None, None, None)
+        for buffer, v in zip(self.coordinates, coordinates):
+            buffer.append(v)
+        for k, buffer in self.fields:
+            buffer.append(feature.GetField(k))
+
+    def to_frame(self):
+        """Get the batch as a dataframe with the columns of get_layer_columns"""
+        columns = {'layer': pd.Categorical.from_codes(np.zeros(self.size, dtype=np.int32), categories=[self.layer_name])}
+        columns.update((name, buffer.to_array()) for name, buffer in self.buffers.items())
+        return pd.DataFrame(columns, columns=['layer'] + list(self.buffers))
+
+    def clear(self):
+        self.size = 0
+        for buffer in self.buffers.values():
+            buffer.clear()
+
+
+def iter_column_batches(layer, batch_size, fields=None, progress=None):
+    """Read the features of a layer into column buffers, batch_size features at a time.
+    The same buffers are yielded and cleared again, take each batch with to_frame
+    before asking for the next.
+    Args:
+        layer (osgeo.ogr.Layer): current layer
+        batch_size (int): maximum number of features per batch, None for a single batch
+        fields (list): attribute fields to read, None for all
+        progress (callable): called with the feature counter before each feature
+    """
+    buffers = ColumnBuffers(layer, fields)
+    for j, feature in enumerate(layer, 1):
+        if progress is not None:
+            progress(j)
+        buffers.append(feature)
+        if len(buffers) == batch_size:
+            yield buffers
+            buffers.clear()
+    if len(buffers):
+        yield buffers
+
+
+#names GetGeometryName gives to the WKB geometry type codes
+WKB_GEOMETRY_NAMES = {1: 'POINT', 2: 'LINESTRING', 3: 'POLYGON', 4: 'MULTIPOINT', 5: 'MULTILINESTRING',
+                      6: 'MULTIPOLYGON', 7: 'GEOMETRYCOLLECTION', 8: 'CIRCULARSTRING', 9: 'COMPOUNDCURVE',
+                      10: 'CURVEPOLYGON', 11: 'MULTICURVE', 12: 'MULTISURFACE', 13: 'CURVE', 14: 'SURFACE',
+                      15: 'POLYHEDRALSURFACE', 16: 'TIN', 17: 'TRIANGLE'}
+
+
+def read_wkb_header(wkb, offset):
+    """Read the byte order and type of the WKB geometry at an offset
+    Args:
+        wkb (bytes): WKB (ISO or with the 2.5D bit) of a geometry
+        offset (int): position of the geometry
+    Returns:
+        tuple: struct byte order, base type code, number of values per point and offset of the geometry body
+    """
+    byte_order = '<' if wkb[offset] == 1 else '>'
+    code, = struct.unpack_from(byte_order + 'I', wkb, offset + 1)
+    offset += 5
+    has_z = bool(code & 0x80000000)
+    has_m = bool(code & 0x40000000)
+    if code & 0x20000000:
+        #EWKB SRID
+        offset += 4
+    code &= 0x0FFFFFFF
+    has_z = has_z or code // 1000 in (1, 3)
+    has_m = has_m or code // 1000 in (2, 3)
+    return byte_order, code % 1000, 2 + has_z + has_m, offset, has_z, has_m
+
+
+def get_wkb_coordinates(wkb):
+    """Get the geometry type, name and end points of a WKB geometry the way
+    get_feature_dictionary gets them from an OGR geometry, without SWIG calls
+    Args:
+        wkb (bytes): WKB geometry, None for no geometry
+    Returns:
+        tuple: geometry type (OGR code), geometry name, XLO, YLO, XHI, YHI
+    """
+    if wkb is None:
+        return None, None, None, None, None, None
+    byte_order, base, dimension, offset, has_z, has_m = read_wkb_header(wkb, 0)
+    #OGR codes: 2.5D bit for Z only, ISO 2000 / 3000 offsets with M
+    if has_m:
+        geometry_type = base + (3000 if has_z else 2000)
+    elif has_z:
+        geometry_type = base - 0x80000000
+    else:
+        geometry_type = base
+    geometry_name = WKB_GEOMETRY_NAMES.get(base)
+    if geometry_name not in COORDINATE_GEOMETRIES:
+        return geometry_type, geometry_name, None, None, None, None
+    empty = (geometry_type, geometry_name, None, None, None, None)
+    if base == 1:
+        x, y = struct.unpack_from(byte_order + 'dd', wkb, offset)
+        if math.isnan(x) and math.isnan(y):
+            return empty
+        return geometry_type, geometry_name, x, y, x, y
+    if base == 2:
+        parts = [(byte_order, dimension, offset)]
+    else:
+        count, = struct.unpack_from(byte_order + 'I', wkb, offset)
+        offset += 4
+        parts = []
+        for _ in range(count):
+            part_order, _, part_dimension, part_offset, _, _ = read_wkb_header(wkb, offset)
+            parts.append((part_order, part_dimension, part_offset))
+            points, = struct.unpack_from(part_order + 'I', wkb, part_offset)
+            offset = part_offset + 4 + points * part_dimension * 8
+    if not parts:
+        return empty
+    #first point of the first part, last point of the last part
+    first_order, _, first_offset = parts[0]
+    last_order, last_dimension, last_offset = parts[-1]
+    first_points, = struct.unpack_from(first_order + 'I', wkb, first_offset)
+    last_points, = struct.unpack_from(last_order + 'I', wkb, last_offset)
+    if first_points == 0 or last_points == 0:
+        return empty
+    XLO, YLO = struct.unpack_from(first_order + 'dd', wkb, first_offset + 4)
+    XHI, YHI = struct.unpack_from(last_order + 'dd', wkb, last_offset + 4 + (last_points - 1) * last_dimension * 8)
+    return geometry_type, geometry_name, XLO, YLO, XHI, YHI
+
+
+#field types the Arrow stream returns in a form that converts to the values GetField gives
+ARROW_FIELD_TYPES = set([ogr.OFTInteger, ogr.OFTInteger64, ogr.OFTReal, ogr.OFTString, ogr.OFTDate, ogr.OFTDateTime])
+
+READERS = ['auto', 'arrow', 'features']
+
+
+def can_read_arrow(layer, fields=None):
+    """Check that a layer can be read with GetArrowStreamAsNumPy (GDAL 3.6 or later)
+    Args:
+        layer (osgeo.ogr.Layer): current layer
+        fields (list): attribute fields to read, None for all
+    """
+    if not hasattr(layer, 'GetArrowStreamAsNumPy'):
+        return False
+    layer_defn = layer.GetLayerDefn()
+    kept = get_field_names(layer, fields)
+    return all(layer_defn.GetFieldDefn(k).GetType() in ARROW_FIELD_TYPES
+               for k in range(layer_defn.GetFieldCount()) if layer_defn.GetFieldDefn(k).GetName() in kept)
+
+
+def as_masked_values(values):
+    """Split an Arrow stream column into its data and a missing value mask"""
+    missing = np.ma.getmaskarray(values)
+    data = np.ma.getdata(values)
+    if data.dtype == object:
+        missing = missing | np.array([v is None for v in data], dtype=bool)
+    return data, missing
+
+
+def format_datetimes(values, missing, date_only):
+    """Format datetime64 values the way OGR formats date and datetime fields
+    Args:
+        values (np.ndarray): datetime64 values
+        missing (np.ndarray): missing value mask
+        date_only (bool): OFTDate field, without the time
+    """
+    if date_only:
+        text = pd.Series(np.datetime_as_string(values.astype('datetime64[D]'), unit='D')).str.replace('-', '/')
+    else:
+        #milliseconds only where there are some, as GetField gives them
+        text = pd.Series(np.datetime_as_string(values.astype('datetime64[ms]'), unit='ms'))
+        text = text.str.replace(r'\.000$', '', regex=True).str.replace('-', '/').str.replace('T', ' ')
+    return np.where(missing, None, text.to_numpy(dtype=object))
+
+
+class ArrowBatch:
+    """Record batches of GetArrowStreamAsNumPy, turned into the same dataframe
+    as the feature iterator gives, geometries parsed from their WKB
+    Args:
+        arrays (list): record batches, dicts of NumPy arrays by column
+        layer_name (str): layer being read
+        fid_column (str): FID column of the batches
+        geometry_column (str): WKB geometry column of the batches
+        fields (list): (name, OGR field type) of the attribute fields
+    """
+
+    def __init__(self, arrays, layer_name, fid_column, geometry_column, fields):
+        self.arrays = arrays
+        self.layer_name = layer_name
+        self.fid_column = fid_column
+        self.geometry_column = geometry_column
+        self.fields = fields
+
+    def __len__(self):
+        return sum(len(batch[self.fid_column]) for batch in self.arrays)
+
+    def get_column(self, name):
+        return np.ma.concatenate([batch[name] for batch in self.arrays]) if len(self.arrays) > 1 else self.arrays[0][name]
+
+    def to_frame(self):
+        """Get the batches as one dataframe with the columns of get_layer_columns"""
+        size = len(self)
+        columns = {'layer': pd.Categorical.from_codes(np.zeros(size, dtype=np.int32), categories=[self.layer_name]),
+                   'id': np.asarray(np.ma.getdata(self.get_column(self.fid_column)), dtype=np.int64)}
+        geometry_buffers = {'geometry_type': ColumnBuffer('integer'), 'geometry_name': ColumnBuffer('text')}
+        for name in LAYER_COLUMNS[4:]:
+            geometry_buffers[name] = ColumnBuffer('real')
+        buffers = list(geometry_buffers.values())
+        if self.geometry_column in self.arrays[0]:
+            geometries, missing = as_masked_values(self.get_column(self.geometry_column))
+            for wkb, none in zip(geometries, missing):
+                for buffer, v in zip(buffers, get_wkb_coordinates(None if none else bytes(wkb))):
+                    buffer.append(v)
+        else:
+            for _ in range(size):
+                for buffer in buffers:
+                    buffer.append(None)
+        columns.update((name, buffer.to_array()) for name, buffer in geometry_buffers.items())
+
+        for name, field_type in self.fields:
+            values, missing = as_masked_values(self.get_column(name))
+            if field_type in INTEGER_FIELD_TYPES:
+                values = values.astype(np.int64)
+                columns[name] = np.where(missing, np.nan, values) if missing.any() else values
+            elif field_type in REAL_FIELD_TYPES:
+                columns[name] = np.where(missing, np.nan, values.astype(np.float64))
+            elif field_type in (ogr.OFTDate, ogr.OFTDateTime):
+                columns[name] = pd.Categorical(format_datetimes(values, missing, field_type == ogr.OFTDate))
+            else:
+                text = [None if none else v.decode('utf-8') if isinstance(v, bytes) else v for v, none in zip(values, missing)]
+                columns[name] = pd.Categorical(text)
+        return pd.DataFrame(columns)
+
+
+def iter_arrow_batches(layer, batch_size, fields=None, progress=None):
+    """Read a layer through its Arrow stream, whole record batches per call
+    Args:
+        layer (osgeo.ogr.Layer): current layer, with its filters set
+        batch_size (int): features per batch, None for the whole layer in one batch
+        fields (list): attribute fields to read, the others must be ignored with SetIgnoredFields
+        progress (callable): called with the feature counter after each record batch
+    """
+    layer_defn = layer.GetLayerDefn()
+    kept = set(get_field_names(layer, fields))
+    field_types = [(layer_defn.GetFieldDefn(k).GetName(), layer_defn.GetFieldDefn(k).GetType())
+                   for k in range(layer_defn.GetFieldCount()) if layer_defn.GetFieldDefn(k).GetName() in kept]
+    fid_column = layer.GetFIDColumn() or 'OGC_FID'
+    geometry_column = layer.GetGeometryColumn() or 'wkb_geometry'
+    options = ['INCLUDE_FID=YES']
+    if batch_size:
+        options.append(f'MAX_FEATURES_IN_BATCH={batch_size}')
+    stream = layer.GetArrowStreamAsNumPy(options=options)
+    j = 0
+    pending = []
+    for arrays in stream:
+        j += len(arrays[fid_column])
+        if progress is not None:
+            progress(j)
+        if batch_size:
+            yield ArrowBatch([arrays], layer.GetName(), fid_column, geometry_column, field_types)
+        else:
+            pending.append(arrays)
+    if pending:
+        yield ArrowBatch(pending, layer.GetName(), fid_column, geometry_column, field_types)
+
+
+def write_csv(df, path, append=False):
+    """Write a dataframe to CSV, appending without header for later batches
+    Args:
+        df (pd.DataFrame): rows to write
+        path (str): output file
+        append (bool): append to an existing file instead of overwriting it
+    """
+    df.to_csv(path, mode='a' if append else 'w', index=False, header=not append)
+
+
+class LayerTableWriter:
+    """Pipeline stage writing the layer table batches to CSV and/or Parquet
+    Args:
+        layer (osgeo.ogr.Layer): layer being exported, for the Parquet schema
+        files (dict): output files from get_layer_output_files
+        formats (tuple): layer table formats to write, 'csv' and/or 'parquet'
+        fields (list): attribute fields kept in the table, None for all
+    """
+    name = 'layer table'
+
+    def __init__(self, layer, files, formats, fields=None):
+        self.layer = layer
+        self.files = files
+        self.formats = formats
+        self.fields = fields
+        self.append = False
+        self.schema = None
+        self.parquet_writer = None
+
+    def write(self, df):
+        if 'csv' in self.formats:
+            write_csv(df, self.files['csv'], append=self.append)
+        if 'parquet' in self.formats:
+            if self.parquet_writer is None:
+                self.schema = get_arrow_schema(self.layer, self.fields)
+                self.parquet_writer = pq.ParquetWriter(self.files['parquet'], self.schema)
+            self.parquet_writer.write_table(to_arrow_table(df, self.schema))
+        self.append = True
+
+    def close(self):
+        if self.parquet_writer is not None:
+            self.parquet_writer.close()
+
+
+class StatisticsWriter:
+    """Pipeline stage profiling the batches and writing the statistics table at the end
+    Args:
+        names (list): attribute names, one statistics row each
+        path (str): statistics file
+    """
+    name = 'statistics'
+
+    def __init__(self, names, path):
+        self.profile = LayerProfile(names)
+        self.path = path
+
+    def write(self, df):
+        self.profile.update(df)
+
+    def close(self):
+        self.profile.get_statistics().to_csv(self.path, index=False, header=True)
+
+
+class BruceWriter:
+    """Pipeline stage writing the batches with a WGS84 geometry column for Bruce
+    Both end points of a batch are converted from NZTM in one call.
+    Args:
+        path (str): Bruce file
+        style (str): geometry format, see format_geometry
+        precision (int): number of decimals, None for the shortest exact text
+    """
+    name = 'bruce'
+
+    def __init__(self, path, style='bruce', precision=None):
+        self.path = path
+        self.style = style
+        self.precision = precision
+        self.append = False
+
+    def write(self, df):
+        n = len(df)
+        nztm_x = np.concatenate([df['GeoXLO'].to_numpy(dtype=object), df['GeoXHI'].to_numpy(dtype=object)])
+        nztm_y = np.concatenate([df['GeoYLO'].to_numpy(dtype=object), df['GeoYHI'].to_numpy(dtype=object)])
+        latitude, longitude = nztm_to_wgs84(nztm_x, nztm_y)
+        geometry = format_geometry(longitude[:n], latitude[:n], longitude[n:], latitude[n:], self.style, self.precision)
+        write_csv(df.assign(geometry=geometry), self.path, append=self.append)
+        self.append = True
+
+    def close(self):
+        pass
+
+
+class TopologyWriter:
+    """Pipeline stage collecting the ids and end points of a pipe or node layer for
+    the network topology, saved as arrays when the layer is done
+    Args:
+        layer_name (str): layer being exported
+        path (str): (layer)(topology).npz file
+        role (str): 'pipes' or 'nodes'
+        topology (dict): id columns of the network, see CCC_registry
+    """
+    name = 'topology'
+
+    def __init__(self, layer_name, path, role, topology):
+        self.layer_name = layer_name
+        self.path = path
+        self.role = role
+        self.key_columns = {'key': topology['pipe_id'] if role == 'pipes' else topology['node_id']}
+        coordinates = {'x': 'GeoXLO', 'y': 'GeoYLO'}
+        if role == 'pipes':
+            self.key_columns.update(upstream=topology['upstream'], downstream=topology['downstream'])
+            coordinates.update(x1='GeoXHI', y1='GeoYHI')
+        self.coordinate_columns = coordinates
+        self.columns = {name: [] for name in ['fid'] + list(self.key_columns) + list(coordinates)}
+
+    def write(self, df):
+        self.columns['fid'].append(df['id'].to_numpy(dtype=np.int64))
+        for name, column in self.key_columns.items():
+            if column in df:
+                values = df[column].to_numpy(dtype=object)
+            else:
+                #features without an id column are known by their FID
+                values = df['id'].to_numpy(dtype=object) if name == 'key' else [None] * len(df)
+            self.columns[name].append(CCC_topology.as_keys(values))
+        for name, column in self.coordinate_columns.items():
+            self.columns[name].append(CCC_topology.as_coordinates(df[column].to_numpy(dtype=object)))
+
+    def close(self):
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        CCC_topology.save_layer_part(self.path, self.role, self.layer_name,
+                                     {name: np.concatenate(values) for name, values in self.columns.items()})
+
+
+def get_topology_role(layer_name, topology):
+    """Get whether a layer holds the pipes or the nodes of the network topology
+    Args:
+        layer_name (str): layer name
+        topology (dict): topology layers of the network, None when not building it
+    Returns:
+        str: 'pipes', 'nodes' or None
+    """
+    if topology is None:
+        return None
+    for role in ('pipes', 'nodes'):
+        if layer_name in topology[role]:
+            return role
+    return None
+
+
+def build_network_topology(paths, topology, instrumentation, network_name):
+    """Build the topology of a network from the parts saved by its layers
+    Args:
+        paths (dict): output folders from get_output_paths
+        topology (dict): topology layers and tolerance of the network
+        instrumentation (CCC_instrumentation.Instrumentation): records the build time
+        network_name (str): network the timing is recorded under
+    Returns:
+        str: topology file
+    """
+    files = [get_layer_output_files(paths, layer_name)['topology'] for layer_name in topology['pipes'] + topology['nodes']]
+    with instrumentation.stage(network_name, 'topology build') as record:
+        graph = CCC_topology.build_topology(files, topology['tolerance'])
+        path = os.path.join(paths['topology'], CCC_topology.TOPOLOGY_FILE)
+        os.makedirs(paths['topology'], exist_ok=True)
+        graph.save(path)
+        record['rows'] += graph.pipe_count
+    summary = graph.get_summary()
+    print(f"{network_name} topology, " + ', '.join(f"{name} {value}" for name, value in summary.items()))
+    return path
+
+
+def run_pipeline(batches, names, stages, instrumentation, layer_name, to_frame=None):
+    """Feed every batch of features to all stages, then close them
+    Args:
+        batches (iterable): lists of feature dictionaries, or batches to_frame takes
+        names (list): column names of the batch dataframes
+        stages (list): stages with a name, write(df) and close()
+        instrumentation (CCC_instrumentation.Instrumentation): records the time of
+            reading the features, building the dataframes and every stage
+        layer_name (str): layer the timings are recorded under
+        to_frame (callable): builds the dataframe of a batch, None for lists of feature dictionaries
+    """
+    if to_frame is None:
+        to_frame = lambda batch: pd.DataFrame.from_records(batch, columns=names)
+    batches = iter(batches)
+    while True:
+        with instrumentation.stage(layer_name, 'read') as record:
+            batch = next(batches, None)
+            record['rows'] += len(batch) if batch else 0
+        if batch is None:
+            break
+        with instrumentation.stage(layer_name, 'dataframe', len(batch)):
+            df = to_frame(batch)
+        for stage in stages:
+            with instrumentation.stage(layer_name, stage.name, len(df)):
+                stage.write(df)
+    for stage in stages:
+        with instrumentation.stage(layer_name, stage.name):
+            stage.close()
+
+
+def open_datasource(network):
+    """Open the datasource of a network read only
+    Args:
+        network (dict): network description with 'path' and 'type'
+    """
+    if network['type'] == 'gdb':
+        driver = ogr.GetDriverByName('OpenFileGDB')
+        return driver.Open(network['path'], 0)
+    return ogr.Open(network['path'])
+
+
+def get_output_paths(out_path, network):
+    """Create the output folders of a network
+    Args:
+        out_path (str): output root folder
+        network (dict): network description with 'council' and 'network'
+    """
+    council_path = os.path.join(out_path, network['council'], network['network'])
+    paths = {
+        'layers': os.path.join(council_path, 'layers'),
+        'statistics': os.path.join(council_path, 'Statistics'),
+        'bruce': os.path.join(council_path, 'Bruce'),
+    }
+    for path in paths.values():
+        os.makedirs(path, exist_ok=True)
+    #only written with --topology, created when needed
+    paths['topology'] = os.path.join(council_path, 'Topology')
+    return paths
+
+
+def get_layer_output_files(paths, layer_name):
+    """Get the output files of a layer
+    Args:
+        paths (dict): output folders from get_output_paths
+        layer_name (str): name of the layer
+    """
+    return {
+        'csv': os.path.join(paths['layers'], f'{layer_name}(layer).csv'),
+        'parquet': os.path.join(paths['layers'], f'{layer_name}(layer).parquet'),
+        'statistics': os.path.join(paths['statistics'], f"{layer_name}(statistics).csv"),
+        'bruce': os.path.join(paths['bruce'], f'{layer_name}(Bruce).csv'),
+        'topology': os.path.join(paths['topology'], f'{layer_name}(topology).npz'),
+    }
+
+
+MANIFEST_FILE = 'manifest.json'
+
+
+def get_manifest_path(out_path, network):
+    """Get the manifest file of a network, stored next to its outputs
+    Args:
+        out_path (str): output root folder
+        network (dict): network description with 'council' and 'network'
+    """
+    return os.path.join(out_path, network['council'], network['network'], MANIFEST_FILE)
+
+
+def load_manifest(path):
+    """Load the layer fingerprints of the last export, empty if there is none
+    Args:
+        path (str): manifest file
+    """
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def save_manifest(path, manifest):
+    """Save the layer fingerprints, replacing the manifest atomically
+    Args:
+        path (str): manifest file
+        manifest (dict): fingerprint by layer name
+    """
+    temporary = path + '.tmp'
+    with open(temporary, 'w') as f:
+        json.dump(manifest, f, indent=1, sort_keys=True)
+    os.replace(temporary, path)
+
+
+def get_file_stats(paths):
+    """Get the size and modification time of files
+    Args:
+        paths (list): files to stat
+    """
+    stats = {}
+    for path in sorted(paths):
+        stat = os.stat(path)
+        stats[os.path.basename(path)] = [stat.st_size, stat.st_mtime_ns]
+    return stats
+
+
+def get_gdb_table_files(path):
+    """Get the files of each table in a FileGDB folder, by layer name.
+    Table ids come from the GDB_SystemCatalog table a00000001.gdbtable;
+    the files of table id n are named a<n as 8 hex digits>.*
+    Args:
+        path (str): .gdb folder
+    Returns:
+        dict: list of file paths by layer name, empty if the catalog cannot be read
+    """
+    try:
+        catalog = ogr.Open(os.path.join(path, 'a00000001.gdbtable'))
+        if catalog is None:
+            return {}
+        table_ids = {feature.GetField('Name'): feature.GetFID() for feature in catalog.GetLayer(0)}
+        file_names = os.listdir(path)
+    except (RuntimeError, OSError):
+        return {}
+    table_files = {}
+    for name, table_id in table_ids.items():
+        prefix = f'a{table_id:08x}.'
+        table_files[name] = [os.path.join(path, f) for f in file_names if f.lower().startswith(prefix)]
+    return table_files
+
+
+def get_source_files(network):
+    """Get the files every layer of a datasource may be stored in
+    Args:
+        network (dict): network description with 'path'
+    """
+    if os.path.isdir(network['path']):
+        return [os.path.join(network['path'], f) for f in os.listdir(network['path'])]
+    return [network['path']]
+
+
+def get_layer_fingerprint(layer, source_files, options):
+    """Fingerprint a layer to detect changes since the last export
+    Args:
+        layer (osgeo.ogr.Layer): layer to fingerprint
+        source_files (list): files holding the layer data
+        options (dict): export options that change the outputs
+    Returns:
+        dict: JSON serialisable fingerprint
+    """
+    layer_defn = layer.GetLayerDefn()
+    schema = [[layer_defn.GetFieldDefn(k).GetName(),
+               layer_defn.GetFieldDefn(k).GetTypeName(),
+               layer_defn.GetFieldDefn(k).GetWidth(),
+               layer_defn.GetFieldDefn(k).GetPrecision()] for k in range(layer_defn.GetFieldCount())]
+    try:
+        extent = list(layer.GetExtent()) if layer.GetGeomType() != ogr.wkbNone else None
+    except RuntimeError:
+        extent = None
+    return {
+        'feature_count': layer.GetFeatureCount(),
+        'extent': extent,
+        'geometry_type': layer.GetGeomType(),
+        'schema': schema,
+        'files': get_file_stats(source_files),
+        'options': options,
+    }
+
+
+def outputs_exist(files, fingerprint):
+    """Check that the outputs recorded by a fingerprint are still on disk
+    Args:
+        files (dict): output files from get_layer_output_files
+        fingerprint (dict): fingerprint from get_layer_fingerprint
+    """
+    if fingerprint['feature_count'] == 0:
+        return True
+    needed = list(fingerprint['options']['formats']) + ['statistics']
+    if fingerprint['options']['asset']:
+        needed.append('bruce')
+    if fingerprint['options'].get('topology'):
+        needed.append('topology')
+    return all(os.path.exists(files[name]) for name in needed)
+
+
+def export_layer(layer, paths, is_asset, i, data_size, batch_size=None, verbose=True, formats=('csv',),
+                 geometry_style='bruce', precision=None, instrumentation=None, filters=None, topology=None,
+                 columnar=False, reader='features'):
+    """Write the layer, statistics and (for assets) Bruce files of a layer
+    Args:
+        layer (osgeo.ogr.Layer): layer to export
+        paths (dict): output folders from get_output_paths
+        is_asset (bool): whether the layer gets a WGS84 geometry column
+        i (int): layer counter
+        data_size (int): number of layers
+        batch_size (int): stream features to disk in batches of this size,
+            None to build the whole layer in memory
+        verbose (bool): print per-feature progress
+        formats (tuple): layer table formats to write, 'csv' and/or 'parquet'
+        geometry_style (str): format of the Bruce geometry column, see format_geometry
+        precision (int): decimals of the Bruce coordinates, None for the shortest exact text
+        instrumentation (CCC_instrumentation.Instrumentation): progress and stage timings,
+            None for a new one
+        filters (dict): attribute, spatial and field filters, see apply_layer_filters
+        topology (dict): topology layers of the network, None to not collect the layer's end points
+        columnar (bool): read the features into typed column buffers instead of dictionaries
+        reader (str): 'arrow' to read whole record batches through the Arrow stream, 'features'
+            for the feature iterator, 'auto' for the Arrow stream when the layer supports it
+    Returns:
+        dict: layer name, number of features exported and the stage timings of the layer
+    """
+    if instrumentation is None:
+        instrumentation = CCC_instrumentation.Instrumentation()
+    filters = filters or {}
+
+    #get layer name and size, of the features left by the filters
+    layer_name = layer.GetName()
+    apply_layer_filters(layer, filters)
+    layer_size = layer.GetFeatureCount()
+    summary = {'layer': layer_name, 'features': layer_size, 'stages': []}
+    files = get_layer_output_files(paths, layer_name)
+    topology_role = get_topology_role(layer_name, topology)
+
+    if layer_size == 0:
+        #an emptied layer must not leave its old end points in the topology
+        if topology_role is not None and os.path.exists(files['topology']):
+            os.remove(files['topology'])
+        if verbose:
+            instrumentation.progress(layer_name, i, data_size, 0, layer_size)
+        return summary
+
+    names = get_layer_columns(layer, filters.get('fields'))
+
+    progress = (lambda j: instrumentation.progress(layer_name, i, data_size, j, layer_size)) if verbose else None
+    use_arrow = reader != 'features' and can_read_arrow(layer, filters.get('fields'))
+    if reader == 'arrow' and not use_arrow:
+        raise ValueError(f"layer {layer_name} cannot be read through the Arrow stream, it needs GDAL 3.6 or later "
+                         f"and only integer, real, string, date and datetime fields")
+    if use_arrow:
+        batches = iter_arrow_batches(layer, batch_size, filters.get('fields'), progress)
+        to_frame = ArrowBatch.to_frame
+    elif columnar:
+        batches = iter_column_batches(layer, batch_size, filters.get('fields'), progress)
+        to_frame = ColumnBuffers.to_frame
+    else:
+        batches = iter_batches(iter_feature_dictionaries(layer, progress), batch_size)
+        to_frame = None
+
+    #save features data from gdb file, profile it and, for assets, convert
+    #NZTM to WGS84 and add the geometry column, all from the same batches
+    stages = [LayerTableWriter(layer, files, formats, filters.get('fields')), StatisticsWriter(names, files['statistics'])]
+    if is_asset:
+        if verbose:
+            print(f"{layer_name} is converting.")
+        stages.append(BruceWriter(files['bruce'], geometry_style, precision))
+    if topology_role is not None:
+        stages.append(TopologyWriter(layer_name, files['topology'], topology_role, topology))
+
+    run_pipeline(batches, names, stages, instrumentation, layer_name, to_frame)
+
+    summary['stages'] = instrumentation.get_records(layer_name)
+    return summary
+
+
+def export_layer_task(network, layer_name, out_path, is_asset, i, data_size, batch_size=None, formats=('csv',),
+                      geometry_style='bruce', precision=None, filters=None, topology=None, columnar=False,
+                      reader='features'):
+    """Export one layer in a worker process, opening its own datasource
+    Args:
+        network (dict): network description
+        layer_name (str): name of the layer to export
+        out_path (str): output root folder
+        is_asset (bool): whether the layer gets a WGS84 geometry column
+        i (int): layer counter
+        data_size (int): number of layers
+        batch_size (int): streaming batch size, None to build the layer in memory
+        formats (tuple): layer table formats to write
+        geometry_style (str): format of the Bruce geometry column
+        precision (int): decimals of the Bruce coordinates
+        filters (dict): attribute, spatial and field filters
+        topology (dict): topology layers of the network, None to not collect end points
+        columnar (bool): read the features into typed column buffers
+        reader (str): 'arrow', 'features' or 'auto', see export_layer
+    Returns:
+        list: one summary dict with the network, layer, features, stage timings and seconds
+    """
+    start = time.perf_counter()
+    data = open_datasource(network)
+    layer = data.GetLayerByName(layer_name)
+    summary = export_layer(layer, get_output_paths(out_path, network), is_asset, i, data_size, batch_size,
+                           verbose=False, formats=formats, geometry_style=geometry_style, precision=precision,
+                           filters=filters, topology=topology, columnar=columnar,
+                           reader=reader)
+    summary['network'] = network['network']
+    summary['seconds'] = time.perf_counter() - start
+    return [summary]
+
+
+def export_network_task(network, out_path, assets, batch_size=None, formats=('csv',), layer_names=None,
+                        geometry_style='bruce', precision=None, filters=None, topology=None, columnar=False,
+                        reader='features'):
+    """Export the layers of a network in a worker process
+    Args:
+        network (dict): network description
+        out_path (str): output root folder
+        assets (set): layer names that get a WGS84 geometry column
+        batch_size (int): streaming batch size, None to build the layers in memory
+        formats (tuple): layer table formats to write
+        layer_names (list): only export these layers, None for all
+        geometry_style (str): format of the Bruce geometry column
+        precision (int): decimals of the Bruce coordinates
+        filters (dict): attribute, spatial and field filters
+        topology (dict): topology layers of the network, None to not collect end points
+        columnar (bool): read the features into typed column buffers
+        reader (str): 'arrow', 'features' or 'auto', see export_layer
+    Returns:
+        list: one summary dict per layer
+    """
+    data = open_datasource(network)
+    data_size = data.GetLayerCount()
+    paths = get_output_paths(out_path, network)
+    summaries = []
+    for i, layer in enumerate(data, 1):
+        if layer_names is not None and layer.GetName() not in layer_names:
+            continue
+        start = time.perf_counter()
+        summary = export_layer(layer, paths, layer.GetName() in assets, i, data_size, batch_size,
+                               verbose=False, formats=formats, geometry_style=geometry_style, precision=precision,
+                               filters=filters, topology=topology, columnar=columnar,
+                               reader=reader)
+        summary['network'] = network['network']
+        summary['seconds'] = time.perf_counter() - start
+        summaries.append(summary)
+    return summaries
+
+
+def run_tasks(tasks, workers, instrumentation=None):
+    """Run export tasks in a process pool and report progress as they finish
+    Args:
+        tasks (list): (description, function, args) tuples
+        workers (int): number of worker processes
+        instrumentation (CCC_instrumentation.Instrumentation): collects the stage timings of the tasks
+    Returns:
+        tuple: summaries of all exported layers and descriptions of the failed tasks
+    """
+    summaries = []
+    failures = []
+    with concurrent.futures.ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = {pool.submit(function, *args): description for description, function, args in tasks}
+        for k, future in enumerate(concurrent.futures.as_completed(futures), 1):
+            now = datetime.datetime.now().isoformat()
+            try:
+                results = future.result()
+            except Exception as e:
+                failures.append(futures[future])
+                print(f"Task {k:3d} / {len(futures):3d}, {futures[future]} failed: {e!r}, Timestamp {now}")
+                continue
+            summaries.extend(results)
+            for result in results:
+                if instrumentation is not None:
+                    instrumentation.merge(result['stages'])
+                print(f"Task {k:3d} / {len(futures):3d}, {result['network']} {result['layer']}, "
+                      f"Feature {result['features']:8d}, Seconds {result['seconds']:8.2f}, Timestamp {now}")
+    return summaries, failures
+
+
+def main(argv=None):
+    arg_parser = argparse.ArgumentParser(description=__doc__)
+    arg_parser.add_argument('--in-path', default="/Users/wujing/Desktop/Inputs")
+    arg_parser.add_argument('--out-path', default="/Users/wujing/Desktop/Outputs")
+    arg_parser.add_argument('--stream', action='store_true',
+                            help='write layers to CSV in batches instead of building them in memory')
+    arg_parser.add_argument('--batch-size', type=int, default=10000,
+                            help='number of features per batch in streaming mode')
+    arg_parser.add_argument('--format', choices=['csv', 'parquet', 'both'], default='csv',
+                            help='file format of the extracted layer tables')
+    arg_parser.add_argument('--workers', type=int, default=1,
+                            help='number of worker processes, 1 to export in this process')
+    arg_parser.add_argument('--per', choices=['layer', 'network'], default='layer',
+                            help='unit of work handed to a worker process')
+    arg_parser.add_argument('--force', action='store_true',
+                            help='export every layer, even those unchanged since the last export')
+    arg_parser.add_argument('--geometry-style', choices=GEOMETRY_STYLES, default='bruce',
+                            help='format of the geometry column of the Bruce files')
+    arg_parser.add_argument('--precision', type=int, default=None,
+                            help='decimals of the Bruce coordinates, default the shortest exact text')
+    arg_parser.add_argument('--layers', nargs='+', default=None,
+                            help="only export these layers, 'assets' for the layers that get a WGS84 geometry")
+    arg_parser.add_argument('--where', default=None,
+                            help="OGR SQL attribute filter applied to every exported layer, e.g. \"SwPipeServiceStatus = 'Active'\"")
+    arg_parser.add_argument('--bbox', nargs=4, type=float, default=None, metavar=('XMIN', 'YMIN', 'XMAX', 'YMAX'),
+                            help='only export features intersecting this rectangle, in NZTM')
+    arg_parser.add_argument('--fields', nargs='+', default=None,
+                            help='only export these attribute fields, the others are not read')
+    arg_parser.add_argument('--columnar', action='store_true',
+                            help='read features into typed column buffers, with text dictionary encoded, '
+                                 'instead of one dictionary per feature')
+    arg_parser.add_argument('--reader', choices=READERS, default='auto',
+                            help='read layers in record batches through the Arrow stream (GDAL 3.6 or later), '
+                                 'feature by feature, or auto for the Arrow stream where it is available')
+    arg_parser.add_argument('--topology', action='store_true',
+                            help='build the pipe and chamber topology of the networks that define one in the registry')
+    CCC_registry.add_arguments(arg_parser)
+    CCC_instrumentation.add_arguments(arg_parser)
+    args = arg_parser.parse_args(argv)
+
+    in_path = args.in_path
+    out_path = args.out_path
+    instrumentation = CCC_instrumentation.from_arguments(arg_parser, args)
+    batch_size = args.batch_size if args.stream else None
+    formats = ('csv', 'parquet') if args.format == 'both' else (args.format,)
+    if 'parquet' in formats and pa is None:
+        arg_parser.error('--format parquet needs pyarrow to be installed')
+
+    #networks from the registry, their paths are relative to the input folder
+    networks = [dict(network, path=os.path.join(in_path, network['path']))
+                for network in CCC_registry.from_arguments(arg_parser, args)]
+
+    #layers to export and filters pushed down to OGR, the command line overrides the registry
+    command_line = {'layers': args.layers, 'where': args.where, 'bbox': args.bbox, 'fields': args.fields}
+    for network in networks:
+        filters = dict(network['filters'])
+        filters.update((name, value) for name, value in command_line.items() if value is not None)
+        layers = filters.pop('layers', None)
+        network['selected'] = None
+        if layers is not None:
+            network['selected'] = set(layers) - set(['assets'])
+            if 'assets' in layers:
+                network['selected'] |= set(network['assets'])
+        network['filters'] = filters
+        if not args.topology:
+            network['topology'] = None
+
+    #find the layers that changed since the last export
+    plans = []
+    for network in networks:
+        filters = network['filters']
+        manifest_file = get_manifest_path(out_path, network)
+        manifest = load_manifest(manifest_file)
+        paths = get_output_paths(out_path, network)
+        table_files = get_gdb_table_files(network['path']) if network['type'] == 'gdb' else {}
+        source_files = None
+        data = open_datasource(network)
         data_size = data.GetLayerCount()
+        layers = []
+        for i, layer in enumerate(data, 1):
+            layer_name = layer.GetName()
+            if network['selected'] is not None and layer_name not in network['selected']:
+                continue
+            is_asset = layer_name in network['assets']
+            if layer_name not in table_files and source_files is None:
+                source_files = get_source_files(network)
+            options = {'formats': list(formats), 'asset': is_asset}
+            if is_asset:
+                options['geometry'] = [args.geometry_style, args.precision]
+            if filters:
+                options['filters'] = filters
+            if get_topology_role(layer_name, network['topology']) is not None:
+                options['topology'] = True
+            fingerprint = get_layer_fingerprint(layer, table_files.get(layer_name, source_files), options)
+            if (not args.force and manifest.get(layer_name) == fingerprint
+                    and outputs_exist(get_layer_output_files(paths, layer_name), fingerprint)):
+                print(f"Layer {i:2d} / {data_size:2d}, {layer_name} unchanged, skipped")
+                continue
+            layers.append((i, layer_name, is_asset, fingerprint))
+        data = None
+        plans.append((network, data_size, layers, manifest_file, manifest))
+
+    if args.workers > 1:
+        tasks = []
+        for network, data_size, layers, _, _ in plans:
+            if not layers:
+                continue
+            if args.per == 'network':
+                layer_names = [layer_name for _, layer_name, _, _ in layers]
+                tasks.append((network['network'], export_network_task,
+                              (network, out_path, set(network['assets']), batch_size, formats, layer_names,
+                               args.geometry_style, args.precision, network['filters'], network['topology'],
+                               args.columnar, args.reader)))
+                continue
+            for i, layer_name, is_asset, _ in layers:
+                tasks.append((f"{network['network']} {layer_name}", export_layer_task,
+                              (network, layer_name, out_path, is_asset, i, data_size, batch_size, formats,
+                               args.geometry_style, args.precision, network['filters'], network['topology'],
+                               args.columnar, args.reader)))
+        summaries, failures = run_tasks(tasks, args.workers, instrumentation)
+
+        exported = set((summary['network'], summary['layer']) for summary in summaries)
+        for network, _, layers, manifest_file, manifest in plans:
+            for _, layer_name, _, fingerprint in layers:
+                if (network['network'], layer_name) in exported:
+                    manifest[layer_name] = fingerprint
+            save_manifest(manifest_file, manifest)
+            if network['topology'] is not None:
+                build_network_topology(get_output_paths(out_path, network), network['topology'], instrumentation,
+                                       network['network'])
+        instrumentation.report(args.timings)
+        if failures:
+            raise RuntimeError(f"{len(failures)} export task(s) failed: " + ", ".join(failures))
+        return
+
+    for network, data_size, layers, manifest_file, manifest in plans:
+
+        data = open_datasource(network)
 
-       
-        
         #Create file path 
-        council_path = os.path.join(out_path, network['council'], network['network'])
-        layer_path = os.path.join(council_path,'layers')
-        os.makedirs(layer_path, exist_ok=True)
-        statistics_path = os.path.join(council_path, 'Statistics')
-        os.makedirs(statistics_path,exist_ok=True)
-        FH_path = os.path.join(council_path,'Bruce')
-        os.makedirs(FH_path, exist_ok=True)
-        
-        
+        paths = get_output_paths(out_path, network)
+
         #layer
-        i = 0
-        for layer in data:
-            i = i + 1
-            
-            #get layer name and size
-            layer_name = layer.GetName()
-            layer_size = layer.GetFeatureCount()
-            
-            
-            if layer_size == 0:
+        for i, layer_name, is_asset, fingerprint in layers:
+            export_layer(data.GetLayerByName(layer_name), paths, is_asset, i, data_size, batch_size, formats=formats,
+                         geometry_style=args.geometry_style, precision=args.precision, instrumentation=instrumentation,
+                         filters=network['filters'], topology=network['topology'], columnar=args.columnar,
+                         reader=args.reader)
+            manifest[layer_name] = fingerprint
+            save_manifest(manifest_file, manifest)
 
-                j = 0
-                print_progress(data_size, layer_size, i, j)
+        if network['topology'] is not None:
+            build_network_topology(paths, network['topology'], instrumentation, network['network'])
 
-            else:
+    instrumentation.report(args.timings, args.profile_path)
 
-                features = []
-                
-                j = 1
-                print_progress(data_size, layer_size, i, j)
-        
-        
-                feature = next(layer)
-                attributes = feature.items()
-                keys = [k for k in attributes.keys()]
-                
-                names = [
-                    'layer',
-                    'id',
-                    'geometry_type',
-                    'geometry_name',
-                    'GeoXLO',
-                    'GeoYLO',
-                    'GeoXHI',
-                    'GeoYHI'
-                ] + [
-                    k for k in keys
-                ]
-                features.append(get_feature_dictionary(layer, feature))
-                
-                
-                for feature in layer:
-                    j = j + 1
-                    print_progress(data_size, layer_size, i, j)
-                    features.append(get_feature_dictionary(layer, feature))
-                    
-                #save features data from gdb file
-                df = pd.DataFrame.from_records(features, columns = names)
-                df.to_csv(os.path.join(layer_path,f'{layer_name}(layer).csv'), index=False, header=True)
-                
-            
-                #statistics
-                columns = [
-                    'Count',
-                    'Not Empty',
-                    'Empty',
-                    'Unique',
-                    'Data Type',
-                    'Negative',
-                    'Zeros',
-                    'Positive',
-                    'Min',
-                    'Max',
-                    'Min Length',
-                    'Max Length',
-                    'Commas',
-                    'Date String',
-                ]
-                statistics = pd.DataFrame(index=names, columns=columns)
-                statistics.index.name = 'Attribute'
-
-                statistics['Count'] = df.shape[0]
-
-                def check_empty(x):
-                    return x.isnull() | x.isin(["", " ", "NA", "None"])
-
-                def check_zero(x):
-                    return x == 0
-
-                statistics['Empty'] = df.apply(check_empty).sum()
-                statistics['Not Empty'] = statistics['Count'] - statistics['Empty']
-
-                def count_unique(x):
-                    return x.value_counts().shape[0]
-
-                statistics['Unique'] = df.apply(count_unique)
-
-                def isdate(s):
-                    """Check if string can be parsed as a valid datetime object by dateutils.
-                    Args:
-                        s (str): string to be checked
-                    Returns:
-                        bool: if string can be parsed 
-                    """
-                    try: 
-                        parser.parse(s)
-                        return True
-                    except ValueError:
-                        return False
-
-                def check_type(x):
-                    i = x.first_valid_index()
-                    if i is None:
-                        return 'NaN'
-                    v = x[i]
-                    if np.issubdtype(type(v), int):
-                        return 'Integer'
-                    if np.issubdtype(type(v), float):
-                        return 'Decimal'
-                    if isinstance(v, str) and isdate(v):
-                        return 'Date'
-                    if isinstance(v, str):
-                        return 'Alpha / Numeric'
-                    return ''
-
-                statistics['Data Type'] = df.apply(check_type)
-
-                x = statistics['Data Type'].isin(['Integer', 'Decimal'])
-                columns = x[x].index
-                statistics['Min'] = df[columns].min()
-                statistics['Max'] = df[columns].max()
-                statistics['Negative'] = df[columns].apply(lambda x: x < 0).sum()
-                statistics['Zeros'] = df[columns].apply(lambda x: x == 0).sum()
-                statistics['Positive'] = df[columns].apply(lambda x: x > 0).sum()
-
-                x = statistics['Data Type'] == 'Alpha / Numeric'
-                columns = x[x].index
-                for column in columns:
-                    lengths = df[column].str.len()
-                    statistics.loc[column, 'Min Length'] = lengths.min()
-                    statistics.loc[column, 'Max Length'] = lengths.max()
-                    statistics.loc[column, 'Commas'] = df[column].str.contains(',').sum()
-
-                x = statistics['Data Type'] == 'Date'
-                columns = x[x].index
-                for column in columns:
-                    statistics.loc[column, 'Date String'] = df.loc[df[column].first_valid_index(), column]
-
-                # Save statistics
-
-                statistics = statistics.reset_index()
-                statistics.to_csv(os.path.join(statistics_path, f"{layer_name}(statistics).csv"), index=False, header=True)
-                
-    
-                #create CSV file with geometry column
-                if layer_name in assets:
-                    
-                    print(f"{layer_name} is converting.")
-                    
-                    def calculate_lat_lone(nztm_e, nztm_n):
-                        """Convert NZTM to WGS84
-                        Args:
-                            nztm_e(str):longitude of NZTM
-                            nztm_n(str):latitude of NZTM
-                        """
-                        #Common variables for NZTM2000
-                        a = 6378137
-                        f = 1 / 298.257222101
-                        lambdazero = 173
-                        Nzero = 10000000
-                        Ezero = 1600000
-                        kzero = 0.9996   
-                          
-                        #input Northing(Y); Easting(X) variables
-                        try:
-                            N  = float(nztm_n)
-                            E  = float(nztm_e)
-                       
-                          
-                            #Calculation: From NZTM to lat/Long
-                            b = a * (1 - f)
-                            esq = 2 * f - f ** 2
-                                
-                            Nprime = N - Nzero
-                            mprime = Nprime / kzero
-                            smn = (a - b) / (a + b)
-                            G = a * (1 - smn) * (1 - (smn ** 2)) * (1 + 9 * (smn ** 2) / 4 + 225 * (smn ** 4) / 64) * math.pi/ 180.0
-                            sigma = mprime * math.pi / (180 * G)
-                            phiprime = sigma + (3 * smn / 2 - 27 * (smn ** 3) / 32) * math.sin(2 * sigma) + (21 * (smn ** 2) / 16 - 55 * (smn ** 4) / 32) * math.sin(4 * sigma) + (151 * (smn ** 3) / 96) * math.sin(6 * sigma) + (1097 * (smn ** 4) / 512) *math.sin(8 * sigma)
-                            rhoprime = a * (1 - esq) / ((1 - esq * ((math.sin(phiprime)) ** 2)) ** 1.5)
-                            upsilonprime = a / math.sqrt(1 - esq * ((math.sin(phiprime)) ** 2))
-                              
-                            psiprime = upsilonprime / rhoprime
-                            tprime = math.tan(phiprime)
-                            Eprime = E - Ezero;
-                            chi = Eprime / (kzero * upsilonprime)
-                            term_1 = tprime * Eprime * chi / (kzero * rhoprime * 2)
-                            term_2 = term_1 * (chi ** 2) / 12 * (-4 * (psiprime ** 2) + 9 * psiprime * (1 - (tprime ** 2)) + 12 * (tprime ** 2))
-                            term_3 = tprime * Eprime * (chi ** 5) / (kzero * rhoprime * 720) * (8 * (psiprime ** 4) * (11 - 24 * (tprime ** 2)) - 12 * (psiprime ** 3) * (21 - 71 * (tprime ** 2)) + 15 * (psiprime ** 2) * (15 - 98 * (tprime ** 2) + 15 * (tprime ** 4)) + 180 * psiprime * (5 * (tprime ** 2) - 3 * (tprime ** 4)) + 360 * (tprime ** 4))
-                            term_4 = tprime * Eprime * (chi ** 7) / (kzero * rhoprime * 40320) * (1385 + 3633 * (tprime ** 2) + 4095 * (tprime ** 4) + 1575 * (tprime ** 6))
-                            term1 = chi * (1 / math.cos(phiprime))
-                            term2 = (chi ** 3) * (1 / math.cos(phiprime)) / 6 * (psiprime + 2 * (tprime ** 2))
-                            term3 = (chi ** 5) * (1 / math.cos(phiprime)) / 120 * (-4 * (psiprime ** 3) * (1 - 6 * (tprime ** 2)) + (psiprime ** 2) * (9 - 68 * (tprime ** 2)) + 72 * psiprime * (tprime ** 2) + 24 * (tprime ** 4))
-                            term4 = (chi ** 7) * (1 / math.cos(phiprime)) / 5040 * (61 + 662 * (tprime ** 2) + 1320 * (tprime ** 4) + 720 * (tprime ** 6))
-                              
-                            latitude = (phiprime - term_1 + term_2 - term_3 + term_4) * 180 / math.pi
-                            longitude = lambdazero + 180 / math.pi * (term1 - term2 + term3 - term4)
-                        
-                        except:
-                            
-                            latitude = None
-                            longitude = None
-                        
-                        return latitude, longitude
-                    
-                    
-                    def nztm_to_lat_long(dataframe, geo_x, geo_y):
-                        '''Create converted longitude and latitude lists
-                        Args:
-                            dataframe(pd.DataFrame):DataFrame of layer
-                            geo_x: column name of longitude
-                            geo_y: column name of latitude
-                        '''
-                        
-                        infile = dataframe.loc[:,[geo_x, geo_y]]
-                        long_list = []
-                        lat_list = [] 
-                    
-                        for index in set(infile.index):
-                            line = str(infile.loc[index].values[:]).replace("[","").replace("]","") 
-                            try:
-                                nztm_e, nztm_n = line.replace("'","").split()
-                            except:
-                                nztm_e, nztm_n = line.split()
-                            latitude, longitude = calculate_lat_lone(nztm_e, nztm_n)
-                            
-                            lat_list.append(latitude)
-                            long_list.append(longitude)
-                            
-                            
-                        return lat_list, long_list       
-                    
-                         
-                    def create_geometry(long_min, lat_min, long_max, lat_max, df):
-                        '''
-                        Add column geometry in the format [Lat,Long,Altitude_ Lat,Long,Altitude]
-                        Example “172.74424244,-43.54612293,0 172.74397566,-43.54619336,0”
-                        Args:
-                            long_min(list): low longitude
-                            lat_min(list): low latitude
-                            long_max(list): high longitude
-                            lat_max(list): high latitude
-                            df(pd.DataFrame): dataframe to add geometry column
-                        '''
-                        
-                        geo_dict = {"long_min": long_min,
-                                    "lat_min": lat_min,
-                                    "long_max": long_max,
-                                    "lat_max": lat_max}
-                        geo_dataframe = pd.DataFrame(geo_dict)
-                        
-                        geo_dataframe["long_min"] = geo_dataframe["long_min"].map(lambda x:str(x))
-                        geo_dataframe["lat_min"] = geo_dataframe["lat_min"].map(lambda x:str(x))
-                        geo_dataframe["long_max"] = geo_dataframe["long_max"].map(lambda x:str(x))
-                        geo_dataframe["lat_max"] = geo_dataframe["lat_max"].map(lambda x:str(x))
-                        
-                        geo_dataframe['geometry'] = geo_dataframe['long_min'] + "," +geo_dataframe['lat_min'] + ",0 " + geo_dataframe['long_max']+ "," +geo_dataframe['lat_max']+ ",0"
-                        
-                        df['geometry'] = geo_dataframe['geometry']
-                        
-                        return df
-                    
-                    
-                    #convert NZTM to WGS84 and add geomatry column
-                    lat_min, long_min = nztm_to_lat_long(df,'GeoXLO','GeoYLO')
-                    lat_max, long_max = nztm_to_lat_long(df,'GeoXHI','GeoYHI')
-                    FHfile = create_geometry(long_min, lat_min, long_max, lat_max, df)
-                    
-                    #save FH file with geomatry column
-                    FHfile.to_csv(os.path.join(FH_path,f'{layer_name}(Bruce).csv'),index=False, header=True)
-                        
-                          
-        
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,259 @@
+#!/usr/bin/env python
+
+"""
+Progress messages and per-stage timings shared by the CCC scripts.
+Every (layer, stage) pair gets its wall time, rows and rows per second, and
+the report carries the peak RSS of the process. Chosen stages can run under
+cProfile or tracemalloc.
+"""
+
+import cProfile
+import contextlib
+import datetime
+import json
+import os
+import sys
+import time
+import tracemalloc
+
+try:
+    import resource
+except ImportError:
+    resource = None
+
+
+def get_peak_rss():
+    """Peak resident set size of this process in MB, None where it is not available"""
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    #bytes on macOS, kilobytes on Linux
+    return peak / 2 ** 20 if sys.platform == 'darwin' else peak / 2 ** 10
+
+
+class Instrumentation:
+    """Timings of the stages of a run, summed per (layer, stage).
+    Time a stage with the stage() context manager, or with start() and stop()
+    around code that is not worth indenting; add() and merge() take timings
+    measured in another process.
+    Args:
+        progress_interval (float): seconds between progress messages of a layer, None for none
+        profile_stages (iterable): stages to run under cProfile, not nested in one another
+        trace_memory_stages (iterable): stages to trace with tracemalloc for their peak allocation
+    """
+
+    def __init__(self, progress_interval=5.0, profile_stages=(), trace_memory_stages=()):
+        self.progress_interval = progress_interval
+        self.profile_stages = set(profile_stages)
+        self.trace_memory_stages = set(trace_memory_stages)
+        self.records = {}
+        self.profiles = {}
+        self.progress_times = {}
+
+    def get_record(self, layer, stage):
+        key = (layer, stage)
+        if key not in self.records:
+            self.records[key] = {'layer': layer, 'stage': stage, 'calls': 0, 'seconds': 0.0, 'rows': 0,
+                                 'traced_peak_mb': None}
+        return self.records[key]
+
+    def start(self, layer, stage):
+        """Start timing a stage
+        Args:
+            layer (str): layer, asset class or other unit of work
+            stage (str): stage name
+        Returns:
+            dict: timer to pass to stop
+        """
+        timer = {'record': self.get_record(layer, stage), 'profiler': None, 'tracing': False}
+        if stage in self.profile_stages:
+            timer['profiler'] = self.profiles.setdefault(stage, cProfile.Profile())
+            timer['profiler'].enable()
+        if stage in self.trace_memory_stages:
+            if not tracemalloc.is_tracing():
+                tracemalloc.start()
+            tracemalloc.reset_peak()
+            timer['tracing'] = True
+        timer['start'] = time.perf_counter()
+        return timer
+
+    def stop(self, timer, rows=0):
+        """Stop timing a stage and add it to its record
+        Args:
+            timer (dict): timer from start
+            rows (int): rows the stage handled
+        """
+        seconds = time.perf_counter() - timer['start']
+        if timer['profiler'] is not None:
+            timer['profiler'].disable()
+        record = timer['record']
+        if timer['tracing']:
+            peak = tracemalloc.get_traced_memory()[1] / 2 ** 20
+            record['traced_peak_mb'] = max(record['traced_peak_mb'] or 0, peak)
+        record['calls'] += 1
+        record['seconds'] += seconds
+        record['rows'] += rows
+
+    @contextlib.contextmanager
+    def stage(self, layer, stage, rows=0):
+        """Time the body of a with statement as a stage
+        Args:
+            layer (str): layer, asset class or other unit of work
+            stage (str): stage name
+            rows (int): rows the stage handles, more can be added to the yielded record
+        """
+        timer = self.start(layer, stage)
+        try:
+            yield timer['record']
+        finally:
+            self.stop(timer, rows)
+
+    def add(self, layer, stage, seconds, rows=0, calls=1, traced_peak_mb=None):
+        """Add a stage timing measured elsewhere"""
+        record = self.get_record(layer, stage)
+        record['calls'] += calls
+        record['seconds'] += seconds
+        record['rows'] += rows
+        if traced_peak_mb is not None:
+            record['traced_peak_mb'] = max(record['traced_peak_mb'] or 0, traced_peak_mb)
+
+    def merge(self, records):
+        """Add the records of another run, e.g. from get_records in a worker process
+        Args:
+            records (list): stage records
+        """
+        for record in records:
+            self.add(record['layer'], record['stage'], record['seconds'], record['rows'], record['calls'],
+                     record['traced_peak_mb'])
+
+    def get_records(self, layer=None):
+        """Get the stage records, with rows per second
+        Args:
+            layer (str): only the records of this layer, None for all
+        Returns:
+            list: stage records in the order they were first timed
+        """
+        records = []
+        for record in self.records.values():
+            if layer is not None and record['layer'] != layer:
+                continue
+            record = dict(record)
+            record['rows_per_second'] = record['rows'] / record['seconds'] if record['rows'] and record['seconds'] else None
+            records.append(record)
+        return records
+
+    def progress(self, layer, i, data_size, j, layer_size):
+        """Print a progress message for feature j of a layer, at most every progress_interval seconds
+        Args:
+            layer (str): layer name
+            i (int): layer counter
+            data_size (int): number of layers
+            j (int): feature counter
+            layer_size (int): number of features
+        """
+        if self.progress_interval is None:
+            return
+        now = time.perf_counter()
+        if j <= 1 or layer not in self.progress_times:
+            self.progress_times[layer] = [now, now]
+        started, last = self.progress_times[layer]
+        if j > 1 and j != layer_size and now - last < self.progress_interval:
+            return
+        self.progress_times[layer][1] = now
+        rate = j / (now - started) if now > started else 0
+        timestamp = datetime.datetime.now().isoformat()
+        print(f"Layer {i:2d} / {data_size:2d}, {layer}, Feature {j:8d} / {layer_size:8d}, "
+              f"{rate:9.0f} features / s, Timestamp {timestamp}")
+
+    def write_json_lines(self, path):
+        """Write one JSON line per stage record, each with the peak RSS of the process
+        Args:
+            path (str): output file
+        """
+        peak_rss = get_peak_rss()
+        with open(path, 'w') as f:
+            for record in self.get_records():
+                record['peak_rss_mb'] = peak_rss
+                f.write(json.dumps(record) + '\n')
+
+    def format_summary(self):
+        """Format the stage records as a table, followed by the totals per stage"""
+        lines = [f"{'Layer':40s} {'Stage':16s} {'Calls':>7s} {'Seconds':>10s} {'Rows':>10s} {'Rows / s':>12s} {'Traced MB':>10s}"]
+        totals = {}
+        for record in self.get_records():
+            total = totals.setdefault(record['stage'], {'seconds': 0.0, 'rows': 0})
+            total['seconds'] += record['seconds']
+            total['rows'] += record['rows']
+            lines.append(format_row(record['layer'], record['stage'], record['calls'], record['seconds'],
+                                    record['rows'], record['rows_per_second'], record['traced_peak_mb']))
+        for stage, total in totals.items():
+            rate = total['rows'] / total['seconds'] if total['rows'] and total['seconds'] else None
+            lines.append(format_row('Total', stage, None, total['seconds'], total['rows'], rate, None))
+        peak_rss = get_peak_rss()
+        if peak_rss is not None:
+            lines.append(f"Peak RSS {peak_rss:.1f} MB")
+        return '\n'.join(lines)
+
+    def dump_profiles(self, path):
+        """Save the cProfile statistics of the profiled stages as (stage).prof files
+        Args:
+            path (str): output folder
+        Returns:
+            list: files written
+        """
+        os.makedirs(path, exist_ok=True)
+        files = []
+        for stage, profiler in self.profiles.items():
+            file_name = os.path.join(path, f"{stage.replace(' ', '_')}.prof")
+            profiler.dump_stats(file_name)
+            files.append(file_name)
+        return files
+
+    def report(self, json_lines_path=None, profile_path=None):
+        """Print the summary table and save the JSON lines and profiles that were asked for
+        Args:
+            json_lines_path (str): JSON lines file, None to skip
+            profile_path (str): folder of the cProfile files, None to skip
+        """
+        print(self.format_summary())
+        if json_lines_path:
+            self.write_json_lines(json_lines_path)
+            print(f"Stage timings saved to {json_lines_path}")
+        if profile_path and self.profiles:
+            for file_name in self.dump_profiles(profile_path):
+                print(f"Profile saved to {file_name}")
+
+
+def format_row(layer, stage, calls, seconds, rows, rate, traced):
+    calls = '' if calls is None else f"{calls:7d}"
+    rate = '' if rate is None else f"{rate:12.0f}"
+    traced = '' if traced is None else f"{traced:10.1f}"
+    return f"{str(layer)[:40]:40s} {stage[:16]:16s} {calls:>7s} {seconds:10.2f} {rows:10d} {rate:>12s} {traced:>10s}"
+
+
+def add_arguments(arg_parser):
+    """Add the instrumentation options to a script's argument parser
+    Args:
+        arg_parser (argparse.ArgumentParser): parser of the script
+    """
+    arg_parser.add_argument('--timings', default=None,
+                            help='JSON lines file for the per-stage timings')
+    arg_parser.add_argument('--progress-interval', type=float, default=5.0,
+                            help='seconds between progress messages of a layer')
+    arg_parser.add_argument('--profile-stage', action='append', default=[],
+                            help='run this stage under cProfile, can be repeated, needs --workers 1')
+    arg_parser.add_argument('--trace-memory-stage', action='append', default=[],
+                            help='trace the allocations of this stage with tracemalloc, can be repeated, needs --workers 1')
+    arg_parser.add_argument('--profile-path', default='profiles',
+                            help='folder of the cProfile files')
+
+
+def from_arguments(arg_parser, args):
+    """Create the Instrumentation asked for on the command line
+    Args:
+        arg_parser (argparse.ArgumentParser): parser, to report bad combinations
+        args (argparse.Namespace): parsed arguments, with the options of add_arguments and --workers
+    """
+    if (args.profile_stage or args.trace_memory_stage) and args.workers > 1:
+        arg_parser.error('--profile-stage and --trace-memory-stage need --workers 1')
+    return Instrumentation(args.progress_interval, args.profile_stage, args.trace_memory_stage)
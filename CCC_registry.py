@@ -0,0 +1,390 @@
+#!/usr/bin/env python
+
+"""
+Registry of the councils and networks the CCC scripts run on.
+The networks are read from a JSON, YAML or TOML file instead of being written
+out in each script. A network can use a template of asset classes and
+attribute mappings, in which '{prefix}' (and '{council}', '{network}') are
+replaced by the network's values, so one template covers the Sw, Ww and Ws
+networks. The file is validated and compiled once into network descriptions
+with the keys the scripts use: council, network, path, type,
+Asset_Class_mapping, attributes_mapping, assets, filters and topology.
+Run it to list the networks, or to run the extraction and mapping scripts on
+any subset of them, each network as an independent job.
+"""
+
+import argparse
+import concurrent.futures
+import datetime
+import json
+import os
+import shlex
+import subprocess
+import sys
+import time
+
+try:
+    import yaml
+except ImportError:
+    yaml = None
+
+try:
+    import tomllib
+except ImportError:
+    try:
+        import tomli as tomllib
+    except ImportError:
+        tomllib = None
+
+
+DEFAULT_CONFIG = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'CCC_networks.json')
+
+COUNCIL_KEYS = set(['council', 'networks'])
+NETWORK_KEYS = set(['network', 'prefix', 'template', 'path', 'type', 'Asset_Class_mapping', 'attributes_mapping',
+                    'exclude_assets', 'exclude_attributes', 'assets', 'filters', 'topology'])
+TEMPLATE_KEYS = set(['Asset_Class_mapping', 'attributes_mapping'])
+FILTER_KEYS = set(['layers', 'where', 'bbox', 'fields'])
+TOPOLOGY_DEFAULTS = {'pipes': [], 'nodes': [], 'pipe_id': None, 'node_id': None,
+                     'upstream': 'UpstreamFeatureID', 'downstream': 'DownstreamFeatureID', 'tolerance': 0.5}
+
+
+def read_config(path):
+    """Read a registry file, by its extension as JSON, YAML or TOML
+    Args:
+        path (str): registry file
+    """
+    extension = os.path.splitext(path)[1].lower()
+    if extension in ('.yaml', '.yml'):
+        if yaml is None:
+            raise ValueError(f"{path}: reading YAML needs PyYAML to be installed")
+        with open(path, encoding='utf-8') as f:
+            return yaml.safe_load(f)
+    if extension == '.toml':
+        if tomllib is None:
+            raise ValueError(f"{path}: reading TOML needs Python 3.11 or tomli to be installed")
+        with open(path, 'rb') as f:
+            return tomllib.load(f)
+    with open(path, encoding='utf-8') as f:
+        return json.load(f)
+
+
+def expand(value, values, where):
+    """Replace the {name} fields in the strings of a value, keys included
+    Args:
+        value: string, list or dict from the registry file
+        values (dict): field values, e.g. prefix, council and network
+        where (str): location in the registry file, for error messages
+    """
+    if isinstance(value, str):
+        try:
+            return value.format(**values)
+        except (KeyError, IndexError, ValueError) as e:
+            raise ValueError(f"{where}: cannot expand {value!r}: {e!r}")
+    if isinstance(value, list):
+        return [expand(v, values, where) for v in value]
+    if isinstance(value, dict):
+        return {expand(k, values, where): expand(v, values, where) for k, v in value.items()}
+    return value
+
+
+def check_keys(spec, allowed, where):
+    if not isinstance(spec, dict):
+        raise ValueError(f"{where}: expected a mapping, got {type(spec).__name__}")
+    unknown = set(spec) - allowed
+    if unknown:
+        raise ValueError(f"{where}: unknown keys {sorted(unknown)}")
+
+
+def check_mapping(value, where, nested=False):
+    """Check a str -> str mapping, or str -> (str -> str) mapping when nested"""
+    if not isinstance(value, dict):
+        raise ValueError(f"{where}: expected a mapping, got {type(value).__name__}")
+    for k, v in value.items():
+        if nested:
+            check_mapping(v, f"{where}.{k}")
+        elif not isinstance(k, str) or not isinstance(v, str):
+            raise ValueError(f"{where}: {k!r}: {v!r} is not a string to string mapping")
+
+
+def check_filters(filters, where):
+    """Check the extraction filters of a network, see CCC_gdb_to_geometry.apply_layer_filters"""
+    check_keys(filters, FILTER_KEYS, where)
+    for name in ('layers', 'fields'):
+        if name in filters and not (isinstance(filters[name], list) and all(isinstance(v, str) for v in filters[name])):
+            raise ValueError(f"{where}.{name}: expected a list of names")
+    if 'where' in filters and not isinstance(filters['where'], str):
+        raise ValueError(f"{where}.where: expected an OGR SQL string")
+    if 'bbox' in filters:
+        bbox = filters['bbox']
+        if not (isinstance(bbox, list) and len(bbox) == 4 and all(isinstance(v, (int, float)) for v in bbox)):
+            raise ValueError(f"{where}.bbox: expected [xmin, ymin, xmax, ymax]")
+        if bbox[0] > bbox[2] or bbox[1] > bbox[3]:
+            raise ValueError(f"{where}.bbox: minimum greater than maximum")
+
+
+def compile_topology(topology, where):
+    """Check the topology layers of a network and fill in the defaults, see CCC_topology
+    Args:
+        topology (dict): pipe and node layers, their id columns and the snapping tolerance
+        where (str): location in the registry file, for error messages
+    """
+    check_keys(topology, set(TOPOLOGY_DEFAULTS), where)
+    topology = dict(TOPOLOGY_DEFAULTS, **topology)
+    for name in ('pipes', 'nodes'):
+        if not (isinstance(topology[name], list) and all(isinstance(v, str) for v in topology[name])):
+            raise ValueError(f"{where}.{name}: expected a list of layer names")
+    if not topology['pipes']:
+        raise ValueError(f"{where}.pipes: at least one pipe layer is needed")
+    for name in ('pipe_id', 'node_id', 'upstream', 'downstream'):
+        if topology[name] is not None and not isinstance(topology[name], str):
+            raise ValueError(f"{where}.{name}: expected a column name")
+    if not isinstance(topology['tolerance'], (int, float)) or topology['tolerance'] <= 0:
+        raise ValueError(f"{where}.tolerance: expected a positive distance")
+    return topology
+
+
+def compile_network(council, spec, templates, where):
+    """Compile one network of the registry file into a network description
+    Args:
+        council (str): council name
+        spec (dict): network entry of the registry file
+        templates (dict): templates of the registry file, by name
+        where (str): location in the registry file, for error messages
+    Returns:
+        dict: network description
+    """
+    check_keys(spec, NETWORK_KEYS, where)
+    for key in ('network', 'path'):
+        if not isinstance(spec.get(key), str):
+            raise ValueError(f"{where}: '{key}' is required and must be a string")
+    values = {'council': council, 'network': spec['network'], 'prefix': spec.get('prefix', '')}
+    where = f"{where} ({spec['network']})"
+
+    template = {}
+    if 'template' in spec:
+        if spec['template'] not in templates:
+            raise ValueError(f"{where}: unknown template {spec['template']!r}")
+        template = expand(templates[spec['template']], values, f"templates.{spec['template']}")
+    spec = expand(spec, values, where)
+
+    #asset classes and attributes of the template, then the network's own additions and exclusions
+    asset_mapping = dict(template.get('Asset_Class_mapping', {}))
+    asset_mapping.update(spec.get('Asset_Class_mapping', {}))
+    attributes_mapping = {item: dict(mapping) for item, mapping in template.get('attributes_mapping', {}).items()}
+    for item, mapping in spec.get('attributes_mapping', {}).items():
+        attributes_mapping.setdefault(item, {}).update(mapping)
+    for item in spec.get('exclude_assets', []):
+        if item not in asset_mapping:
+            raise ValueError(f"{where}: excluded asset class {item!r} is not in the template")
+        del asset_mapping[item]
+        attributes_mapping.pop(item, None)
+    for item, names in spec.get('exclude_attributes', {}).items():
+        for name in names:
+            if name not in attributes_mapping.get(item, {}):
+                raise ValueError(f"{where}: excluded attribute {item}.{name} is not in the template")
+            del attributes_mapping[item][name]
+
+    check_mapping(asset_mapping, f"{where}.Asset_Class_mapping")
+    check_mapping(attributes_mapping, f"{where}.attributes_mapping", nested=True)
+    missing = [item for item in asset_mapping if item not in attributes_mapping]
+    extra = [item for item in attributes_mapping if item not in asset_mapping]
+    if missing or extra:
+        raise ValueError(f"{where}: asset classes without attributes mapping {missing}, "
+                         f"attributes mapping without asset class {extra}")
+    assets = spec.get('assets', [])
+    if not (isinstance(assets, list) and all(isinstance(v, str) for v in assets)):
+        raise ValueError(f"{where}.assets: expected a list of layer names")
+    filters = spec.get('filters', {})
+    check_filters(filters, f"{where}.filters")
+    topology = compile_topology(spec['topology'], f"{where}.topology") if 'topology' in spec else None
+
+    return {
+        'council': council,
+        'network': spec['network'],
+        'prefix': values['prefix'],
+        'path': spec['path'],
+        'type': spec.get('type', 'gdb'),
+        'Asset_Class_mapping': asset_mapping,
+        'attributes_mapping': attributes_mapping,
+        'assets': assets,
+        'filters': filters,
+        'topology': topology,
+    }
+
+
+class Registry:
+    """Validated and compiled registry of councils and networks
+    Args:
+        config (dict): contents of a registry file, with 'councils' and optional 'templates'
+        path (str): registry file, for error messages
+    """
+
+    def __init__(self, config, path='registry'):
+        check_keys(config, set(['templates', 'councils']), path)
+        templates = config.get('templates', {})
+        for name, template in templates.items():
+            check_keys(template, TEMPLATE_KEYS, f"{path}: templates.{name}")
+        if not isinstance(config.get('councils'), list):
+            raise ValueError(f"{path}: 'councils' is required and must be a list")
+
+        self.path = path
+        self.networks = []
+        self.index = {}
+        for k, council_spec in enumerate(config['councils']):
+            where = f"{path}: councils[{k}]"
+            check_keys(council_spec, COUNCIL_KEYS, where)
+            council = council_spec.get('council')
+            if not isinstance(council, str) or not isinstance(council_spec.get('networks'), list):
+                raise ValueError(f"{where}: 'council' and 'networks' are required")
+            for j, spec in enumerate(council_spec['networks']):
+                network = compile_network(council, spec, templates, f"{where}.networks[{j}]")
+                key = (network['council'], network['network'])
+                if key in self.index:
+                    raise ValueError(f"{where}: network {network['network']} of {council} is defined twice")
+                self.index[key] = network
+                self.networks.append(network)
+
+    def get_councils(self):
+        return list(dict.fromkeys(network['council'] for network in self.networks))
+
+    def select(self, councils=None, networks=None):
+        """Get the networks of some councils and network names, in registry order
+        Args:
+            councils (list): council names, None for all
+            networks (list): network names, e.g. 'Stormwater', None for all
+        """
+        for names, known, kind in [(councils, self.get_councils(), 'council'),
+                                   (networks, set(network['network'] for network in self.networks), 'network')]:
+            unknown = [name for name in names or [] if name not in known]
+            if unknown:
+                raise ValueError(f"{self.path}: unknown {kind} {unknown}")
+        return [network for network in self.networks
+                if (councils is None or network['council'] in councils)
+                and (networks is None or network['network'] in networks)]
+
+
+#compiled registries by file, path and modification time
+registries = {}
+
+
+def load_registry(path=None):
+    """Read, validate and compile a registry file, once per version of the file
+    Args:
+        path (str): registry file, None for CCC_networks.json next to the scripts
+    """
+    path = os.path.abspath(path or DEFAULT_CONFIG)
+    key = (path, os.stat(path).st_mtime_ns)
+    if key not in registries:
+        registries[key] = Registry(read_config(path), path)
+    return registries[key]
+
+
+def add_arguments(arg_parser):
+    """Add the network selection options to a script's argument parser
+    Args:
+        arg_parser (argparse.ArgumentParser): parser of the script
+    """
+    arg_parser.add_argument('--config', default=DEFAULT_CONFIG,
+                            help='registry of the councils and networks, JSON, YAML or TOML')
+    arg_parser.add_argument('--council', nargs='+', default=None,
+                            help='only run the networks of these councils')
+    arg_parser.add_argument('--network', nargs='+', default=None,
+                            help='only run these networks, e.g. Stormwater')
+
+
+def from_arguments(arg_parser, args):
+    """Get the networks selected on the command line
+    Args:
+        arg_parser (argparse.ArgumentParser): parser, to report a bad registry or selection
+        args (argparse.Namespace): parsed arguments, with the options of add_arguments
+    """
+    try:
+        return load_registry(args.config).select(args.council, args.network)
+    except (OSError, ValueError) as e:
+        arg_parser.error(str(e))
+
+
+SCRIPTS = {
+    'extract': 'CCC_gdb_to_geometry.py',
+    'mapping': 'CCC_LINZ_auto_mapping.py',
+}
+
+
+def run_job(network, steps, config, in_path, out_path, log_path, script_args):
+    """Run the scripts on one network, one step after the other, logging their output
+    Args:
+        network (dict): network description
+        steps (list): 'extract' and/or 'mapping'
+        config (str): registry file
+        in_path (str): input root folder
+        out_path (str): output root folder
+        log_path (str): folder of the job logs
+        script_args (dict): extra command line arguments by step
+    Returns:
+        dict: council, network, log file, seconds and the failed step, None if all succeeded
+    """
+    start = time.perf_counter()
+    log_file = os.path.join(log_path, f"{network['council']}-{network['network']}.log")
+    summary = {'council': network['council'], 'network': network['network'], 'log': log_file, 'failed': None}
+    with open(log_file, 'w') as log:
+        for step in steps:
+            command = [sys.executable, os.path.join(os.path.dirname(os.path.abspath(__file__)), SCRIPTS[step]),
+                       '--config', config, '--council', network['council'], '--network', network['network'],
+                       '--in-path', in_path, '--out-path', out_path] + script_args.get(step, [])
+            log.write(' '.join(shlex.quote(c) for c in command) + '\n')
+            log.flush()
+            if subprocess.run(command, stdout=log, stderr=subprocess.STDOUT).returncode != 0:
+                summary['failed'] = step
+                break
+    summary['seconds'] = time.perf_counter() - start
+    return summary
+
+
+def main(argv=None):
+    arg_parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    add_arguments(arg_parser)
+    arg_parser.add_argument('--list', action='store_true',
+                            help='list the selected networks and their asset classes, without running them')
+    arg_parser.add_argument('--steps', nargs='+', choices=list(SCRIPTS), default=list(SCRIPTS),
+                            help='scripts to run on each network, in order')
+    arg_parser.add_argument('--in-path', default="/Users/wujing/Desktop/Inputs")
+    arg_parser.add_argument('--out-path', default="/Users/wujing/Desktop/Outputs")
+    arg_parser.add_argument('--jobs', type=int, default=1,
+                            help='number of networks run at the same time')
+    arg_parser.add_argument('--log-path', default='logs',
+                            help='folder of the job logs')
+    arg_parser.add_argument('--extract-args', default='',
+                            help='extra arguments of CCC_gdb_to_geometry.py, e.g. "--format both --workers 4"')
+    arg_parser.add_argument('--mapping-args', default='',
+                            help='extra arguments of CCC_LINZ_auto_mapping.py')
+    args = arg_parser.parse_args(argv)
+
+    networks = from_arguments(arg_parser, args)
+    if args.list:
+        for network in networks:
+            print(f"{network['council']}, {network['network']}, {network['type']} {network['path']}")
+            for item, linz_asset in network['Asset_Class_mapping'].items():
+                print(f"    {item:16s} -> {linz_asset:16s} {len(network['attributes_mapping'][item]):3d} attributes")
+        return
+
+    os.makedirs(args.log_path, exist_ok=True)
+    script_args = {'extract': shlex.split(args.extract_args), 'mapping': shlex.split(args.mapping_args)}
+    failures = []
+    #the scripts run in their own processes, the threads only wait for them
+    with concurrent.futures.ThreadPoolExecutor(max_workers=args.jobs) as pool:
+        futures = [pool.submit(run_job, network, args.steps, os.path.abspath(args.config), args.in_path, args.out_path,
+                               args.log_path, script_args) for network in networks]
+        for k, future in enumerate(concurrent.futures.as_completed(futures), 1):
+            summary = future.result()
+            now = datetime.datetime.now().isoformat()
+            status = f"{summary['failed']} failed, see {summary['log']}" if summary['failed'] else 'finished'
+            print(f"Job {k:3d} / {len(futures):3d}, {summary['council']} {summary['network']} {status}, "
+                  f"Seconds {summary['seconds']:8.2f}, Timestamp {now}")
+            if summary['failed']:
+                failures.append(f"{summary['council']} {summary['network']}")
+    if failures:
+        raise RuntimeError(f"{len(failures)} job(s) failed: " + ", ".join(failures))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,468 @@
+#!/usr/bin/env python
+
+"""
+Pipe and access chamber topology of a network, built from the end points
+collected while CCC_gdb_to_geometry.py extracts the layers (--topology).
+Pipe ends are connected to chambers by their UpstreamFeatureID and
+DownstreamFeatureID attributes, else snapped to the nearest chamber within
+a tolerance through a grid index; the ends left over are joined to each
+other within the same tolerance. The graph is kept as NumPy arrays, with a
+CSR adjacency of the pipes at every node, and saved with np.savez, so
+loading it and tracing or finding orphans takes milliseconds.
+Run it on a saved topology to print its summary, orphans or a trace.
+"""
+
+import argparse
+import os
+import time
+
+import numpy as np
+
+
+TOPOLOGY_FILE = 'topology.npz'
+
+#how a pipe end was connected to its node
+END_UNCONNECTED = 0
+END_ATTRIBUTE = 1
+END_SNAPPED = 2
+END_FREE = 3
+
+#node kinds, chambers come from the node layers, free nodes from joined pipe ends
+NODE_CHAMBER = 0
+NODE_FREE = 1
+
+
+def as_keys(values):
+    """Text form of feature ids, integral floats without their '.0' and '' for missing ids
+    Args:
+        values (array-like): ids as numbers or strings
+    """
+    keys = []
+    for value in values:
+        if value is None or (isinstance(value, (float, np.floating)) and not np.isfinite(value)):
+            keys.append('')
+        elif isinstance(value, (float, np.floating)) and float(value).is_integer():
+            keys.append(str(int(value)))
+        else:
+            keys.append(str(value).strip())
+    return np.array(keys, dtype=str)
+
+
+def as_coordinates(values):
+    """Float array of coordinates, NaN where a value is missing or not a number"""
+    values = np.asarray(values, dtype=object)
+    coordinates = np.full(len(values), np.nan)
+    for k, value in enumerate(values):
+        try:
+            coordinates[k] = float(value)
+        except (TypeError, ValueError):
+            pass
+    return coordinates
+
+
+def save_layer_part(path, role, layer_name, columns):
+    """Save the topology columns of one layer, to be joined by build_topology
+    Args:
+        path (str): (layer)(topology).npz file
+        role (str): 'pipes' or 'nodes'
+        layer_name (str): layer name
+        columns (dict): fid, key and coordinate arrays, plus upstream and downstream keys for pipes
+    """
+    temporary = path + '.tmp.npz'
+    np.savez(temporary, role=np.array(role), layer=np.array(layer_name), **columns)
+    os.replace(temporary, path)
+
+
+class GridIndex:
+    """Uniform grid over points, to find the points near many query points at once.
+    With the cell size equal to the search distance, the points within that
+    distance of a query are in its cell or one of the 8 cells around it.
+    Args:
+        x (np.ndarray): point X coordinates
+        y (np.ndarray): point Y coordinates
+        cell_size (float): grid cell size
+    """
+
+    def __init__(self, x, y, cell_size):
+        self.x = np.asarray(x, dtype=float)
+        self.y = np.asarray(y, dtype=float)
+        self.cell_size = float(cell_size)
+        valid = np.flatnonzero(np.isfinite(self.x) & np.isfinite(self.y))
+        keys = self.get_cell_keys(self.x[valid], self.y[valid])
+        order = np.argsort(keys, kind='stable')
+        self.keys = keys[order]
+        self.points = valid[order]
+
+    def get_cell_keys(self, x, y, dx=0, dy=0):
+        ix = np.floor(x / self.cell_size).astype(np.int64) + dx
+        iy = np.floor(y / self.cell_size).astype(np.int64) + dy
+        return (ix << 32) + (iy & 0xFFFFFFFF)
+
+    def get_pairs(self, x, y, distance):
+        """Get every (query, point) pair closer than a distance
+        Args:
+            x (np.ndarray): query X coordinates
+            y (np.ndarray): query Y coordinates
+            distance (float): search distance, at most the cell size
+        Returns:
+            tuple: query indices, point indices and distances of the pairs
+        """
+        x = np.asarray(x, dtype=float)
+        y = np.asarray(y, dtype=float)
+        queries = np.flatnonzero(np.isfinite(x) & np.isfinite(y))
+        pairs_query, pairs_point = [], []
+        for dx in (-1, 0, 1):
+            for dy in (-1, 0, 1):
+                keys = self.get_cell_keys(x[queries], y[queries], dx, dy)
+                start = np.searchsorted(self.keys, keys, 'left')
+                counts = np.searchsorted(self.keys, keys, 'right') - start
+                total = counts.sum()
+                if total == 0:
+                    continue
+                #position of each pair inside the cell range of its query
+                offsets = np.arange(total) - np.repeat(np.cumsum(counts) - counts, counts)
+                pairs_query.append(np.repeat(queries, counts))
+                pairs_point.append(self.points[np.repeat(start, counts) + offsets])
+        if not pairs_query:
+            return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64), np.zeros(0)
+        query = np.concatenate(pairs_query)
+        point = np.concatenate(pairs_point)
+        d = np.hypot(self.x[point] - x[query], self.y[point] - y[query])
+        close = d <= distance
+        return query[close], point[close], d[close]
+
+    def nearest(self, x, y, distance):
+        """Get the nearest point of every query within a distance, the lowest index on ties
+        Args:
+            x (np.ndarray): query X coordinates
+            y (np.ndarray): query Y coordinates
+            distance (float): search distance, at most the cell size
+        Returns:
+            tuple: point index (-1 for none) and distance (NaN for none) of every query
+        """
+        query, point, d = self.get_pairs(x, y, distance)
+        nearest = np.full(len(x), -1, dtype=np.int64)
+        nearest_distance = np.full(len(x), np.nan)
+        order = np.lexsort((point, d, query))
+        first = order[np.r_[True, query[order][1:] != query[order][:-1]]] if len(order) else order
+        nearest[query[first]] = point[first]
+        nearest_distance[query[first]] = d[first]
+        return nearest, nearest_distance
+
+
+def get_components(n, a, b):
+    """Label the connected groups of n items linked by (a, b) pairs with their lowest item
+    Args:
+        n (int): number of items
+        a (np.ndarray): first item of each pair
+        b (np.ndarray): second item of each pair
+    """
+    labels = np.arange(n)
+    while True:
+        previous = labels.copy()
+        low = np.minimum(labels[a], labels[b])
+        np.minimum.at(labels, a, low)
+        np.minimum.at(labels, b, low)
+        #pointer jumping, every label points at its own label's label
+        labels = labels[labels]
+        if np.array_equal(labels, previous):
+            return labels
+
+
+def match_keys(keys, node_keys):
+    """Find the node of every key, the first node with that key, -1 for none or ''
+    Args:
+        keys (np.ndarray): keys to look up
+        node_keys (np.ndarray): keys of the nodes
+    """
+    unique_keys, first = np.unique(node_keys, return_index=True)
+    position = np.searchsorted(unique_keys, keys)
+    position = np.minimum(position, max(len(unique_keys) - 1, 0))
+    found = (len(unique_keys) > 0) & (keys != '')
+    if len(unique_keys):
+        found &= unique_keys[position] == keys
+    return np.where(found, first[position] if len(unique_keys) else -1, -1)
+
+
+class Topology:
+    """Array-backed graph of the pipes (edges) and chambers or joined pipe ends (nodes)
+    of a network. Pipes run from their first to their last point, the adjacency
+    lists the pipes at every node in CSR form: the pipes of node n are
+    adjacency_pipes[adjacency_indptr[n]:adjacency_indptr[n + 1]], with
+    adjacency_direction 1 for pipes leaving the node and -1 for pipes entering it.
+    Args:
+        arrays (dict): the arrays of a topology, from build_topology or load_topology
+    """
+
+    ARRAYS = ['layers', 'node_layer', 'node_fid', 'node_key', 'node_kind', 'node_x', 'node_y',
+              'pipe_layer', 'pipe_fid', 'pipe_key', 'pipe_from', 'pipe_to', 'pipe_from_source', 'pipe_to_source',
+              'pipe_from_distance', 'pipe_to_distance', 'adjacency_indptr', 'adjacency_pipes', 'adjacency_direction',
+              'tolerance']
+
+    def __init__(self, arrays):
+        for name in self.ARRAYS:
+            setattr(self, name, arrays[name])
+
+    @property
+    def node_count(self):
+        return len(self.node_x)
+
+    @property
+    def pipe_count(self):
+        return len(self.pipe_from)
+
+    def get_degrees(self):
+        return np.diff(self.adjacency_indptr)
+
+    def get_node_pipes(self, node):
+        """Get the pipes at a node and their direction, 1 leaving and -1 entering"""
+        start, end = self.adjacency_indptr[node], self.adjacency_indptr[node + 1]
+        return self.adjacency_pipes[start:end], self.adjacency_direction[start:end]
+
+    def find_nodes(self, key):
+        return np.flatnonzero(self.node_key == str(key))
+
+    def find_pipes(self, key):
+        return np.flatnonzero(self.pipe_key == str(key))
+
+    def trace(self, nodes, direction='downstream', max_steps=None):
+        """Follow the pipes from some nodes, one step of pipes at a time
+        Args:
+            nodes (array-like): start nodes
+            direction (str): 'downstream' along the pipes, 'upstream' against them or 'both'
+            max_steps (int): maximum number of pipes from a start node, None for no limit
+        Returns:
+            tuple: sorted arrays of the nodes and the pipes reached
+        """
+        visited_nodes = np.zeros(self.node_count, dtype=bool)
+        visited_pipes = np.zeros(self.pipe_count, dtype=bool)
+        frontier = np.unique(np.asarray(nodes, dtype=np.int64))
+        frontier = frontier[frontier >= 0]
+        visited_nodes[frontier] = True
+        step = 0
+        while len(frontier) and (max_steps is None or step < max_steps):
+            start = self.adjacency_indptr[frontier]
+            counts = self.adjacency_indptr[frontier + 1] - start
+            offsets = np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)
+            slots = np.repeat(start, counts) + offsets
+            pipes = self.adjacency_pipes[slots]
+            pipe_direction = self.adjacency_direction[slots]
+            if direction == 'downstream':
+                keep = pipe_direction == 1
+            elif direction == 'upstream':
+                keep = pipe_direction == -1
+            else:
+                keep = np.ones(len(pipes), dtype=bool)
+            pipes = pipes[keep & ~visited_pipes[pipes]]
+            visited_pipes[pipes] = True
+            #the other end of each pipe, seen from the frontier
+            ends = np.concatenate([self.pipe_from[pipes], self.pipe_to[pipes]])
+            ends = ends[ends >= 0]
+            frontier = np.unique(ends[~visited_nodes[ends]])
+            visited_nodes[frontier] = True
+            step += 1
+        return np.flatnonzero(visited_nodes), np.flatnonzero(visited_pipes)
+
+    def trace_pipe(self, pipe, direction='downstream', max_steps=None):
+        """Follow the network from a pipe, the pipe included
+        Args:
+            pipe (int): start pipe
+            direction (str): 'downstream', 'upstream' or 'both'
+            max_steps (int): maximum number of further pipes, None for no limit
+        """
+        if direction == 'downstream':
+            nodes = [self.pipe_to[pipe]]
+        elif direction == 'upstream':
+            nodes = [self.pipe_from[pipe]]
+        else:
+            nodes = [self.pipe_from[pipe], self.pipe_to[pipe]]
+        nodes, pipes = self.trace(nodes, direction, max_steps)
+        return nodes, np.union1d(pipes, [pipe])
+
+    def get_orphans(self):
+        """Find the parts of the network that are not connected
+        Returns:
+            dict: 'chambers' without any pipe, 'pipes' with neither end shared with
+                a chamber or another pipe, and 'dangling' pipe ends (pipe, 0 from / 1 to)
+                that reach no chamber and no other pipe
+        """
+        degrees = self.get_degrees()
+        chambers = np.flatnonzero((self.node_kind == NODE_CHAMBER) & (degrees == 0))
+        ends = np.stack([self.pipe_from, self.pipe_to], axis=1)
+        #an end is dangling when it has no node, or a free node no other pipe uses
+        node_degrees = np.where(ends >= 0, degrees[np.maximum(ends, 0)], 0)
+        node_kinds = np.where(ends >= 0, self.node_kind[np.maximum(ends, 0)], NODE_FREE)
+        dangling = (ends < 0) | ((node_kinds == NODE_FREE) & (node_degrees <= 1))
+        pipes = np.flatnonzero(dangling.all(axis=1))
+        return {'chambers': chambers, 'pipes': pipes, 'dangling': np.argwhere(dangling)}
+
+    def get_summary(self):
+        sources = np.concatenate([self.pipe_from_source, self.pipe_to_source])
+        orphans = self.get_orphans()
+        return {
+            'nodes': self.node_count,
+            'chambers': int((self.node_kind == NODE_CHAMBER).sum()),
+            'pipes': self.pipe_count,
+            'ends by attribute': int((sources == END_ATTRIBUTE).sum()),
+            'ends snapped': int((sources == END_SNAPPED).sum()),
+            'ends joined': int((sources == END_FREE).sum()),
+            'ends unconnected': int((sources == END_UNCONNECTED).sum()),
+            'orphan chambers': len(orphans['chambers']),
+            'orphan pipes': len(orphans['pipes']),
+            'dangling ends': len(orphans['dangling']),
+        }
+
+    def save(self, path):
+        """Save the arrays, uncompressed so they load without decoding"""
+        temporary = path + '.tmp.npz'
+        np.savez(temporary, **{name: getattr(self, name) for name in self.ARRAYS})
+        os.replace(temporary, path)
+
+
+def load_topology(path):
+    """Load a topology saved by Topology.save
+    Args:
+        path (str): topology.npz file
+    """
+    with np.load(path) as arrays:
+        return Topology({name: arrays[name] for name in Topology.ARRAYS})
+
+
+def load_layer_parts(files):
+    """Load the saved layer parts, joined by role
+    Args:
+        files (list): (layer)(topology).npz files, missing files are skipped
+    Returns:
+        tuple: layer names and a dict of the joined columns by role, with a layer index column
+    """
+    layers = []
+    parts = {'pipes': [], 'nodes': []}
+    for path in files:
+        if not os.path.exists(path):
+            continue
+        with np.load(path) as arrays:
+            columns = {name: arrays[name] for name in arrays.files if name not in ('role', 'layer')}
+            columns['layer'] = np.full(len(columns['fid']), len(layers), dtype=np.int32)
+            parts[str(arrays['role'])].append(columns)
+            layers.append(str(arrays['layer']))
+    joined = {}
+    for role, columns in parts.items():
+        names = ['layer', 'fid', 'key', 'x', 'y'] + (['x1', 'y1', 'upstream', 'downstream'] if role == 'pipes' else [])
+        joined[role] = {name: np.concatenate([c[name] for c in columns]) if columns else
+                        np.zeros(0, dtype=str if name in ('key', 'upstream', 'downstream') else float)
+                        for name in names}
+    return layers, joined
+
+
+def build_topology(files, tolerance=0.5):
+    """Build the topology of a network from its saved layer parts
+    Args:
+        files (list): (layer)(topology).npz files of the pipe and node layers
+        tolerance (float): snapping distance of pipe ends, in the layer units (metres for NZTM)
+    Returns:
+        Topology: the network graph
+    """
+    layers, parts = load_layer_parts(files)
+    nodes, pipes = parts['nodes'], parts['pipes']
+    node_count = len(nodes['x'])
+    pipe_count = len(pipes['x'])
+
+    #pipe ends, all from ends then all to ends
+    end_x = np.concatenate([pipes['x'], pipes['x1']])
+    end_y = np.concatenate([pipes['y'], pipes['y1']])
+    end_key = np.concatenate([pipes['upstream'], pipes['downstream']])
+
+    #connect by the up and downstream ids first, then by distance
+    end_node = match_keys(end_key, nodes['key'])
+    end_source = np.where(end_node >= 0, END_ATTRIBUTE, END_UNCONNECTED)
+    index = GridIndex(nodes['x'], nodes['y'], tolerance)
+    loose = np.flatnonzero(end_node < 0)
+    snapped, _ = index.nearest(end_x[loose], end_y[loose], tolerance)
+    end_node[loose[snapped >= 0]] = snapped[snapped >= 0]
+    end_source[loose[snapped >= 0]] = END_SNAPPED
+
+    #join the ends left over to each other, each group becomes a free node
+    loose = np.flatnonzero((end_node < 0) & np.isfinite(end_x) & np.isfinite(end_y))
+    loose_index = GridIndex(end_x[loose], end_y[loose], tolerance)
+    a, b, _ = loose_index.get_pairs(end_x[loose], end_y[loose], tolerance)
+    groups, free = np.unique(get_components(len(loose), a, b), return_inverse=True)
+    end_node[loose] = node_count + free
+    end_source[loose] = END_FREE
+
+    node_x = np.concatenate([nodes['x'], end_x[loose][groups]])
+    node_y = np.concatenate([nodes['y'], end_y[loose][groups]])
+    end_distance = np.where(end_node >= 0, np.hypot(node_x[np.maximum(end_node, 0)] - end_x,
+                                                    node_y[np.maximum(end_node, 0)] - end_y), np.nan)
+
+    #CSR adjacency: the ends sorted by node
+    end_pipe = np.concatenate([np.arange(pipe_count), np.arange(pipe_count)])
+    end_direction = np.concatenate([np.ones(pipe_count, dtype=np.int8), -np.ones(pipe_count, dtype=np.int8)])
+    connected = np.flatnonzero(end_node >= 0)
+    order = connected[np.argsort(end_node[connected], kind='stable')]
+    indptr = np.zeros(len(node_x) + 1, dtype=np.int64)
+    np.cumsum(np.bincount(end_node[connected], minlength=len(node_x)), out=indptr[1:])
+
+    return Topology({
+        'layers': np.array(layers, dtype=str),
+        'node_layer': np.concatenate([nodes['layer'], np.full(len(groups), -1, dtype=np.int32)]),
+        'node_fid': np.concatenate([nodes['fid'], np.full(len(groups), -1)]).astype(np.int64),
+        'node_key': np.concatenate([nodes['key'], np.full(len(groups), '', dtype=str)]).astype(str),
+        'node_kind': np.concatenate([np.full(node_count, NODE_CHAMBER, dtype=np.int8),
+                                     np.full(len(groups), NODE_FREE, dtype=np.int8)]),
+        'node_x': node_x,
+        'node_y': node_y,
+        'pipe_layer': pipes['layer'],
+        'pipe_fid': pipes['fid'].astype(np.int64),
+        'pipe_key': pipes['key'],
+        'pipe_from': end_node[:pipe_count],
+        'pipe_to': end_node[pipe_count:],
+        'pipe_from_source': end_source[:pipe_count].astype(np.int8),
+        'pipe_to_source': end_source[pipe_count:].astype(np.int8),
+        'pipe_from_distance': end_distance[:pipe_count],
+        'pipe_to_distance': end_distance[pipe_count:],
+        'adjacency_indptr': indptr,
+        'adjacency_pipes': end_pipe[order],
+        'adjacency_direction': end_direction[order],
+        'tolerance': np.array(float(tolerance)),
+    })
+
+
+def main(argv=None):
+    arg_parser = argparse.ArgumentParser(description=__doc__)
+    arg_parser.add_argument('path', help='topology.npz file written by CCC_gdb_to_geometry.py --topology')
+    arg_parser.add_argument('--orphans', action='store_true', help='list the orphan chambers and pipes')
+    arg_parser.add_argument('--trace', default=None, help='trace from the pipe with this id')
+    arg_parser.add_argument('--direction', choices=['downstream', 'upstream', 'both'], default='downstream')
+    arg_parser.add_argument('--max-steps', type=int, default=None, help='maximum number of pipes to follow')
+    args = arg_parser.parse_args(argv)
+
+    start = time.perf_counter()
+    topology = load_topology(args.path)
+    print(f"Loaded {args.path} in {(time.perf_counter() - start) * 1e3:.1f} ms")
+    for name, value in topology.get_summary().items():
+        print(f"{name:>20s}: {value}")
+
+    if args.orphans:
+        start = time.perf_counter()
+        orphans = topology.get_orphans()
+        print(f"Orphans found in {(time.perf_counter() - start) * 1e3:.1f} ms")
+        for node in orphans['chambers']:
+            print(f"Chamber {topology.node_key[node]} ({topology.layers[topology.node_layer[node]]} "
+                  f"FID {topology.node_fid[node]}) has no pipe")
+        for pipe in orphans['pipes']:
+            print(f"Pipe {topology.pipe_key[pipe]} ({topology.layers[topology.pipe_layer[pipe]]} "
+                  f"FID {topology.pipe_fid[pipe]}) is not connected")
+
+    if args.trace is not None:
+        pipes = topology.find_pipes(args.trace)
+        if len(pipes) == 0:
+            arg_parser.error(f"no pipe with id {args.trace}")
+        start = time.perf_counter()
+        nodes, traced = topology.trace_pipe(pipes[0], args.direction, args.max_steps)
+        print(f"Traced {args.direction} from pipe {args.trace} in {(time.perf_counter() - start) * 1e3:.1f} ms: "
+              f"{len(traced)} pipes, {int((topology.node_kind[nodes] == NODE_CHAMBER).sum())} chambers")
+        print(' '.join(topology.pipe_key[traced]))
+
+
+if __name__ == '__main__':
+    main()